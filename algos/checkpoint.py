@@ -0,0 +1,155 @@
+import json
+import os
+import time
+
+import numpy as np
+
+from utils import Volumes
+
+# Контрольные точки расчёта по всем назначениям. Объёмы копятся в массивах по фиксированному
+# порядку рёбер (пар from -> to) и узлов сети; каталог контрольной точки содержит:
+#   index.npz       — порядок: link_from, link_to, nodes (пишется один раз);
+#   checkpoint.npz  — links, nodes (накопленные объёмы) и completed (посчитанные назначения);
+#   progress.json   — сколько назначений готово из скольких, время обновления.
+# Каждый файл пишется во временный и переименовывается, так что читатель (read_checkpoint,
+# мониторинг) видит состояние на момент последнего сохранения, а не наполовину записанный файл.
+
+
+def _atomic_write(path, write):
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, 'wb') as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class VolumeAccumulator:
+    """Сумма объёмов по назначениям в массивах links (по парам link_pairs) и nodes (по node_ids)."""
+    def __init__(self, network):
+        self.link_pairs = sorted({(link.from_node, link.to_node) for link in network.all_links})
+        self.node_ids = sorted(set(network.all_stops) | {s for pair in self.link_pairs for s in pair})
+        self.link_pos = {pair: k for k, pair in enumerate(self.link_pairs)}
+        self.node_pos = {s: k for k, s in enumerate(self.node_ids)}
+        self.links = np.zeros(len(self.link_pairs))
+        self.nodes = np.zeros(len(self.node_ids))
+        self.completed = []
+
+    def add(self, destination, links, nodes):
+        for i, targets in links.items():
+            for j, v in targets.items():
+                self.links[self.link_pos[i, j]] += v
+        for s, v in nodes.items():
+            self.nodes[self.node_pos[s]] += v
+        self.completed.append(destination)
+
+    def sparse(self, results):
+        """Сумма результатов [(links, nodes)] в виде разреженных векторов {'links': [[позиция, объём]...], 'nodes': ...}."""
+        links, nodes = {}, {}
+        for link_volumes, node_volumes in results:
+            for i, targets in link_volumes.items():
+                for j, v in targets.items():
+                    if v:
+                        k = self.link_pos[i, j]
+                        links[k] = links.get(k, 0.0) + v
+            for s, v in node_volumes.items():
+                if v:
+                    k = self.node_pos[s]
+                    nodes[k] = nodes.get(k, 0.0) + v
+        return {'links': sorted(links.items()), 'nodes': sorted(nodes.items())}
+
+    def add_sparse(self, destinations, sparse):
+        for key, values in (('links', self.links), ('nodes', self.nodes)):
+            if sparse[key]:
+                positions, volumes = zip(*sparse[key])
+                np.add.at(values, np.array(positions, dtype=np.int64), np.array(volumes))
+        self.completed.extend(destinations)
+
+    def volumes(self):
+        links = {}
+        for (i, j), v in zip(self.link_pairs, self.links.tolist()):
+            links.setdefault(i, {})[j] = v
+        return Volumes(links, dict(zip(self.node_ids, self.nodes.tolist())))
+
+
+class Checkpoint:
+    """
+    Периодическое сохранение VolumeAccumulator в directory: не чаще раза в interval секунд
+    (save(force=True) — сразу). n_total — общее число назначений, для progress.json.
+    on_save(directory) вызывается перед записью checkpoint.npz — для данных, которые должны
+    сохраняться не реже накопленных объёмов (см. algos.selected_link).
+    """
+    def __init__(self, directory, n_total, interval=60.0, on_save=None):
+        self.directory = directory
+        self.n_total = n_total
+        self.interval = interval
+        self.on_save = on_save
+        self.last_save = time.monotonic()
+        self.restored = False
+        self._index_saved = False
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def restore(self, accumulator):
+        """
+        Загружает сохранённое состояние в accumulator; False, если контрольной точки нет, она неполная
+        (нет index.npz) или от другой сети.
+        """
+        if not (os.path.exists(self.path("checkpoint.npz")) and os.path.exists(self.path("index.npz"))):
+            return False
+        with np.load(self.path("index.npz")) as index:
+            same_network = (index['link_from'].tolist() == [i for i, _ in accumulator.link_pairs]
+                            and index['link_to'].tolist() == [j for _, j in accumulator.link_pairs]
+                            and index['nodes'].tolist() == accumulator.node_ids)
+        if not same_network:
+            return False
+        with np.load(self.path("checkpoint.npz")) as data:
+            accumulator.links = data['links'].copy()
+            accumulator.nodes = data['nodes'].copy()
+            accumulator.completed = data['completed'].tolist()
+        self.restored = True
+        return True
+
+    def save(self, accumulator, force=False):
+        if not force and time.monotonic() - self.last_save < self.interval:
+            return False
+        if not self._index_saved:
+            # в каталоге может лежать точка прошлого расчёта (другой сети): index.npz пишется заново
+            # при первом сохранении, а старый checkpoint.npz к нему не должен приложиться
+            if not self.restored and os.path.exists(self.path("checkpoint.npz")):
+                os.remove(self.path("checkpoint.npz"))
+            _atomic_write(self.path("index.npz"), lambda f: np.savez(
+                f, link_from=np.array([i for i, _ in accumulator.link_pairs], dtype=str),
+                link_to=np.array([j for _, j in accumulator.link_pairs], dtype=str),
+                nodes=np.array(accumulator.node_ids, dtype=str)))
+            self._index_saved = True
+        if self.on_save is not None:
+            self.on_save(self.directory)
+        _atomic_write(self.path("checkpoint.npz"), lambda f: np.savez(
+            f, links=accumulator.links, nodes=accumulator.nodes,
+            completed=np.array(accumulator.completed, dtype=str)))
+        progress = {'completed': len(accumulator.completed), 'total': self.n_total, 'updated': time.time(),
+                    'total_link_volume': float(accumulator.links.sum())}
+        _atomic_write(self.path("progress.json"), lambda f: f.write(json.dumps(progress).encode('utf-8')))
+        self.last_save = time.monotonic()
+        return True
+
+
+def read_checkpoint(directory):
+    """Частичный результат из каталога контрольной точки: (Volumes, посчитанные назначения, progress)."""
+    with np.load(os.path.join(directory, "index.npz")) as index:
+        link_from, link_to, node_ids = index['link_from'].tolist(), index['link_to'].tolist(), index['nodes'].tolist()
+    with np.load(os.path.join(directory, "checkpoint.npz")) as data:
+        links, nodes, completed = data['links'].tolist(), data['nodes'].tolist(), data['completed'].tolist()
+    progress = read_progress(directory)
+    volumes = {}
+    for i, j, v in zip(link_from, link_to, links):
+        volumes.setdefault(i, {})[j] = v
+    return Volumes(volumes, dict(zip(node_ids, nodes))), completed, progress
+
+
+def read_progress(directory):
+    with open(os.path.join(directory, "progress.json"), encoding='utf-8') as f:
+        return json.load(f)
@@ -0,0 +1,464 @@
+import argparse
+import csv
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from profiling import StageProfiler
+
+# Единая точка входа для этапов расчёта (артефакты см. algos/pipeline.py):
+#
+#   traffic_flows ingest        --gtfs-dir DIR [--limit N]
+#   traffic_flows build-network --gtfs-dir DIR [--limit N] [--walk-radius M]
+#   traffic_flows assign        --gtfs-dir DIR --od od.csv [--engine florian|time_arrived] [--T 60]
+#                               [--workers 4] [--memory-budget 8000] [--selected-link]
+#   traffic_flows sweep         --gtfs-dir DIR --od od.csv --T 30 45 60 [--engines florian time_arrived]
+#   traffic_flows report        [KEY ...] [--top 20] [--csv volumes.csv]
+#   traffic_flows equilibrium   --gtfs-dir DIR --od od.csv [--method msa|fw] [--iterations 50] [--gap 1e-4]
+#                               [--vehicle-capacity 100] [--alpha 0.15] [--beta 4] [--std-factor 0]
+#   traffic_flows sensitivity   --gtfs-dir DIR --od od.csv [--top 20]
+#   traffic_flows headways      --gtfs-dir DIR --od od.csv --fleet fleet.csv [--budget N] [--min-fleet 1]
+#                               [--iterations 20] [--step 1] [--candidates 4] [--workers 4] [--csv headways.csv]
+#   traffic_flows simulate      --gtfs-dir DIR --od od.csv [--passengers 1000000] [--T 60] [--wait model]
+#                               [--seed 0] [--top 20] [--csv od.csv] [--links-csv links.csv]
+#   traffic_flows estimate      --gtfs-dir DIR --od od.csv [--error 0.05] [--time-budget 60] [--max-destinations N]
+#                               [--zones zones.csv | --grid-cell 2000] [--seed 0] [--top 20] [--csv volumes.csv]
+#   traffic_flows select        [KEY] --link FROM TO | --od ORIGIN DEST | --destinations STOP ... | --zone Z --zones CSV
+#   traffic_flows status
+#   traffic_flows coordinator   --gtfs-dir DIR --od od.csv [--port 8766] [--batch-size 8]   (см. algos/distributed.py)
+#   traffic_flows worker        --connect HOST:PORT [--snapshot PATH] [--processes 8]
+#
+# Каждая команда выполняет нужные ей предыдущие этапы, если их артефактов ещё нет.
+# Подсистемы импортируются в обработчиках команд: --help и лёгкие команды не грузят numpy, scipy и asyncio.
+
+ENGINES = ('florian', 'time_arrived')
+
+
+def _add_network_args(parser):
+    parser.add_argument('--gtfs-dir', required=True, help='Каталог GTFS')
+    parser.add_argument('--limit', type=int, default=100000, help='Ограничение для GTFS данных')
+    parser.add_argument('--walk-radius', type=float, default=0.0,
+                        help='Радиус пешеходных пересадок между остановками в метрах (0 — без пересадок)')
+
+
+def _add_assign_args(parser, local=True):
+    parser.add_argument('--od', required=True, help='OD-матрица: CSV (origin,destination,demand) или JSON')
+    if local:
+        parser.add_argument('--workers', type=int, default=1, help='Число процессов для расчёта назначений')
+        parser.add_argument('--memory-budget', type=float, default=None, metavar='MB',
+                            help='Ограничение памяти на все процессы; уменьшает --workers при необходимости')
+    parser.add_argument('--resume', action='store_true',
+                        help='Продолжить прерванный расчёт с контрольной точки, пропустив готовые назначения')
+    parser.add_argument('--checkpoint-interval', type=float, default=60.0, metavar='SEC',
+                        help='Как часто сохранять накопленные объёмы на диск')
+    if local:
+        parser.add_argument('--selected-link', action='store_true',
+                            help='Сохранить индекс для запросов select без повторного назначения')
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='traffic_flows', description='Этапы расчёта пассажиропотоков')
+    parser.add_argument('--store', default=None, help='Каталог артефактов этапов (по умолчанию .traffic_flows)')
+    parser.add_argument('--force', action='store_true', help='Пересчитать этапы, даже если артефакты есть')
+    parser.add_argument('--profile', default=None, metavar='DIR', help='Профилировать этапы в каталог DIR')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    ingest = commands.add_parser('ingest', help='Прочитать GTFS')
+    ingest.add_argument('--gtfs-dir', required=True, help='Каталог GTFS')
+    ingest.add_argument('--limit', type=int, default=100000, help='Ограничение для GTFS данных')
+
+    _add_network_args(commands.add_parser('build-network', help='Построить снимок сети'))
+
+    assign = commands.add_parser('assign', help='Загрузить OD-матрицу на сеть')
+    _add_network_args(assign)
+    _add_assign_args(assign)
+    assign.add_argument('--engine', choices=ENGINES, default='florian')
+    assign.add_argument('--T', type=float, default=60.0, help='Deadline для time_arrived (в минутах)')
+    assign.add_argument('--top', type=int, default=10, help='Сколько самых загруженных рёбер показать')
+
+    sweep = commands.add_parser('sweep', help='assign для нескольких движков и значений T')
+    _add_network_args(sweep)
+    _add_assign_args(sweep)
+    sweep.add_argument('--engines', nargs='+', choices=ENGINES, default=list(ENGINES))
+    sweep.add_argument('--T', type=float, nargs='+', default=[60.0], help='Значения deadline (в минутах)')
+
+    report = commands.add_parser('report', help='Сводка по результатам assign')
+    report.add_argument('keys', nargs='*', help='Ключи (или префиксы) артефактов assign; по умолчанию последний')
+    report.add_argument('--top', type=int, default=10, help='Сколько самых загруженных рёбер показать')
+    report.add_argument('--csv', default=None, help='Записать объёмы рёбер в CSV (для одного ключа)')
+
+    equilibrium = commands.add_parser('equilibrium', help='Равновесное назначение с учётом переполнения')
+    _add_network_args(equilibrium)
+    equilibrium.add_argument('--od', required=True, help='OD-матрица: CSV (origin,destination,demand) или JSON')
+    equilibrium.add_argument('--engine', choices=ENGINES, default='florian')
+    equilibrium.add_argument('--T', type=float, default=60.0, help='Deadline для time_arrived (в минутах)')
+    equilibrium.add_argument('--method', choices=('msa', 'fw'), default='msa', help='Выбор шага: MSA или Frank-Wolfe')
+    equilibrium.add_argument('--iterations', type=int, default=50, help='Максимум итераций')
+    equilibrium.add_argument('--gap', type=float, default=1e-4, help='Целевой относительный разрыв')
+    equilibrium.add_argument('--vehicle-capacity', type=float, default=None,
+                             help='Мест в одном транспортном средстве (по умолчанию 100)')
+    equilibrium.add_argument('--period', type=float, default=60.0, help='Длительность периода спроса в минутах')
+    equilibrium.add_argument('--alpha', type=float, default=0.15, help='Коэффициент BPR-функции')
+    equilibrium.add_argument('--beta', type=float, default=4.0, help='Степень BPR-функции')
+    equilibrium.add_argument('--std-factor', type=float, default=0.0,
+                             help='Рост std времени в пути с загрузкой (для time_arrived)')
+    equilibrium.add_argument('--top', type=int, default=10, help='Сколько самых загруженных рёбер показать')
+    equilibrium.add_argument('--csv', default=None, help='Записать равновесные объёмы рёбер в CSV')
+
+    sensitivity = commands.add_parser('sensitivity', help='Производные суммарного времени по интервалам маршрутов')
+    _add_network_args(sensitivity)
+    sensitivity.add_argument('--od', required=True, help='OD-матрица: CSV (origin,destination,demand) или JSON')
+    sensitivity.add_argument('--top', type=int, default=20, help='Сколько маршрутов показать')
+
+    simulation = commands.add_parser('simulate', help='Имитация поездок: проверка R движка time_arrived')
+    _add_network_args(simulation)
+    simulation.add_argument('--od', required=True, help='OD-матрица: CSV (origin,destination,demand) или JSON')
+    simulation.add_argument('--passengers', type=int, default=10 ** 6, help='Число имитируемых пассажиров')
+    simulation.add_argument('--T', type=float, default=60.0, help='Deadline в минутах')
+    simulation.add_argument('--wait', default='model', help='Распределение ожидания: model, exponential или uniform')
+    simulation.add_argument('--seed', type=int, default=None, help='Зерно генератора случайных чисел')
+    simulation.add_argument('--top', type=int, default=20, help='Сколько OD-пар с наибольшим расхождением показать')
+    simulation.add_argument('--csv', default=None, help='Записать сравнение R по OD-парам в CSV')
+    simulation.add_argument('--links-csv', default=None, help='Записать объёмы рёбер с интервалами в CSV')
+
+    estimate = commands.add_parser('estimate', help='Приближённые объёмы по выборке назначений с интервалами')
+    _add_network_args(estimate)
+    estimate.add_argument('--od', required=True, help='OD-матрица: CSV (origin,destination,demand) или JSON')
+    estimate.add_argument('--engine', choices=ENGINES, default='florian')
+    estimate.add_argument('--T', type=float, default=60.0, help='Deadline для time_arrived (в минутах)')
+    estimate.add_argument('--error', type=float, default=0.05, help='Целевая относительная ошибка объёмов')
+    estimate.add_argument('--time-budget', type=float, default=None, help='Ограничение времени расчёта в секундах')
+    estimate.add_argument('--max-destinations', type=int, default=None, help='Не больше стольких назначений')
+    strata = estimate.add_mutually_exclusive_group()
+    strata.add_argument('--zones', default=None, help='CSV с колонками stop_id, zone_id: страты выборки')
+    strata.add_argument('--grid-cell', type=float, default=None, help='Страты — квадраты сетки со стороной в метрах')
+    estimate.add_argument('--seed', type=int, default=None, help='Зерно генератора случайных чисел')
+    estimate.add_argument('--top', type=int, default=20, help='Сколько самых загруженных рёбер показать')
+    estimate.add_argument('--csv', default=None, help='Записать оценки объёмов с интервалами в CSV')
+
+    headways = commands.add_parser('headways', help='Распределение парка по маршрутам при ограниченном числе машин')
+    _add_network_args(headways)
+    headways.add_argument('--od', required=True, help='OD-матрица: CSV (origin,destination,demand) или JSON')
+    headways.add_argument('--fleet', required=True, help='CSV с колонками route_id, fleet, cycle_time (минуты)')
+    headways.add_argument('--budget', type=float, default=None, help='Общий парк (по умолчанию сумма из --fleet)')
+    headways.add_argument('--min-fleet', type=float, default=1.0, help='Минимум машин на маршруте')
+    headways.add_argument('--iterations', type=int, default=20, help='Максимум итераций')
+    headways.add_argument('--step', type=float, default=1.0, help='Начальный шаг: машин на маршрут')
+    headways.add_argument('--candidates', type=int, default=4, help='Длин шага на итерации')
+    headways.add_argument('--workers', type=int, default=1, help='Процессов для расчёта кандидатов')
+    headways.add_argument('--csv', default=None, help='Записать рекомендованные интервалы в CSV')
+
+    select = commands.add_parser('select', help='Анализ выбранного ребра или зоны по индексу assign --selected-link')
+    select.add_argument('key', nargs='?', help='Ключ (или префикс) артефакта assign; по умолчанию последний')
+    query = select.add_mutually_exclusive_group(required=True)
+    query.add_argument('--link', nargs=2, metavar=('FROM', 'TO'), help='OD-потоки через ребро')
+    query.add_argument('--od', nargs=2, metavar=('ORIGIN', 'DESTINATION'), help='Рёбра, которыми едет OD-пара')
+    query.add_argument('--destinations', nargs='+', metavar='STOP', help='Рёбра, загруженные спросом в эти остановки')
+    query.add_argument('--zone', help='Рёбра, загруженные спросом в остановки зоны из --zones')
+    select.add_argument('--zones', default=None, help='CSV с колонками stop_id, zone_id для --zone')
+    select.add_argument('--top', type=int, default=20, help='Сколько строк показать')
+
+    commands.add_parser('status', help='Прогресс идущих и прерванных расчётов assign')
+
+    coordinator = commands.add_parser('coordinator', help='assign, раздаваемый рабочим на других машинах')
+    _add_network_args(coordinator)
+    _add_assign_args(coordinator, local=False)
+    coordinator.add_argument('--engine', choices=ENGINES, default='florian')
+    coordinator.add_argument('--T', type=float, default=60.0, help='Deadline для time_arrived (в минутах)')
+    coordinator.add_argument('--host', default='0.0.0.0')
+    coordinator.add_argument('--port', type=int, default=None, help='Порт (по умолчанию 8766)')
+    coordinator.add_argument('--batch-size', type=int, default=None, help='Назначений в пачке (по умолчанию 8)')
+    coordinator.add_argument('--lease-timeout', type=float, default=None, metavar='SEC',
+                             help='Через сколько секунд без результата пачка отдаётся другому рабочему '
+                                  '(по умолчанию 600)')
+
+    worker = commands.add_parser('worker', help='Рабочий для coordinator')
+    worker.add_argument('--connect', required=True, metavar='HOST[:PORT]', help='Адрес координатора')
+    worker.add_argument('--snapshot', default=None,
+                        help='Снимок сети; по умолчанию артефакт сети из --store (общий каталог)')
+    worker.add_argument('--processes', type=int, default=1, help='Сколько рабочих запустить на этой машине')
+    return parser
+
+
+def print_report(store, keys, top=10, csv_path=None, out=None):
+    from algos.pipeline import link_rows, summarize
+
+    out = out or sys.stdout
+    summaries = [summarize(store, key) for key in keys]
+    out.write(f"{'key':<17} {'engine':<13} {'T':>6} {'назнач.':>8} {'спрос':>10} {'рёбер':>7} "
+              f"{'сумма объёмов':>14} {'макс.':>10} {'время, с':>9}\n")
+    for s in summaries:
+        T = "-" if s['engine'] == 'florian' else f"{s['T']:g}"
+        out.write(f"{s['key']:<17} {s['engine']:<13} {T:>6} {s['n_destinations']:>8} {s['total_demand']:>10.1f} "
+                  f"{s['active_links']:>7} {s['total_link_volume']:>14.1f} {s['max_link_volume']:>10.1f} "
+                  f"{s['seconds']:>9.2f}\n")
+    if len(keys) == 1:
+        rows = link_rows(store.load('assign', keys[0]))
+        if top:
+            out.write(f"\nСамые загруженные рёбра:\n")
+            for i, j, v in rows[:top]:
+                out.write(f"  {i} -> {j}: {v:.1f}\n")
+        if csv_path:
+            with open(csv_path, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerow(['from_node', 'to_node', 'volume'])
+                writer.writerows(rows)
+    return summaries
+
+
+def print_select(index, link=None, od=None, destinations=None, top=20, out=None):
+    """Печатает ответ на один запрос к SelectedLinkIndex и возвращает его."""
+    out = out or sys.stdout
+    if link is not None:
+        rows = index.od_through(*link)
+        out.write(f"Через ребро {link[0]} -> {link[1]}: {sum(rows.values()):.1f} пасс., OD-пар {len(rows)}\n")
+    else:
+        rows = index.od_links(*od) if od is not None else index.zone_links(destinations)
+        out.write(f"Рёбер с потоком: {len(rows)}\n")
+    for (a, b), v in sorted(rows.items(), key=lambda row: -row[1])[:top]:
+        out.write(f"  {a} -> {b}: {v:.1f}\n")
+    return rows
+
+
+def print_equilibrium(solver, top=10, csv_path=None, out=None):
+    from algos.pipeline import link_rows
+
+    out = out or sys.stdout
+    out.write(f"{'итер.':>5} {'gap':>10} {'изм. потоков':>13} {'шаг':>8} {'пересчёт':>9} {'время, с':>9}\n")
+    for row in solver.history:
+        gap = '-' if row['gap'] is None else f"{row['gap']:.2e}"
+        change = '-' if row['flow_change'] is None else f"{row['flow_change']:.2e}"
+        out.write(f"{row['iteration']:>5} {gap:>10} {change:>13} {row['step']:>8.4f} "
+                  f"{row['recomputed']:>6}/{len(solver.destinations):<2} {row['seconds']:>9.2f}\n")
+    rows = link_rows(solver.volumes())
+    if top:
+        out.write(f"\nСамые загруженные рёбра:\n")
+        for i, j, v in rows[:top]:
+            out.write(f"  {i} -> {j}: {v:.1f}\n")
+    if csv_path:
+        with open(csv_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['from_node', 'to_node', 'volume'])
+            writer.writerows(rows)
+
+
+def print_sensitivity(network, od_matrix, top=20, out=None):
+    """Маршруты по убыванию dJ/dh: сколько минут всех поездок даёт минута интервала маршрута."""
+    from algos.sensitivity import by_route, total_time_gradient
+
+    out = out or sys.stdout
+    total, d_cost, d_headway = total_time_gradient(network, od_matrix)
+    routes = sorted(by_route(d_headway).items(), key=lambda row: -row[1])
+    out.write(f"Суммарное ожидаемое время: {total:.1f} пасс.-мин\n")
+    out.write(f"{'маршрут':<10} {'название':<32} {'dJ/dh, пасс.-мин/мин':>22}\n")
+    for route, value in routes[:top]:
+        out.write(f"{route:<10} {str(network.route_names.get(route, ''))[:32]:<32} {value:>22.1f}\n")
+    return routes
+
+
+def print_headways(optimizer, route_names=None, csv_path=None, out=None):
+    out = out or sys.stdout
+    route_names = route_names or {}
+    out.write(f"{'итер.':>5} {'J, пасс.-мин':>14} {'шаг, машин':>11} {'кандидатов':>11} {'пересчёт':>9} "
+              f"{'время, с':>9}\n")
+    for row in optimizer.history:
+        out.write(f"{row['iteration']:>5} {row['objective']:>14.1f} {row['step']:>11.3f} {row['candidates']:>11} "
+                  f"{row['recomputed']:>9} {row['seconds']:>9.2f}\n")
+    before = optimizer.headways(optimizer.initial_fleet)
+    rows = [(route, str(route_names.get(route, '')), n0, n, before[route], h) for route, n0, n, h in
+            zip(optimizer.routes, optimizer.initial_fleet.tolist(), optimizer.fleet.tolist(),
+                optimizer.headways().values())]
+    out.write(f"\n{'маршрут':<10} {'название':<32} {'машин':>14} {'интервал, мин':>16}\n")
+    for route, name, n0, n, h0, h in rows:
+        out.write(f"{route:<10} {name[:32]:<32} {n0:>5.1f} -> {n:<5.1f} {h0:>6.1f} -> {h:<6.1f}\n")
+    if csv_path:
+        with open(csv_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['route_id', 'fleet', 'recommended_fleet', 'headway', 'recommended_headway'])
+            writer.writerows((route, n0, n, h0, h) for route, _, n0, n, h0, h in rows)
+    return rows
+
+
+def print_simulation(result, T, top=20, csv_path=None, links_csv_path=None, out=None):
+    out = out or sys.stdout
+    rows = sorted(((o, d, row) for (o, d), row in result.od.items() if row['passengers']),
+                  key=lambda r: -abs(r[2]['R'] - r[2]['R_analytic']))
+    outside = result.outside_interval()
+    out.write(f"Пассажиров: {result.n_passengers}, OD-пар: {len(result.od)}, T = {T:g} мин, "
+              f"время {result.seconds:.2f} с\n")
+    if rows:
+        out.write(f"R движка вне 95% интервала: {len(outside)} пар, наибольшее расхождение "
+                  f"{abs(rows[0][2]['R'] - rows[0][2]['R_analytic']):.4f}\n")
+    out.write(f"\n{'origin':<12} {'destination':<12} {'пасс.':>8} {'R':>7} {'интервал':>17} {'R движка':>9} "
+              f"{'ср. время':>10} {'движок':>8}\n")
+    for o, d, row in rows[:top]:
+        out.write(f"{o:<12} {d:<12} {row['passengers']:>8} {row['R']:>7.4f} "
+                  f"[{row['R_low']:.4f}, {row['R_high']:.4f}] {row['R_analytic']:>9.4f} "
+                  f"{row['mean_time']:>10.2f} {row['analytic_mean']:>8.2f}\n")
+    if csv_path:
+        fields = ['passengers', 'on_time', 'R', 'R_low', 'R_high', 'R_analytic', 'mean_time', 'analytic_mean']
+        with open(csv_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['origin', 'destination'] + fields)
+            writer.writerows([o, d] + [row[k] for k in fields] for (o, d), row in result.od.items())
+    if links_csv_path:
+        with open(links_csv_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['from_node', 'to_node', 'route_id', 'volume', 'low', 'high', 'analytic'])
+            writer.writerows((a.from_node, a.to_node, a.route_id, row['volume'], row['low'], row['high'],
+                              row['analytic']) for a, row in result.links.items())
+    return rows
+
+
+def print_estimate(sampler, top=20, csv_path=None, out=None):
+    out = out or sys.stdout
+    out.write(f"{'раунд':>5} {'назнач.':>8} {'посчитано':>10} {'доля спроса':>12} {'ошибка':>9} {'время, с':>9}\n")
+    for row in sampler.history:
+        out.write(f"{row['round']:>5} {row['destinations']:>8} {row['computed']:>10} {row['demand_share']:>12.3f} "
+                  f"{row['relative_error']:>9.4f} {row['seconds']:>9.2f}\n")
+    rows = sorted(((i, j, v, low, high) for (i, j), (v, low, high) in sampler.link_intervals().items()),
+                  key=lambda row: -row[2])
+    if top:
+        out.write(f"\nСамые загруженные рёбра (оценка и интервал):\n")
+        for i, j, v, low, high in rows[:top]:
+            out.write(f"  {i} -> {j}: {v:.1f} [{low:.1f}, {high:.1f}]\n")
+    if csv_path:
+        with open(csv_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['from_node', 'to_node', 'volume', 'low', 'high'])
+            writer.writerows(rows)
+    return rows
+
+
+def print_status(store, out=None):
+    from algos.checkpoint import read_progress
+    from algos.pipeline import partial_dir, partial_runs
+
+    out = out or sys.stdout
+    keys = partial_runs(store)
+    if not keys:
+        out.write("Незавершённых расчётов нет\n")
+    for key in keys:
+        progress = read_progress(partial_dir(store, key))
+        age = time.time() - progress['updated']
+        out.write(f"{key}: готово {progress['completed']}/{progress['total']} назначений, "
+                  f"сумма объёмов {progress['total_link_volume']:.1f}, обновлено {age:.0f} с назад\n")
+    return keys
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    from algos.pipeline import DEFAULT_STORE, ArtifactStore, read_od_matrix, run_assign, run_build_network, run_ingest
+
+    store = ArtifactStore(args.store or DEFAULT_STORE)
+    profiler = StageProfiler(args.profile)
+
+    if args.command == 'ingest':
+        print(run_ingest(store, args.gtfs_dir, args.limit, args.force, profiler))
+    elif args.command == 'worker':
+        from algos.distributed import DEFAULT_PORT, run_worker
+
+        host, _, port = args.connect.partition(':')
+        port = int(port or DEFAULT_PORT)
+        if args.processes > 1:
+            with ProcessPoolExecutor(args.processes) as pool:
+                futures = [pool.submit(run_worker, host, port, args.snapshot, store.root) for _ in range(args.processes)]
+                n_batches = sum(f.result() for f in futures)
+        else:
+            n_batches = run_worker(host, port, args.snapshot, store.root)
+        print(f"Посчитано пачек: {n_batches}")
+    elif args.command == 'status':
+        print_status(store)
+    elif args.command == 'select':
+        from algos.selected_link import SELECTED_LINK_FILE, SelectedLinkIndex
+        from algos.zones import load_zone_mapping
+
+        key = store.resolve('assign', args.key) if args.key else (store.keys('assign')[-1:] or [None])[0]
+        path = store.path('assign', key, SELECTED_LINK_FILE) if key else None
+        if path is None or not os.path.exists(path):
+            raise SystemExit(f"Нет индекса выбранного ребра для {key or store.root}: нужен assign --selected-link")
+        destinations = args.destinations
+        if args.zone is not None:
+            if not args.zones:
+                raise SystemExit("--zone требует --zones")
+            destinations = [s for s, z in load_zone_mapping(args.zones).items() if z == args.zone]
+        print_select(SelectedLinkIndex.load(path), args.link, args.od, destinations, args.top)
+    elif args.command == 'report':
+        keys = [store.resolve('assign', k) for k in args.keys] or store.keys('assign')[-1:]
+        if not keys:
+            raise SystemExit(f"В {store.root} нет результатов assign")
+        print_report(store, keys, args.top, args.csv)
+    else:
+        from algos.network import read_network
+
+        network = run_build_network(store, args.gtfs_dir, args.limit, args.walk_radius, args.force, profiler)
+        print(network)
+        if args.command in ('sensitivity', 'equilibrium', 'headways', 'simulate', 'estimate'):
+            value = network.value if network.value is not None else read_network(store.path('network', network.key))
+        if args.command == 'sensitivity':
+            print_sensitivity(value, read_od_matrix(args.od), args.top)
+        elif args.command == 'equilibrium':
+            from algos.equilibrium import DEFAULT_VEHICLE_CAPACITY, CongestedAssignment, CrowdingCost
+
+            capacity = DEFAULT_VEHICLE_CAPACITY if args.vehicle_capacity is None else args.vehicle_capacity
+            cost = CrowdingCost(args.alpha, args.beta, capacity, args.period, args.std_factor)
+            solver = CongestedAssignment(value, read_od_matrix(args.od), cost, args.engine, args.T)
+            solver.run(args.iterations, args.gap, args.method)
+            print_equilibrium(solver, args.top, args.csv)
+        elif args.command == 'simulate':
+            from algos.simulation import WAIT_MODELS, simulate
+
+            if args.wait not in WAIT_MODELS:
+                parser.error(f"--wait: ожидается одно из {', '.join(WAIT_MODELS)}")
+            result = simulate(value, read_od_matrix(args.od), args.passengers, args.T, args.wait, args.seed)
+            print_simulation(result, args.T, args.top, args.csv, args.links_csv)
+        elif args.command == 'estimate':
+            from algos.destination_sampling import SampledAssignment
+            from algos.zones import grid_zone_mapping, load_zone_mapping
+
+            stop_to_zone = None
+            if args.zones:
+                stop_to_zone = load_zone_mapping(args.zones)
+            elif args.grid_cell:
+                stop_to_zone = grid_zone_mapping(value.stop_coords, args.grid_cell)
+            sampler = SampledAssignment(value, read_od_matrix(args.od), args.engine, args.T, stop_to_zone, args.seed)
+            sampler.run(args.error, args.time_budget, args.max_destinations)
+            print_estimate(sampler, args.top, args.csv)
+        elif args.command == 'headways':
+            from algos.headway_optimizer import HeadwayOptimizer, read_fleet
+
+            fleet, cycle_time = read_fleet(args.fleet)
+            optimizer = HeadwayOptimizer(value, read_od_matrix(args.od), fleet, cycle_time, args.budget,
+                                         args.min_fleet, args.step, args.candidates, args.workers)
+            optimizer.run(args.iterations)
+            print_headways(optimizer, value.route_names, args.csv)
+        elif args.command == 'coordinator':
+            from algos.distributed import DEFAULT_BATCH_SIZE, DEFAULT_LEASE_TIMEOUT, DEFAULT_PORT, run_coordinator
+
+            port = DEFAULT_PORT if args.port is None else args.port
+            batch_size = DEFAULT_BATCH_SIZE if args.batch_size is None else args.batch_size
+            lease_timeout = DEFAULT_LEASE_TIMEOUT if args.lease_timeout is None else args.lease_timeout
+            result = run_coordinator(store, network.key, args.od, args.engine, args.T, args.host, port,
+                                     batch_size, lease_timeout, args.resume, args.checkpoint_interval,
+                                     args.force)
+            print(result)
+            print_report(store, [result.key])
+        elif args.command in ('assign', 'sweep'):
+            runs = [(args.engine, args.T)] if args.command == 'assign' else \
+                [(engine, T) for engine in args.engines for T in (args.T if engine != 'florian' else args.T[:1])]
+            keys = []
+            for engine, T in runs:
+                result = run_assign(store, network.key, args.od, engine, T, args.workers, args.memory_budget,
+                                    args.force, network.value, profiler, args.resume, args.checkpoint_interval,
+                                    args.selected_link)
+                print(result)
+                keys.append(result.key)
+            print()
+            print_report(store, keys, top=args.top if args.command == 'assign' else 0)
+    profiler.write_summary()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,241 @@
+import numpy as np
+
+from utils import Link, Strategy, Volumes, SFResult
+
+# Компактное хранение результатов: метки и частоты — массивы float32 по узлам, привлекательное
+# множество — массив позиций рёбер в LinkTable, объёмы — только ненулевые пары (позиция, значение).
+# Атрибуты labels, freqs, a_set, links, nodes работают как у Strategy/Volumes (словари и список
+# рёбер), так что компактный результат можно отдавать коду сравнений и assign_demand.
+#
+#   table = LinkTable(network.all_links, network.all_stops)
+#   save_results("results.npz", table, {destination: SFResult(...)})
+#   table, results = load_results("results.npz")
+
+LINK_FLOAT_FIELDS = ('travel_cost', 'headway', 'mean_travel_time', 'std_travel_time', 'delay_mu', 'delay_sigma')
+
+
+class LinkTable:
+    """Рёбра и узлы сети с фиксированными позициями; pairs — пары (from, to), по которым считаются объёмы."""
+    def __init__(self, all_links, all_stops):
+        self.links = list(all_links)
+        self.node_ids = sorted(set(all_stops) | {s for link in self.links for s in (link.from_node, link.to_node)})
+        self.node_pos = {s: k for k, s in enumerate(self.node_ids)}
+        self.pairs = sorted({(link.from_node, link.to_node) for link in self.links})
+        self.pair_pos = {pair: k for k, pair in enumerate(self.pairs)}
+        self._link_pos = None
+        self._link_key_pos = None
+
+    def link_positions(self, links):
+        """Позиции рёбер в таблице; ребро ищется по объекту, а если это копия — по атрибутам."""
+        if self._link_pos is None:
+            self._link_pos = {id(link): k for k, link in enumerate(self.links)}
+        positions = []
+        for link in links:
+            k = self._link_pos.get(id(link))
+            if k is None:
+                if self._link_key_pos is None:
+                    self._link_key_pos = {}
+                    for pos, other in enumerate(self.links):
+                        self._link_key_pos.setdefault(_link_key(other), pos)
+                k = self._link_key_pos[_link_key(link)]
+            positions.append(k)
+        return np.array(positions, dtype=np.int32)
+
+    def arrays(self):
+        columns = {
+            'node_ids': np.array(self.node_ids, dtype=str),
+            'link_from': np.array([self.node_pos[link.from_node] for link in self.links], dtype=np.int32),
+            'link_to': np.array([self.node_pos[link.to_node] for link in self.links], dtype=np.int32),
+            'link_route': np.array([link.route_id for link in self.links], dtype=str),
+        }
+        for field in LINK_FLOAT_FIELDS:
+            columns['link_' + field] = np.array([getattr(link, field) for link in self.links], dtype=np.float64)
+        return columns
+
+    @classmethod
+    def from_arrays(cls, columns):
+        node_ids = columns['node_ids'].tolist()
+        fields = {field: columns['link_' + field].tolist() for field in LINK_FLOAT_FIELDS}
+        links = [Link(node_ids[i], node_ids[j], route, **{field: values[k] for field, values in fields.items()})
+                 for k, (i, j, route) in enumerate(zip(columns['link_from'].tolist(), columns['link_to'].tolist(),
+                                                        columns['link_route'].tolist()))]
+        return cls(links, node_ids)
+
+
+def _link_key(link):
+    return (link.from_node, link.to_node, link.route_id, link.travel_cost, link.headway)
+
+
+class CompactStrategy:
+    """
+    Strategy в массивах: labels — float32 (n_nodes,) или (n_nodes, 2) для (mean, var) модели времени
+    прибытия, freqs — float32 (n_nodes,), a_set_index — int32 позиции рёбер в table.
+    """
+    def __init__(self, table, labels, freqs, a_set_index):
+        self.table = table
+        self.label_array = labels
+        self.freq_array = freqs
+        self.a_set_index = a_set_index
+        self._labels = None
+        self._freqs = None
+
+    @classmethod
+    def from_strategy(cls, strategy, table):
+        sample = next(iter(strategy.labels.values()), 0.0)
+        width = len(sample) if isinstance(sample, tuple) else None
+        labels = np.full((len(table.node_ids), width) if width else len(table.node_ids), np.inf, dtype=np.float32)
+        freqs = np.zeros(len(table.node_ids), dtype=np.float32)
+        for s, label in strategy.labels.items():
+            labels[table.node_pos[s]] = label
+        for s, freq in strategy.freqs.items():
+            freqs[table.node_pos[s]] = freq
+        return cls(table, labels, freqs, table.link_positions(strategy.a_set))
+
+    @property
+    def labels(self):
+        if self._labels is None:
+            values = self.label_array.tolist()
+            if self.label_array.ndim == 2:
+                values = [tuple(v) for v in values]
+            self._labels = dict(zip(self.table.node_ids, values))
+        return self._labels
+
+    @property
+    def freqs(self):
+        if self._freqs is None:
+            self._freqs = dict(zip(self.table.node_ids, self.freq_array.tolist()))
+        return self._freqs
+
+    @property
+    def a_set(self):
+        links = self.table.links
+        return [links[k] for k in self.a_set_index.tolist()]
+
+    @a_set.setter
+    def a_set(self, links):
+        self.a_set_index = self.table.link_positions(links)
+
+    def a_set_bitset(self):
+        """Привлекательное множество как битовая маска по рёбрам таблицы (np.packbits)."""
+        mask = np.zeros(len(self.table.links), dtype=bool)
+        mask[self.a_set_index] = True
+        return np.packbits(mask)
+
+    def to_strategy(self):
+        return Strategy(dict(self.labels), dict(self.freqs), self.a_set)
+
+
+class CompactVolumes:
+    """Volumes в разреженном виде: link_index/link_values по table.pairs, node_index/node_values по узлам."""
+    def __init__(self, table, link_index, link_values, node_index, node_values):
+        self.table = table
+        self.link_index = link_index
+        self.link_values = link_values
+        self.node_index = node_index
+        self.node_values = node_values
+        self._links = None
+        self._nodes = None
+
+    @classmethod
+    def from_volumes(cls, volumes, table):
+        links = sorted((table.pair_pos[i, j], v) for i, targets in volumes.links.items()
+                       for j, v in targets.items() if v != 0.0)
+        nodes = sorted((table.node_pos[s], v) for s, v in volumes.nodes.items() if v != 0.0)
+        return cls(table, np.array([k for k, _ in links], dtype=np.int32), np.array([v for _, v in links], dtype=np.float32),
+                   np.array([k for k, _ in nodes], dtype=np.int32), np.array([v for _, v in nodes], dtype=np.float32))
+
+    @property
+    def links(self):
+        """{from: {to: объём}} только по ненулевым рёбрам."""
+        if self._links is None:
+            self._links = {}
+            pairs = self.table.pairs
+            for k, v in zip(self.link_index.tolist(), self.link_values.tolist()):
+                i, j = pairs[k]
+                self._links.setdefault(i, {})[j] = v
+        return self._links
+
+    @property
+    def nodes(self):
+        if self._nodes is None:
+            node_ids = self.table.node_ids
+            self._nodes = {node_ids[k]: v for k, v in zip(self.node_index.tolist(), self.node_values.tolist())}
+        return self._nodes
+
+    def dense_links(self):
+        values = np.zeros(len(self.table.pairs), dtype=np.float32)
+        values[self.link_index] = self.link_values
+        return values
+
+    def to_volumes(self):
+        return Volumes({i: dict(t) for i, t in self.links.items()}, dict(self.nodes))
+
+
+def compact_result(result, table):
+    """SFResult с CompactStrategy и CompactVolumes (готовые компактные части не пересобираются)."""
+    strategy, volumes = result.strategy, result.volumes
+    if strategy is not None and not isinstance(strategy, CompactStrategy):
+        strategy = CompactStrategy.from_strategy(strategy, table)
+    if volumes is not None and not isinstance(volumes, CompactVolumes):
+        volumes = CompactVolumes.from_volumes(volumes, table)
+    return SFResult(strategy, volumes, result.stats)
+
+
+def _concat(parts, dtype):
+    offsets = np.zeros(len(parts) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(p) for p in parts])
+    values = np.concatenate(parts).astype(dtype) if parts else np.zeros(0, dtype=dtype)
+    return values, offsets
+
+
+def save_results(path, table, results):
+    """
+    Пишет таблицу сети и результаты {destination: SFResult} в один .npz. Массивы результатов
+    склеиваются, offsets_* хранят границы каждого назначения.
+    """
+    results = {d: compact_result(r, table) for d, r in results.items()}
+    destinations = list(results)
+    strategies = [results[d].strategy for d in destinations]
+    volumes = [results[d].volumes for d in destinations]
+    columns = table.arrays()
+    columns['destinations'] = np.array(destinations, dtype=str)
+    columns['has_strategy'] = np.array([s is not None for s in strategies])
+    columns['has_volumes'] = np.array([v is not None for v in volumes])
+    strategies = [s for s in strategies if s is not None]
+    volumes = [v for v in volumes if v is not None]
+    n_nodes = len(table.node_ids)
+    columns['labels'] = np.stack([s.label_array for s in strategies]) if strategies else np.zeros((0, n_nodes), np.float32)
+    columns['freqs'] = np.stack([s.freq_array for s in strategies]) if strategies else np.zeros((0, n_nodes), np.float32)
+    columns['a_set'], columns['offsets_a_set'] = _concat([s.a_set_index for s in strategies], np.int32)
+    columns['link_index'], columns['offsets_links'] = _concat([v.link_index for v in volumes], np.int32)
+    columns['link_values'], _ = _concat([v.link_values for v in volumes], np.float32)
+    columns['node_index'], columns['offsets_nodes'] = _concat([v.node_index for v in volumes], np.int32)
+    columns['node_values'], _ = _concat([v.node_values for v in volumes], np.float32)
+    np.savez_compressed(path, **columns)
+
+
+def load_results(path):
+    """(LinkTable, {destination: SFResult}) из файла save_results."""
+    with np.load(path) as data:
+        columns = {name: data[name] for name in data.files}
+    table = LinkTable.from_arrays(columns)
+    results = {}
+    k_strategy = k_volumes = 0
+    a_set, links, nodes = columns['offsets_a_set'], columns['offsets_links'], columns['offsets_nodes']
+    for destination, has_strategy, has_volumes in zip(columns['destinations'].tolist(), columns['has_strategy'].tolist(),
+                                                       columns['has_volumes'].tolist()):
+        strategy = volumes = None
+        if has_strategy:
+            k = k_strategy
+            strategy = CompactStrategy(table, columns['labels'][k], columns['freqs'][k],
+                                       columns['a_set'][a_set[k]:a_set[k + 1]])
+            k_strategy += 1
+        if has_volumes:
+            k = k_volumes
+            volumes = CompactVolumes(table, columns['link_index'][links[k]:links[k + 1]],
+                                     columns['link_values'][links[k]:links[k + 1]],
+                                     columns['node_index'][nodes[k]:nodes[k + 1]],
+                                     columns['node_values'][nodes[k]:nodes[k + 1]])
+            k_volumes += 1
+        results[destination] = SFResult(strategy, volumes)
+    return table, results
@@ -0,0 +1,188 @@
+import math
+import time
+
+import numpy as np
+
+from algos.checkpoint import VolumeAccumulator
+from algos.pipeline import _assign_destination, split_by_destination
+
+# Приближённые суммарные объёмы по выборке назначений. Назначения делятся на страты по зонам
+# (stop_to_zone, см. algos.zones). Внутри страты h назначение d со спросом G_d попадает в выборку
+# с вероятностью pi_d = min(1, lambda_h * G_d) (пуассоновская выборка, пропорциональная спросу):
+# каждому назначению один раз выдаётся случайное u_d, и оно выбрано, пока u_d < pi_d. Объёмы выбранных
+# назначений считает тот же движок, что и полный расчёт (pipeline._assign_destination), и
+# складываются с весами 1 / pi_d (оценка Хорвица-Томпсона). Дисперсия оценки объёма по ребру —
+#
+#   sum_d (1 - pi_d) / pi_d^2 * y_d^2
+#
+# по выбранным назначениям. Назначения с pi_d = 1 считаются точно и в дисперсию не входят.
+#
+# Выборка наращивается раундами: ожидаемый размер растёт примерно в полтора раза и делится между
+# стратами пропорционально их спросу (не меньше min_per_stratum назначений). lambda_h от раунда к
+# раунду только растёт, так что выборки вложены и посчитанные назначения не пересчитываются. Когда
+# выбраны все назначения, все pi_d = 1 и результат совпадает с полным расчётом. Раунды идут, пока
+# относительная ошибка (сумма полуширин интервалов по рёбрам, делённая на сумму оценок) больше
+# target_error и не кончился time_budget; оценка всегда по последнему завершённому раунду.
+
+
+def _inclusion_rate(demand, n):
+    """lambda, при которой sum min(1, lambda * demand) = n (inf — если выбираются все)."""
+    if n >= len(demand):
+        return math.inf
+    ordered = np.sort(demand)[::-1]
+    tails = np.cumsum(ordered[::-1])[::-1]  # tails[k] = сумма ordered[k:]
+    for k in range(int(n) + 1):
+        rate = (n - k) / tails[k]
+        if rate * ordered[k] <= 1:
+            return rate
+    return math.inf
+
+
+class _Stratum:
+    def __init__(self, destinations, demand, rng):
+        self.destinations = destinations
+        self.demand = np.array(demand, dtype=float)
+        self.total = float(self.demand.sum())
+        self.u = rng.random(len(destinations))
+        self.rate = 0.0
+
+    def inclusion(self, rate=None):
+        rate = self.rate if rate is None else rate
+        return np.minimum(1.0, rate * self.demand) if rate < math.inf else np.ones(len(self.demand))
+
+    def selected(self, rate=None):
+        return np.flatnonzero(self.u < self.inclusion(rate))
+
+
+class SampledAssignment:
+    """
+    Оценка суммарных объёмов assign_all(network, od_matrix, engine, T) по выборке назначений.
+    stop_to_zone {stop: zone} задаёт страты (назначения без зоны — отдельная страта), без него страта одна.
+    z — квантиль нормального распределения для интервалов (1.96 — 95%).
+    """
+    def __init__(self, network, od_matrix, engine='florian', T=60.0, stop_to_zone=None, seed=None, z=1.96):
+        self.network = network
+        self.engine = engine
+        self.T = T
+        self.z = z
+        self.layout = VolumeAccumulator(network)
+        self.n_links = len(self.layout.link_pairs)
+        self.parts = {d: od for d, od in split_by_destination(od_matrix).items() if d in network.all_stops}
+        rng = np.random.default_rng(seed)
+        groups = {}
+        for destination, od in self.parts.items():
+            zone = stop_to_zone.get(destination) if stop_to_zone else None
+            destinations, demand = groups.setdefault(zone, ([], []))
+            destinations.append(destination)
+            demand.append(sum(targets[destination] for targets in od.values()))
+        self.strata = [_Stratum(destinations, demand, rng) for _, (destinations, demand) in
+                       sorted(groups.items(), key=lambda item: str(item[0]))]
+        self.total_demand = sum(stratum.total for stratum in self.strata)
+        self.results = {}  # destination -> (позиции, объёмы) по рёбрам, затем по узлам
+        self.history = []
+
+    @property
+    def n_selected(self):
+        return sum(len(stratum.selected()) for stratum in self.strata)
+
+    def _compute(self, destination):
+        links, nodes = _assign_destination(destination, self.parts[destination], self.engine, self.T, self.network)
+        values = {}
+        for i, targets in links.items():
+            for j, v in targets.items():
+                if v:
+                    values[self.layout.link_pos[i, j]] = v
+        for s, v in nodes.items():
+            if v:
+                values[self.n_links + self.layout.node_pos[s]] = v
+        positions = np.array(sorted(values), dtype=np.int64)
+        self.results[destination] = (positions, np.array([values[k] for k in positions.tolist()]))
+
+    def _rates(self, n, min_per_stratum):
+        """lambda_h страт для ожидаемого размера выборки n (не меньше текущих)."""
+        if n >= len(self.parts):
+            return [math.inf] * len(self.strata)
+        rates = []
+        for stratum in self.strata:
+            size = max(min_per_stratum, n * stratum.total / self.total_demand)
+            rates.append(max(stratum.rate, _inclusion_rate(stratum.demand, min(size, len(stratum.destinations)))))
+        return rates
+
+    def estimate(self):
+        """(оценки, дисперсии) по парам layout.link_pairs, затем по узлам layout.node_ids."""
+        size = self.n_links + len(self.layout.node_ids)
+        total, variance = np.zeros(size), np.zeros(size)
+        for stratum in self.strata:
+            inclusion = stratum.inclusion()
+            for k in stratum.selected().tolist():
+                positions, values = self.results[stratum.destinations[k]]
+                pi = inclusion[k]
+                total[positions] += values / pi
+                variance[positions] += (1 - pi) / pi ** 2 * values ** 2
+        return total, variance
+
+    def relative_error(self):
+        total, variance = self.estimate()
+        links = total[:self.n_links].sum()
+        complete = all(stratum.rate == math.inf for stratum in self.strata)
+        if not links:
+            return 0.0 if complete else math.inf
+        return float(self.z * np.sqrt(variance[:self.n_links]).sum() / links)
+
+    def run(self, target_error=0.05, time_budget=None, max_destinations=None, min_per_stratum=2, growth=1.5):
+        """
+        Наращивает выборку раундами, пока relative_error() > target_error, не истекли time_budget секунд
+        и ожидаемый размер выборки не больше max_destinations. Первый раунд выполняется всегда, следующий,
+        не уложившийся в time_budget, в оценку не входит. Возвращает self.history: по раунду — destinations (выбрано), computed
+        (посчитано движком всего), demand_share (доля спроса выбранных назначений), relative_error,
+        seconds.
+        """
+        start = time.perf_counter()
+        n_all = len(self.parts)
+        limit = n_all if max_destinations is None else min(max_destinations, n_all)
+        n = max(self.n_selected * growth, 2 * len(self.strata), 1)
+        while True:
+            round_start = time.perf_counter()
+            rates = self._rates(min(n, limit), min_per_stratum)
+            finished = True
+            for stratum, rate in zip(self.strata, rates):
+                for k in stratum.selected(rate).tolist():
+                    destination = stratum.destinations[k]
+                    if destination not in self.results:
+                        out_of_time = time_budget is not None and time.perf_counter() - start > time_budget
+                        if out_of_time and self.history:
+                            finished = False
+                            break
+                        self._compute(destination)
+                if not finished:
+                    break
+            if not finished:
+                break
+            for stratum, rate in zip(self.strata, rates):
+                stratum.rate = rate
+            error = self.relative_error()
+            covered = sum(float(stratum.demand[stratum.selected()].sum()) for stratum in self.strata)
+            self.history.append({'round': len(self.history), 'destinations': self.n_selected,
+                                 'computed': len(self.results),
+                                 'demand_share': covered / self.total_demand if self.total_demand else 1.0,
+                                 'relative_error': error, 'seconds': time.perf_counter() - round_start})
+            if error <= target_error or n >= limit:
+                break
+            if time_budget is not None and time.perf_counter() - start > time_budget:
+                break
+            n = min(n * growth, limit)
+        return self.history
+
+    def volumes(self):
+        """Volumes оценок (по всем рёбрам и узлам, как у assign_all)."""
+        total, _ = self.estimate()
+        self.layout.links, self.layout.nodes = total[:self.n_links], total[self.n_links:]
+        return self.layout.volumes()
+
+    def link_intervals(self):
+        """{(from, to): (оценка, нижняя граница, верхняя граница)} по рёбрам с ненулевой оценкой."""
+        total, variance = self.estimate()
+        half = self.z * np.sqrt(variance[:self.n_links])
+        return {self.layout.link_pairs[k]: (float(total[k]), float(max(total[k] - half[k], 0.0)),
+                                            float(total[k] + half[k]))
+                for k in np.flatnonzero(total[:self.n_links]).tolist()}
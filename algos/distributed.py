@@ -0,0 +1,271 @@
+import asyncio
+import json
+import os
+import socket
+import time
+from collections import deque
+
+from algos.checkpoint import VolumeAccumulator, Checkpoint
+from algos.network import read_network
+from algos.pipeline import DEFAULT_STORE, ArtifactStore, file_sha256, split_by_destination, _assign_destination
+
+# Распределённый расчёт назначений: координатор раздаёт пачки назначений по TCP, рабочие
+# на разных машинах считают их по одному и тому же снимку сети и возвращают суммы объёмов
+# пачки разреженными векторами по позициям VolumeAccumulator (порядок рёбер у всех одинаковый,
+# т.к. снимок один). Протокол — JSON по строке на сообщение:
+#
+#   рабочий -> {"type": "hello", "worker": имя}
+#   коорд.  -> {"type": "config", "network": ключ снимка, "sha256": ..., "engine": ..., "T": ...}
+#   рабочий -> {"type": "request"}
+#   коорд.  -> {"type": "batch", "batch": id, "od": {destination: {origin: {destination: demand}}}}
+#              | {"type": "wait", "delay": с} | {"type": "done"}
+#   рабочий -> {"type": "result", "batch": id, "links": [[позиция, объём]...], "nodes": [...]}
+#
+#   коорд.  -> {"type": "error", "message": ...} — расчёт прерван
+#
+# Выданная пачка арендуется рабочим на lease_timeout секунд. Если соединение с рабочим
+# оборвалось или аренда истекла, пачка возвращается в очередь; повторный результат по уже
+# учтённой пачке отбрасывается. Ошибка протокола (строка длиннее лимита, неразборчивый JSON)
+# не лечится повтором, поэтому расчёт прерывается: рабочие получают error, run() — RuntimeError.
+# Лимит строки координатора рассчитан на результат со всеми рёбрами и узлами сети.
+
+DEFAULT_PORT = 8766
+DEFAULT_BATCH_SIZE = 8
+DEFAULT_LEASE_TIMEOUT = 600.0
+WAIT_DELAY = 0.2
+ENTRY_BYTES = 64  # запас на одну пару [позиция, объём] в JSON
+
+
+async def _send(writer, message):
+    writer.write(json.dumps(message).encode('utf-8') + b'\n')
+    await writer.drain()
+
+
+class Coordinator:
+    """
+    Раздаёт назначения od_matrix рабочим и суммирует их результаты в VolumeAccumulator по network.
+    network_key и snapshot_sha256 передаются рабочим, чтобы они загрузили тот же снимок;
+    checkpoint (algos.checkpoint.Checkpoint) сохраняет накопленное, resume продолжает с него.
+    """
+    def __init__(self, network, od_matrix, engine='florian', T=60.0, network_key=None, snapshot_sha256=None,
+                 batch_size=DEFAULT_BATCH_SIZE, lease_timeout=DEFAULT_LEASE_TIMEOUT, checkpoint=None, resume=False):
+        self.parts = {d: od for d, od in split_by_destination(od_matrix).items() if d in network.all_stops}
+        self.accumulator = VolumeAccumulator(network)
+        self.checkpoint = checkpoint
+        if checkpoint is not None and resume and checkpoint.restore(self.accumulator):
+            done = set(self.accumulator.completed)
+            self.parts = {d: od for d, od in self.parts.items() if d not in done}
+        self.config = {'type': 'config', 'network': network_key, 'sha256': snapshot_sha256, 'engine': engine, 'T': T}
+        destinations = list(self.parts)
+        self.batches = [destinations[k:k + batch_size] for k in range(0, len(destinations), batch_size)]
+        self.pending = deque(range(len(self.batches)))
+        self.leases = {}  # batch -> (рабочий, срок аренды)
+        self.done = set()
+        self.lease_timeout = lease_timeout
+        self.counters = {'batches_sent': 0, 'requeued': 0, 'duplicates': 0, 'workers_lost': 0}
+        self.workers = {}
+        self._writers = set()
+        self.line_limit = ENTRY_BYTES * (len(self.accumulator.link_pairs) + len(self.accumulator.node_ids)) + 2 ** 16
+        self.error = None
+        self.finished = None
+        self.server = None
+
+    @property
+    def n_destinations(self):
+        return len(self.accumulator.completed)
+
+    def _expire_leases(self):
+        now = time.monotonic()
+        for batch, (worker, deadline) in list(self.leases.items()):
+            if deadline < now:
+                self._requeue(batch)
+
+    def _requeue(self, batch):
+        del self.leases[batch]
+        self.pending.appendleft(batch)
+        self.counters['requeued'] += 1
+
+    def _next_message(self, worker):
+        self._expire_leases()
+        while self.pending:
+            batch = self.pending.popleft()
+            if batch in self.done or batch in self.leases:
+                continue
+            self.leases[batch] = (worker, time.monotonic() + self.lease_timeout)
+            self.counters['batches_sent'] += 1
+            return {'type': 'batch', 'batch': batch, 'od': {d: self.parts[d] for d in self.batches[batch]}}
+        if len(self.done) == len(self.batches):
+            return {'type': 'done'}
+        return {'type': 'wait', 'delay': WAIT_DELAY}
+
+    def _accept(self, message):
+        batch = message['batch']
+        if batch in self.done:
+            self.counters['duplicates'] += 1
+            return
+        self.leases.pop(batch, None)
+        self.done.add(batch)
+        self.accumulator.add_sparse(self.batches[batch], message)
+        if self.checkpoint is not None:
+            self.checkpoint.save(self.accumulator, force=len(self.done) == len(self.batches))
+        if len(self.done) == len(self.batches):
+            self.finished.set()
+
+    def _fail(self, worker, error):
+        self.error = f"Ошибка протокола с рабочим {worker}: {error}"
+        print(self.error)
+        for writer in self._writers:
+            writer.write(json.dumps({'type': 'error', 'message': self.error}).encode('utf-8') + b'\n')
+        self.finished.set()
+
+    async def _handle_connection(self, reader, writer):
+        worker = None
+        self._writers.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                message = json.loads(line)
+                if message['type'] == 'hello':
+                    worker = f"{message.get('worker', '?')}@{writer.get_extra_info('peername')}"
+                    self.workers[worker] = 0
+                    await _send(writer, self.config)
+                elif message['type'] == 'request':
+                    await _send(writer, self._next_message(worker))
+                elif message['type'] == 'result':
+                    self._accept(message)
+                    self.workers[worker] += 1
+        except ConnectionError:
+            pass
+        except (ValueError, KeyError) as error:
+            self._fail(worker, error)
+        finally:
+            if self.error is None:
+                lost = [batch for batch, (owner, _) in self.leases.items() if owner == worker]
+                for batch in lost:
+                    self._requeue(batch)
+                if lost:
+                    self.counters['workers_lost'] += 1
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _watch_leases(self):
+        while True:
+            await asyncio.sleep(min(self.lease_timeout, 1.0))
+            self._expire_leases()
+
+    async def start(self, host='127.0.0.1', port=DEFAULT_PORT):
+        self.finished = asyncio.Event()
+        if len(self.done) == len(self.batches):
+            self.finished.set()
+        self.server = await asyncio.start_server(self._handle_connection, host, port, limit=self.line_limit)
+        return self.server.sockets[0].getsockname()[:2]
+
+    async def run(self, host='127.0.0.1', port=DEFAULT_PORT, on_ready=None):
+        """
+        Слушает host:port, пока все пачки не посчитаны; возвращает (Volumes, число назначений).
+        При ошибке протокола — RuntimeError.
+        """
+        address = await self.start(host, port)
+        if on_ready is not None:
+            on_ready(address)
+        watcher = asyncio.ensure_future(self._watch_leases())
+        try:
+            await self.finished.wait()
+            # рабочие, ждущие новой пачки, получат done при следующем запросе
+            await asyncio.sleep(2 * WAIT_DELAY)
+        finally:
+            watcher.cancel()
+            self.server.close()
+            for writer in list(self._writers):
+                writer.close()
+            await self.server.wait_closed()
+        if self.error is not None:
+            raise RuntimeError(self.error)
+        if self.checkpoint is not None:
+            self.checkpoint.save(self.accumulator, force=True)
+        return self.accumulator.volumes(), self.n_destinations
+
+
+class _Connection:
+    def __init__(self, host, port, timeout=None):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.file = self.sock.makefile('rwb')
+
+    def send(self, message):
+        self.file.write(json.dumps(message).encode('utf-8') + b'\n')
+        self.file.flush()
+
+    def receive(self):
+        line = self.file.readline()
+        if not line:
+            raise ConnectionError("Координатор закрыл соединение")
+        message = json.loads(line)
+        if message['type'] == 'error':
+            raise RuntimeError(message['message'])
+        return message
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+
+def run_worker(host, port=DEFAULT_PORT, snapshot_path=None, store_root=DEFAULT_STORE, name=None):
+    """
+    Рабочий: берёт у координатора пачки назначений, пока они не кончатся; возвращает число
+    посчитанных пачек. Снимок сети — snapshot_path или артефакт сети из store_root (общий каталог).
+    """
+    name = name or f"{socket.gethostname()}:{os.getpid()}"
+    connection = _Connection(host, port)
+    try:
+        connection.send({'type': 'hello', 'worker': name})
+        config = connection.receive()
+        path = snapshot_path or ArtifactStore(store_root).path('network', config['network'])
+        if config['sha256'] and file_sha256(path) != config['sha256']:
+            raise ValueError(f"Снимок {path} не совпадает со снимком координатора {config['network']}")
+        network = read_network(path)
+        accumulator = VolumeAccumulator(network)
+
+        n_batches = 0
+        while True:
+            connection.send({'type': 'request'})
+            message = connection.receive()
+            if message['type'] == 'done':
+                return n_batches
+            if message['type'] == 'wait':
+                time.sleep(message['delay'])
+                continue
+            results = [_assign_destination(d, od, config['engine'], config['T'], network)
+                       for d, od in message['od'].items()]
+            connection.send({'type': 'result', 'batch': message['batch'], **accumulator.sparse(results)})
+            n_batches += 1
+    except ConnectionError:
+        return n_batches
+    finally:
+        connection.close()
+
+
+def run_coordinator(store, network_key, od_path, engine='florian', T=60.0, host='0.0.0.0', port=DEFAULT_PORT,
+                    batch_size=DEFAULT_BATCH_SIZE, lease_timeout=DEFAULT_LEASE_TIMEOUT, resume=False,
+                    checkpoint_interval=60.0, force=False):
+    """Этап assign, посчитанный рабочими; артефакт тот же, что у pipeline.run_assign."""
+    from algos.pipeline import StageResult, assign_key, save_assign, partial_dir, read_od_matrix
+
+    key = assign_key(store, network_key, od_path, engine, T)
+    if store.exists('assign', key) and not force:
+        return StageResult('assign', key, None, True, 0.0)
+    start = time.perf_counter()
+    snapshot_path = store.path('network', network_key)
+    network = read_network(snapshot_path)
+    od_matrix = read_od_matrix(od_path)
+    n_total = sum(1 for d in split_by_destination(od_matrix) if d in network.all_stops)
+    checkpoint = Checkpoint(partial_dir(store, key), n_total, checkpoint_interval)
+    coordinator = Coordinator(network, od_matrix, engine, T, network_key, store.fingerprint(snapshot_path),
+                              batch_size, lease_timeout, checkpoint, resume)
+    print(f"Координатор: {len(coordinator.batches)} пачек по {batch_size} назначений, ждём рабочих на {host}:{port}")
+    volumes, n_destinations = asyncio.run(coordinator.run(host, port))
+    seconds = time.perf_counter() - start
+    save_assign(store, key, volumes, network_key, od_path, od_matrix, engine, T, n_destinations, seconds,
+                workers=len(coordinator.workers), distributed=coordinator.counters)
+    return StageResult('assign', key, volumes, False, seconds)
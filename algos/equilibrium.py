@@ -0,0 +1,334 @@
+import math
+import time
+
+import numpy as np
+
+from algos import florian, time_arrived_florian
+from algos.pipeline import split_by_destination
+from utils import Link, Volumes, ALPHA, INFINITE_FREQUENCY
+
+# Равновесное назначение с учётом загрузки. Стоимость ребра зависит от потока на нём (CrowdingCost),
+# поэтому поиск стратегий и загрузка повторяются:
+#
+#   1. стоимости рёбер по текущим потокам x;
+#   2. для каждого назначения d — стратегия и вспомогательная загрузка y^d при этих стоимостях;
+#   3. разрыв (gap) между стоимостью текущих потоков и стоимостью кратчайших стратегий;
+#   4. x^d <- x^d + step * (y^d - x^d), step = 1/k (MSA) или поиском по прямой (Frank-Wolfe).
+#
+# Назначение пересчитывается, только если его стратегия могла измениться. Для florian прошлая
+# стратегия проверяется за один проход: её метки пересчитываются при новых стоимостях и
+# проверяются условия оптимальности Spiess-Florian (ребро в стратегии не дороже метки узла,
+# ребро вне её — не дешевле). Если они выполнены, стратегия и y^d те же, поиск не нужен.
+# Для time_arrived такой проверки нет, и назначение пересчитывается, когда стоимости рёбер в его
+# области изменились больше чем на change_tolerance.
+#
+# Потоки назначений хранятся одним разреженным вектором по ключу d * n_links + k, так что поиск
+# шага и разрыв считаются массивами без циклов по назначениям.
+
+DEFAULT_VEHICLE_CAPACITY = 100.0
+
+
+class CrowdingCost:
+    """
+    Стоимость ребра при потоке v (BPR): c = c0 * (1 + alpha * (v / cap)^beta), где cap — провозная
+    способность за период period минут: period / headway рейсов по vehicle_capacity мест
+    (route_capacity — вместимость по route_id). Разброс времени в пути растёт с загрузкой:
+    std = std0 + std_factor * c0 * (v / cap)^beta. Рёбра с headway <= 0 (пешеходные, коннекторы)
+    от загрузки не зависят.
+    """
+    def __init__(self, alpha=0.15, beta=4.0, vehicle_capacity=DEFAULT_VEHICLE_CAPACITY, period=60.0,
+                 std_factor=0.0, route_capacity=None):
+        self.alpha = alpha
+        self.beta = beta
+        self.vehicle_capacity = vehicle_capacity
+        self.period = period
+        self.std_factor = std_factor
+        self.route_capacity = route_capacity or {}
+
+    def capacity(self, link):
+        if link.headway <= 0:
+            return math.inf
+        return self.period / link.headway * self.route_capacity.get(link.route_id, self.vehicle_capacity)
+
+    def load_factor(self, capacity, volumes):
+        return (volumes / capacity) ** self.beta
+
+    def costs(self, base_cost, base_std, capacity, volumes):
+        """(стоимости, std времени в пути) рёбер при потоках volumes."""
+        load = self.load_factor(capacity, volumes)
+        return base_cost * (1 + self.alpha * load), base_std + self.std_factor * base_cost * load
+
+    def integral(self, base_cost, capacity, volumes):
+        """Сумма интегралов стоимостей рёбер от 0 до volumes (целевая функция для поиска шага)."""
+        load = self.load_factor(capacity, volumes)
+        return float(np.sum(base_cost * volumes * (1 + self.alpha / (self.beta + 1) * load)))
+
+
+class StrategyCheck:
+    """
+    Проверка стратегий florian после изменения стоимостей или интервалов рёбер links (на месте).
+    Индексы графа строятся один раз. Как и в PriorityQueue движка, из рёбер с одинаковыми
+    (from, to, route_id) рассматривается последнее.
+    """
+    def __init__(self, links, stops, tolerance=1e-9):
+        self.links = links
+        self.tolerance = tolerance
+        self.link_pos = {id(a): k for k, a in enumerate(links)}
+        last = {}
+        for k, a in enumerate(links):
+            if a.from_node in stops and a.to_node in stops:
+                last[a.from_node, a.to_node, a.route_id] = k
+        self.links_from = {}
+        self.links_to = {}
+        for k in sorted(last.values()):
+            self.links_from.setdefault(links[k].from_node, []).append(k)
+            self.links_to.setdefault(links[k].to_node, []).append(k)
+
+    def evaluate(self, strategy, destination):
+        """
+        (метки, частоты узлов) стратегии при текущих рёбрах: проход по a_set от destination к источникам.
+        strategy.a_set должен быть в порядке загрузки (его так сортирует florian.assign_demand).
+        """
+        weighted, freqs = {}, {}
+
+        def label(node):
+            return 0.0 if node == destination else (ALPHA + weighted[node]) / freqs[node]
+
+        for a in reversed(strategy.a_set):
+            freq = INFINITE_FREQUENCY if a.headway <= 0 else 1 / a.headway
+            weighted[a.from_node] = weighted.get(a.from_node, 0.0) + freq * (label(a.to_node) + a.travel_cost)
+            freqs[a.from_node] = freqs.get(a.from_node, 0.0) + freq
+        labels = {node: label(node) for node in freqs}
+        labels[destination] = 0.0
+        return labels, freqs
+
+    def still_optimal(self, strategy, labels, destination):
+        """Условия оптимальности Spiess-Florian для стратегии с метками labels."""
+        in_strategy = {self.link_pos[id(a)] for a in strategy.a_set}
+        for node, u in labels.items():
+            if node != destination:
+                for k in self.links_from.get(node, ()):
+                    a = self.links[k]
+                    target = labels.get(a.to_node)
+                    if target is None:
+                        continue
+                    slack = self.tolerance * max(1.0, abs(u))
+                    if k in in_strategy and target + a.travel_cost > u + slack:
+                        return False
+                    if k not in in_strategy and target + a.travel_cost < u - slack:
+                        return False
+            for k in self.links_to.get(node, ()):
+                if self.links[k].from_node not in labels:
+                    return False  # узел вне стратегии стал бы достижим
+        return True
+
+
+class CongestedAssignment:
+    """
+    Равновесное назначение od_matrix на network при стоимостях cost (CrowdingCost). Сеть не меняется:
+    расчёт идёт по копиям рёбер self.links, в них после run() — стоимости при равновесных потоках.
+    run() можно вызывать повторно — итерации продолжатся с достигнутых потоков.
+    """
+    def __init__(self, network, od_matrix, cost=None, engine='florian', T=60.0, tolerance=1e-9,
+                 change_tolerance=1e-3):
+        self.cost = cost or CrowdingCost()
+        self.engine = engine
+        self.T = T
+        self.change_tolerance = change_tolerance
+        self.stops = network.all_stops
+        self.links = [Link(a.from_node, a.to_node, a.route_id, a.travel_cost, a.headway, a.mean_travel_time,
+                           a.std_travel_time, a.delay_mu, a.delay_sigma) for a in network.all_links]
+        self.check = StrategyCheck(self.links, self.stops, tolerance)
+        self.link_pos = self.check.link_pos
+        self.links_from = self.check.links_from
+        self.node_ids = sorted(set(self.stops) | {s for a in self.links for s in (a.from_node, a.to_node)})
+        node_pos = {s: k for k, s in enumerate(self.node_ids)}
+        self.link_from = np.array([node_pos[a.from_node] for a in self.links], dtype=np.int64)
+        self.link_to = np.array([node_pos[a.to_node] for a in self.links], dtype=np.int64)
+        self.base_cost = np.array([a.travel_cost for a in self.links], dtype=float)
+        self.base_std = np.array([a.std_travel_time for a in self.links], dtype=float)
+        self.capacity = np.array([self.cost.capacity(a) for a in self.links], dtype=float)
+        self.headway = np.array([max(a.headway, 0.0) for a in self.links], dtype=float)
+
+        self.parts = {d: od for d, od in split_by_destination(od_matrix).items() if d in self.stops}
+        self.destinations = list(self.parts)
+        self.strategies = {}
+        self.labels = {}
+        self.aux = {}        # d -> (позиции рёбер, потоки) всё-или-ничего загрузки по стратегии
+        self.computed_at = {}  # d -> (итерация расчёта стратегии, позиции рёбер её области)
+        self.cost_history = []
+        self.keys = np.zeros(0, dtype=np.int64)
+        self.flows = np.zeros(0)
+        self.history = []
+
+    @property
+    def link_volumes(self):
+        return np.bincount(self.keys % len(self.links), weights=self.flows, minlength=len(self.links))
+
+    def _apply_costs(self, volumes):
+        costs, stds = self.cost.costs(self.base_cost, self.base_std, self.capacity, volumes)
+        for a, c, s in zip(self.links, costs.tolist(), stds.tolist()):
+            a.travel_cost = c
+            a.std_travel_time = s
+        self.cost_history.append((costs, stds))
+        return costs
+
+    def _unchanged_area(self, destination):
+        iteration, area = self.computed_at[destination]
+        (then_cost, then_std), (now_cost, now_std) = self.cost_history[iteration], self.cost_history[-1]
+        change = np.abs(now_cost[area] - then_cost[area]) / np.maximum(then_cost[area], 1e-9)
+        change_std = np.abs(now_std[area] - then_std[area]) / np.maximum(then_std[area], 1e-9)
+        return not len(area) or max(change.max(), change_std.max()) <= self.change_tolerance
+
+    def _reuse(self, destination):
+        strategy = self.strategies.get(destination)
+        if strategy is None:
+            return False
+        if self.engine == 'florian':
+            labels, _ = self.check.evaluate(strategy, destination)
+            if not self.check.still_optimal(strategy, labels, destination):
+                return False
+            self.labels[destination] = labels
+            return True
+        return self._unchanged_area(destination)
+
+    def _compute(self, destination):
+        od = self.parts[destination]
+        if self.engine == 'florian':
+            strategy = florian.find_optimal_strategy(self.links, self.stops, destination)
+            volumes = florian.assign_demand(self.links, self.stops, strategy, od, destination)
+            labels = strategy.labels
+        else:
+            strategy = time_arrived_florian.find_optimal_strategy(self.links, self.stops, destination, self.T)
+            volumes = time_arrived_florian.assign_demand(self.links, self.stops, strategy, od, destination)
+            labels = {s: mean for s, (mean, _) in strategy.labels.items()}
+        positions, flows = [], []
+        for a in strategy.a_set:
+            freq = INFINITE_FREQUENCY if a.headway <= 0 else 1 / a.headway
+            if strategy.freqs[a.from_node]:
+                positions.append(self.link_pos[id(a)])
+                flows.append(freq / strategy.freqs[a.from_node] * volumes.nodes[a.from_node])
+        reached = {s for s, u in labels.items() if u < math.inf}
+        area = [k for s in reached for k in self.links_from.get(s, ())]
+        self.strategies[destination] = strategy
+        self.labels[destination] = labels
+        self.aux[destination] = (np.array(positions, dtype=np.int64), np.array(flows))
+        self.computed_at[destination] = (len(self.cost_history) - 1, np.array(area, dtype=np.int64))
+
+    def _aux_vector(self):
+        n = len(self.links)
+        keys = [d * n + self.aux[dest][0] for d, dest in enumerate(self.destinations)]
+        values = [self.aux[dest][1] for dest in self.destinations]
+        if not keys:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        return np.concatenate(keys), np.concatenate(values)
+
+    def _lower_bound(self):
+        """Сумма спроса, умноженного на метки источников, — стоимость всех поездок по кратчайшим стратегиям."""
+        total = 0.0
+        for destination, od in self.parts.items():
+            labels = self.labels[destination]
+            total += sum(targets[destination] * labels.get(origin, math.inf) for origin, targets in od.items()
+                         if labels.get(origin, math.inf) < math.inf)
+        return total
+
+    def _waiting(self, keys, flows):
+        """Ожидание: по каждому назначению и узлу — ALPHA * max(поток ребра * headway) по рёбрам из узла."""
+        if not len(keys):
+            return 0.0
+        n = len(self.links)
+        group = (keys // n) * len(self.node_ids) + self.link_from[keys % n]
+        order = np.argsort(group, kind='stable')
+        group = group[order]
+        starts = np.flatnonzero(np.r_[True, group[1:] != group[:-1]])
+        return ALPHA * float(np.maximum.reduceat(flows[order] * self.headway[keys % n][order], starts).sum())
+
+    def _objective(self, keys, flows):
+        volumes = np.bincount(keys % len(self.links), weights=flows, minlength=len(self.links))
+        return self.cost.integral(self.base_cost, self.capacity, volumes) + self._waiting(keys, flows)
+
+    def _line_search(self, keys, current, target, iterations=40):
+        """Шаг Frank-Wolfe: минимум выпуклой целевой функции на отрезке [current, target] (золотое сечение)."""
+        ratio = (math.sqrt(5) - 1) / 2
+        lo, hi = 0.0, 1.0
+        a, b = hi - ratio * (hi - lo), lo + ratio * (hi - lo)
+        fa = self._objective(keys, current + a * (target - current))
+        fb = self._objective(keys, current + b * (target - current))
+        for _ in range(iterations):
+            if fa <= fb:
+                hi, b, fb = b, a, fa
+                a = hi - ratio * (hi - lo)
+                fa = self._objective(keys, current + a * (target - current))
+            else:
+                lo, a, fa = a, b, fb
+                b = lo + ratio * (hi - lo)
+                fb = self._objective(keys, current + b * (target - current))
+        return (lo + hi) / 2
+
+    def run(self, max_iterations=50, target_gap=1e-4, method='msa'):
+        """
+        Итерации до относительного разрыва target_gap (для time_arrived — до относительного изменения
+        потоков) или max_iterations. method — 'msa' или 'fw' (только florian). Возвращает self.history:
+        по итерации — gap, flow_change, step, recomputed (пересчитанные стратегии), seconds.
+        """
+        if method not in ('msa', 'fw'):
+            raise ValueError(f"Неизвестный метод {method!r}: ожидается 'msa' или 'fw'")
+        if method == 'fw' and self.engine != 'florian':
+            raise ValueError("Поиск шага Frank-Wolfe определён только для движка florian")
+        for _ in range(max_iterations):
+            start = time.perf_counter()
+            iteration = len(self.history)
+            volumes = self.link_volumes
+            costs = self._apply_costs(volumes)
+            recomputed = 0
+            for destination in self.destinations:
+                if not self._reuse(destination):
+                    self._compute(destination)
+                    recomputed += 1
+
+            aux_keys, aux_flows = self._aux_vector()
+            keys = np.union1d(self.keys, aux_keys)
+            current = np.zeros(len(keys))
+            current[np.searchsorted(keys, self.keys)] = self.flows
+            target = np.zeros(len(keys))
+            target[np.searchsorted(keys, aux_keys)] = aux_flows
+
+            gap = None
+            if self.engine == 'florian' and iteration > 0:
+                total = float(costs @ volumes) + self._waiting(keys, current)
+                gap = (total - self._lower_bound()) / total if total > 0 else 0.0
+            if iteration == 0:
+                step = 1.0
+            elif method == 'fw':
+                step = self._line_search(keys, current, target)
+            else:
+                step = 1.0 / (iteration + 1)
+            flows = current + step * (target - current)
+            change = float(np.abs(flows - current).sum() / max(np.abs(current).sum(), 1e-12)) if iteration > 0 else None
+
+            nonzero = flows != 0
+            self.keys, self.flows = keys[nonzero], flows[nonzero]
+            self.history.append({'iteration': iteration, 'gap': gap, 'flow_change': change, 'step': step,
+                                 'recomputed': recomputed, 'seconds': time.perf_counter() - start})
+            measure = gap if self.engine == 'florian' else change
+            if measure is not None and measure <= target_gap:
+                break
+        self._apply_costs(self.link_volumes)
+        self.cost_history.pop()
+        return self.history
+
+    def volumes(self):
+        """Volumes равновесных потоков: параллельные рёбра одной пары (from, to) складываются."""
+        links = {}
+        for a in self.links:
+            links.setdefault(a.from_node, {})[a.to_node] = 0.0
+        nodes = {s: 0.0 for s in self.stops}
+        for k, v in enumerate(self.link_volumes.tolist()):
+            if v:
+                a = self.links[k]
+                links[a.from_node][a.to_node] += v
+                nodes[a.to_node] = nodes.get(a.to_node, 0.0) + v
+        for destination, od in self.parts.items():
+            for origin, targets in od.items():
+                nodes[origin] = nodes.get(origin, 0.0) + targets[destination]
+        return Volumes(links, nodes)
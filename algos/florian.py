@@ -1,9 +1,11 @@
 from utils import *
 import math
+import time
 
 # Оригинальный Spiess-Florian (минимизация ожидаемого времени)
 
-def find_optimal_strategy(all_links, all_stops, destination):
+def find_optimal_strategy(all_links, all_stops, destination, stats=None):
+    start = time.perf_counter()
     if VERBOSE:
         print("Initialization")
     u = {stop: 0.0 if stop == destination else MATH_INF for stop in all_stops}
@@ -23,10 +25,13 @@ def find_optimal_strategy(all_links, all_stops, destination):
         if link.to_node in all_stops:
             pq.push(link, u[link.to_node] + link.travel_cost)
 
+    search_start = time.perf_counter()
+    n_pops = 0
     while True:
         link, priority = pq.pop()
         if link is None or math.isinf(priority) or priority >= MATH_INF:
             break
+        n_pops += 1
 
         a = link
         i = a.from_node
@@ -77,19 +82,33 @@ def find_optimal_strategy(all_links, all_stops, destination):
             for s in all_stops:
                 print(f"{s} -> (u_i, f_i) = ({u[s]}, {f[s]})")
 
+    if stats is not None:
+        stats.runs += 1
+        stats.add_queue(pq, n_pops + (link is not None))
+        stats.relaxations_accepted += len(overline_a)
+        stats.relaxations_rejected += n_pops - len(overline_a)
+        stats.nodes_settled += sum(1 for label in u.values() if label < MATH_INF)
+        stats.add_time('strategy.init', search_start - start)
+        stats.add_time('strategy.search', time.perf_counter() - search_start)
+
     return Strategy(u, f, overline_a)
 
-def assign_demand(all_links, all_stops, optimal_strategy, od_matrix, destination):
+def assign_demand(all_links, all_stops, optimal_strategy, od_matrix, destination, stats=None):
+    start = time.perf_counter()
     # Sort a_set by descending (labels[to] + travel_cost)
-    optimal_strategy.a_set = sorted(optimal_strategy.a_set, key=lambda a: -(optimal_strategy.labels[a.to_node] + a.travel_cost))
+    # При равных ключах раньше идут рёбра, попавшие в стратегию позже (они ближе к origin)
+    optimal_strategy.a_set = sorted(reversed(optimal_strategy.a_set), key=lambda a: -(optimal_strategy.labels[a.to_node] + a.travel_cost))
+    if stats is not None:
+        stats.add_time('assign.sort', time.perf_counter() - start)
 
-    return calculate_flow_volumes(all_links, all_stops, optimal_strategy, od_matrix, destination)
+    return calculate_flow_volumes(all_links, all_stops, optimal_strategy, od_matrix, destination, stats)
 
 
-def compute_sf(all_links, all_stops, destination, od_matrix):
-    ops = find_optimal_strategy(all_links, all_stops, destination)
-    volumes = assign_demand(all_links, all_stops, ops, od_matrix, destination)
-    return SFResult(ops, volumes)
+def compute_sf(all_links, all_stops, destination, od_matrix, collect_stats=False):
+    stats = EngineStats() if collect_stats else None
+    ops = find_optimal_strategy(all_links, all_stops, destination, stats)
+    volumes = assign_demand(all_links, all_stops, ops, od_matrix, destination, stats)
+    return SFResult(ops, volumes, stats)
 
 def parse_gtfs(directory, limit=10000):
     stop_times, active_trips, all_stops, stop_names, route_names = parse_gtfs_limited(directory, limit)
@@ -99,8 +118,12 @@ def parse_gtfs(directory, limit=10000):
     return all_links, all_stops
 
 if __name__ == "__main__":
+    from algos.network import Network
+    from algos.reachability import get_reachability_index
+
     directory = "improved-gtfs-moscow-official"
     all_links, all_stops = parse_gtfs(directory, 100000)
+    network = Network(all_links, all_stops)
 
     print("Ищем пару связанных остановок...")
     origin, destination = find_connected_od_pair_with_min_hops(all_links)
@@ -110,7 +133,7 @@ if __name__ == "__main__":
 
     print(f"Найдена пара: origin={origin}, destination={destination}")
 
-    origins_reaching_dest = get_all_origins_reaching_destination(all_links, destination)
+    origins_reaching_dest = get_reachability_index(network).stops_reaching(destination)
 
     print(f"Найдено {len(origins_reaching_dest)} остановок, из которых можно доехать до {destination}")
 
@@ -0,0 +1,199 @@
+import csv
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from algos import florian
+from algos.equilibrium import StrategyCheck
+from algos.pipeline import split_by_destination
+from algos.sensitivity import StrategySensitivity, by_route
+from utils import Link, Strategy, MATH_INF
+
+# Распределение парка между маршрутами при ограниченном общем числе машин. У маршрута r — n_r машин
+# и время оборота C_r, интервал h_r = C_r / n_r задаётся всем его рёбрам. Минимизируется суммарное
+# ожидаемое время J = sum g_o u_o по меткам стратегий florian всех назначений.
+#
+# Шаг — проекция градиента: dJ/dn_r = -dJ/dh_r * C_r / n_r^2 (dJ/dh_r из algos.sensitivity),
+# новая точка проецируется на {sum n_r = budget, n_r >= min_fleet}. На итерации проверяется
+# несколько длин шага (кандидатов), их можно считать параллельно в пуле процессов; берётся лучший.
+# Расчёт кандидата сразу даёт и градиент для следующей итерации.
+#
+# Стратегии назначений переиспользуются: при новых интервалах метки прошлой стратегии пересчитываются
+# за один проход и проверяются условия оптимальности (equilibrium.StrategyCheck). Поиск стратегии
+# заново нужен, только если они нарушены, — при небольших шагах это редкость.
+
+
+def read_fleet(path):
+    """({route_id: число машин}, {route_id: время оборота, мин}) из CSV с колонками route_id, fleet, cycle_time."""
+    fleet, cycle_time = {}, {}
+    with open(path, encoding='utf-8', newline='') as f:
+        for row in csv.DictReader(f):
+            fleet[row['route_id']] = float(row['fleet'])
+            cycle_time[row['route_id']] = float(row['cycle_time'])
+    return fleet, cycle_time
+
+
+def _project(values, lower, budget):
+    """Ближайшая к values точка множества {sum = budget, values >= lower}."""
+    shifted = values - lower
+    total = budget - lower.sum()
+    if total <= 0:
+        return lower.copy()
+    ordered = np.sort(shifted)[::-1]
+    excess = np.cumsum(ordered) - total
+    k = np.flatnonzero(ordered - excess / np.arange(1, len(ordered) + 1) > 0)[-1]
+    return lower + np.maximum(shifted - excess[k] / (k + 1), 0.0)
+
+
+class HeadwayEvaluator:
+    """J и dJ/dh маршрутов routes при заданных интервалах; расчёт идёт по копиям рёбер network."""
+    def __init__(self, network, od_matrix, routes, tolerance=1e-9):
+        self.stops = network.all_stops
+        self.links = [Link(a.from_node, a.to_node, a.route_id, a.travel_cost, a.headway, a.mean_travel_time,
+                           a.std_travel_time, a.delay_mu, a.delay_sigma) for a in network.all_links]
+        self.route_links = {r: [a for a in self.links if a.route_id == r] for r in routes}
+        self.check = StrategyCheck(self.links, self.stops, tolerance)
+        self.parts = {d: od for d, od in split_by_destination(od_matrix).items() if d in self.stops}
+        self.strategies = {}
+
+    def _strategy(self, destination):
+        """(стратегия при текущих интервалах, пересчитана ли она заново)."""
+        strategy = self.strategies.get(destination)
+        if strategy is not None:
+            labels, freqs = self.check.evaluate(strategy, destination)
+            if self.check.still_optimal(strategy, labels, destination):
+                return Strategy(labels, freqs, strategy.a_set), False
+        strategy = florian.find_optimal_strategy(self.links, self.stops, destination)
+        # порядок загрузки, как в florian.assign_demand, — его ждёт StrategyCheck.evaluate
+        strategy.a_set = sorted(reversed(strategy.a_set), key=lambda a: -(strategy.labels[a.to_node] + a.travel_cost))
+        self.strategies[destination] = strategy
+        return strategy, True
+
+    def evaluate(self, headways):
+        """(J, {route: dJ/dh}, число пересчитанных стратегий) при интервалах headways {route: h}."""
+        for route, h in headways.items():
+            for a in self.route_links[route]:
+                a.headway = h
+        total, gradient, recomputed = 0.0, dict.fromkeys(self.route_links, 0.0), 0
+        for destination, od in self.parts.items():
+            strategy, computed = self._strategy(destination)
+            recomputed += computed
+            sensitivity = StrategySensitivity(strategy, od, destination)
+            for origin, demand in sensitivity.demand.items():
+                label = strategy.labels.get(origin, MATH_INF)
+                if label < MATH_INF:
+                    total += demand * label
+            for route, value in by_route(sensitivity.total_time_gradient()[1]).items():
+                if route in gradient:
+                    gradient[route] += value
+        return total, gradient, recomputed
+
+
+_evaluator = None
+
+
+def _init_worker(network, od_matrix, routes, tolerance):
+    global _evaluator
+    _evaluator = HeadwayEvaluator(network, od_matrix, routes, tolerance)
+
+
+def _evaluate_candidate(headways):
+    return _evaluator.evaluate(headways)
+
+
+class HeadwayOptimizer:
+    """
+    Перераспределение парка fleet {route: машин} с временами оборота cycle_time {route: мин} по маршрутам
+    сети network при спросе od_matrix. budget — общий парк (по умолчанию сумма fleet), min_fleet — минимум
+    машин на маршруте. step — наибольшее изменение парка маршрута (в машинах) у первого кандидата,
+    остальные кандидаты вдвое короче предыдущего. workers > 1 — кандидаты считаются в пуле процессов.
+    Маршруты не из fleet не меняются. Парк считается непрерывным; итог — интервалы headways().
+    """
+    def __init__(self, network, od_matrix, fleet, cycle_time, budget=None, min_fleet=1.0, step=1.0, candidates=4,
+                 workers=1, tolerance=1e-9):
+        present = {a.route_id for a in network.all_links}
+        self.routes = [r for r in sorted(fleet) if r in present]
+        if not self.routes:
+            raise ValueError("Ни одного маршрута из fleet нет в сети")
+        missing = [r for r in self.routes if r not in cycle_time]
+        if missing:
+            raise ValueError(f"Нет времени оборота для маршрутов: {', '.join(missing)}")
+        self.cycle_time = np.array([cycle_time[r] for r in self.routes], dtype=float)
+        self.fleet = np.array([fleet[r] for r in self.routes], dtype=float)
+        self.initial_fleet = self.fleet.copy()
+        self.budget = float(self.fleet.sum()) if budget is None else float(budget)
+        self.lower = np.full(len(self.routes), float(min_fleet))
+        if self.lower.sum() > self.budget:
+            raise ValueError(f"Парка {self.budget:g} не хватает на {min_fleet:g} машин "
+                             f"для {len(self.routes)} маршрутов")
+        self.fleet = _project(self.fleet, self.lower, self.budget)
+        self.step = step
+        self.candidates = max(1, candidates)
+        self.workers = workers
+        self._init_args = (network, od_matrix, self.routes, tolerance)
+        self._evaluator = None
+        self.objective = None
+        self.gradient = None
+        self.history = []
+
+    def headways(self, fleet=None):
+        """{route: интервал} при парке fleet (по умолчанию текущем)."""
+        fleet = self.fleet if fleet is None else fleet
+        return dict(zip(self.routes, (self.cycle_time / fleet).tolist()))
+
+    def _evaluate(self, pool, fleets):
+        headways = [self.headways(fleet) for fleet in fleets]
+        if pool is not None:
+            return list(pool.map(_evaluate_candidate, headways))
+        if self._evaluator is None:
+            self._evaluator = HeadwayEvaluator(*self._init_args)
+        return [self._evaluator.evaluate(h) for h in headways]
+
+    def _fleet_gradient(self):
+        return -np.array([self.gradient[r] for r in self.routes]) * self.cycle_time / self.fleet ** 2
+
+    def run(self, max_iterations=20, min_step=1e-3):
+        """
+        Итерации до max_iterations или пока шаг не станет меньше min_step машин. Возвращает self.history:
+        по итерации — objective (J), step (наибольшее изменение парка маршрута), candidates, recomputed
+        (пересчитанные стратегии по всем кандидатам), seconds. run() можно вызывать повторно.
+        """
+        pool = None
+        if self.workers > 1:
+            pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker, initargs=self._init_args)
+        try:
+            if self.objective is None:
+                start = time.perf_counter()
+                (self.objective, self.gradient, recomputed), = self._evaluate(pool, [self.fleet])
+                self.history.append({'iteration': 0, 'objective': self.objective, 'step': 0.0, 'candidates': 1,
+                                     'recomputed': recomputed, 'seconds': time.perf_counter() - start})
+            for _ in range(max_iterations):
+                if self.step < min_step:
+                    break
+                start = time.perf_counter()
+                gradient = self._fleet_gradient()
+                scale = np.abs(gradient).max()
+                if scale == 0:
+                    break
+                steps = [self.step / 2 ** k for k in range(self.candidates)]
+                fleets = [_project(self.fleet - s * gradient / scale, self.lower, self.budget) for s in steps]
+                results = self._evaluate(pool, fleets)
+                best = min(range(len(fleets)), key=lambda k: results[k][0])
+                recomputed = sum(r[2] for r in results)
+                moved = 0.0
+                if results[best][0] < self.objective:
+                    moved = float(np.abs(fleets[best] - self.fleet).max())
+                    self.fleet = fleets[best]
+                    self.objective, self.gradient = results[best][:2]
+                    # удачный самый длинный шаг — пробуем длиннее, иначе продолжаем с лучшего
+                    self.step = steps[best] * 2 if best == 0 else steps[best]
+                else:
+                    self.step = steps[-1] / 2
+                self.history.append({'iteration': len(self.history), 'objective': self.objective, 'step': moved,
+                                     'candidates': len(fleets), 'recomputed': recomputed,
+                                     'seconds': time.perf_counter() - start})
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        return self.history
@@ -0,0 +1,75 @@
+import os
+import pickle
+
+from profiling import NULL_PROFILER
+from utils import parse_gtfs_limited, parse_stop_coords, calculate_links, calculate_headways
+
+# Снимок сети: рёбра и остановки вместе с метаданными GTFS и кэшем производных индексов
+# (пространственный индекс, достижимость, индекс маршрутов...). Индексы строятся один раз
+# при первом обращении и сохраняются вместе со снимком.
+
+
+class Network:
+    def __init__(self, all_links, all_stops, stop_coords=None, stop_names=None, route_names=None):
+        self.all_links = all_links
+        self.all_stops = all_stops
+        self.stop_coords = stop_coords or {}
+        self.stop_names = stop_names or {}
+        self.route_names = route_names or {}
+        self.indexes = {}
+
+    def get_index(self, name, builder):
+        """Возвращает закэшированный индекс name, при первом обращении строит его как builder(self)."""
+        if name not in self.indexes:
+            self.indexes[name] = builder(self)
+        return self.indexes[name]
+
+    def drop_index(self, name):
+        self.indexes.pop(name, None)
+
+
+def ingest_gtfs(directory, limit=10000, profiler=NULL_PROFILER):
+    """Читает GTFS: (stop_times, active_trips, all_stops, stop_names, route_names, stop_coords)."""
+    with profiler.stage('ingest'):
+        stop_times, active_trips, all_stops, stop_names, route_names = parse_gtfs_limited(directory, limit)
+        stop_coords = parse_stop_coords(directory)
+    return stop_times, active_trips, all_stops, stop_names, route_names, stop_coords
+
+
+def build_network(ingested, profiler=NULL_PROFILER):
+    """
+    Строит Network (рёбра с интервалами, координаты, названия) по результату ingest_gtfs.
+    Индекс маршрутов строится здесь же, пока stop_times в памяти.
+    """
+    from algos.route_index import RouteIndex
+
+    stop_times, active_trips, all_stops, stop_names, route_names, stop_coords = ingested
+    with profiler.stage('links'):
+        all_links = calculate_links(stop_times, active_trips, all_stops)
+    with profiler.stage('headways'):
+        all_links = calculate_headways(stop_times, active_trips, all_links)
+    network = Network(all_links, all_stops, stop_coords, stop_names, route_names)
+    with profiler.stage('route_index'):
+        network.indexes['route_index'] = RouteIndex(stop_times, active_trips, route_names, all_stops)
+    return network
+
+
+def load_network(directory, limit=10000, profiler=NULL_PROFILER):
+    """
+    Читает GTFS и строит Network.
+    profiler (profiling.StageProfiler) замеряет этапы ingest, links, headways, route_index.
+    """
+    return build_network(ingest_gtfs(directory, limit, profiler), profiler)
+
+
+def save_network(network, path):
+    """Сохраняет снимок сети вместе с построенными индексами (запись атомарна)."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(network, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def read_network(path):
+    with open(path, 'rb') as f:
+        return pickle.load(f)
@@ -0,0 +1,108 @@
+import numpy as np
+from scipy.sparse import csr_matrix
+
+# Выборка OD-пар, стратифицированная по числу пересадок/перегонов (hop) кратчайшего пути.
+# Смежность строится один раз в виде целочисленной CSR-матрицы; расстояния в hop считаются
+# BFS сразу из пачки origin: фронт — булева матрица (узлы x origin), шаг — одно умножение на A^T.
+
+DEFAULT_HOP_BANDS = ((1, 5), (5, 10), (10, 20), (20, 40))  # полуинтервалы [lo, hi)
+
+
+class HopDistanceSampler:
+    def __init__(self, all_links, all_stops=None):
+        nodes = set(all_stops) if all_stops is not None else set()
+        for link in all_links:
+            nodes.add(link.from_node)
+            nodes.add(link.to_node)
+        self.node_ids = sorted(nodes)
+        self.node_index = {node: k for k, node in enumerate(self.node_ids)}
+        n = len(self.node_ids)
+
+        rows = np.fromiter((self.node_index[l.from_node] for l in all_links), dtype=np.int32, count=len(all_links))
+        cols = np.fromiter((self.node_index[l.to_node] for l in all_links), dtype=np.int32, count=len(all_links))
+        adjacency = csr_matrix((np.ones(len(rows), dtype=np.int32), (rows, cols)), shape=(n, n))
+        adjacency.data[:] = 1
+        self.adjacency = adjacency
+        self.adjacency_t = adjacency.T.tocsr()
+        self.out_degree = np.diff(adjacency.indptr)
+
+    def hop_distances(self, origin_idx, max_hops):
+        """
+        Матрица (len(origin_idx) x n) числа рёбер кратчайшего пути от каждого origin;
+        -1 — недостижимо за max_hops.
+        """
+        origin_idx = np.asarray(origin_idx, dtype=np.int64)
+        batch = len(origin_idx)
+        n = len(self.node_ids)
+        dist = np.full((n, batch), -1, dtype=np.int16)
+        frontier = np.zeros((n, batch), dtype=np.int32)
+        frontier[origin_idx, np.arange(batch)] = 1
+        dist[origin_idx, np.arange(batch)] = 0
+
+        for hop in range(1, max_hops + 1):
+            reached = (self.adjacency_t @ frontier) > 0
+            reached &= dist < 0
+            if not reached.any():
+                break
+            dist[reached] = hop
+            frontier = reached.astype(np.int32)
+        return dist.T
+
+    def sample_pairs(self, n_per_band, bands=DEFAULT_HOP_BANDS, seed=42, batch_size=256, per_origin=1, max_origins=None):
+        """
+        До n_per_band OD-пар на каждую полосу [lo, hi) числа hop.
+        Origin перебираются в случайном (по seed) порядке пачками по batch_size; от каждого origin
+        в полосу берётся не более per_origin случайных destination, чтобы пары не скучивались.
+        max_origins ограничивает число просмотренных origin.
+        Возвращает {band: [(origin_id, destination_id, hops), ...]}; результат воспроизводим.
+        """
+        rng = np.random.default_rng(seed)
+        bands = tuple(tuple(band) for band in bands)
+        max_hops = max(hi for _, hi in bands) - 1
+        result = {band: [] for band in bands}
+
+        candidates = np.flatnonzero(self.out_degree > 0)
+        candidates = candidates[rng.permutation(len(candidates))][:max_origins]
+
+        for start in range(0, len(candidates), batch_size):
+            if all(len(result[band]) >= n_per_band for band in bands):
+                break
+            origins = candidates[start:start + batch_size]
+            dist = self.hop_distances(origins, max_hops)
+            for band in bands:
+                need = n_per_band - len(result[band])
+                if need <= 0:
+                    continue
+                lo, hi = band
+                rows, cols = np.nonzero((dist >= lo) & (dist < hi))
+                if len(rows) == 0:
+                    continue
+                order = np.lexsort((rng.random(len(rows)), rows))
+                rows, cols = rows[order], cols[order]
+                rank = np.arange(len(rows)) - np.searchsorted(rows, rows, side='left')
+                keep = rank < per_origin
+                rows, cols = rows[keep], cols[keep]
+                for r, c in zip(rows[:need].tolist(), cols[:need].tolist()):
+                    result[band].append((self.node_ids[origins[r]], self.node_ids[c], int(dist[r, c])))
+        return result
+
+    def first_pair(self, min_hops, max_hops=None, max_origins=None, seed=42):
+        """Первая найденная пара с числом hop в [min_hops, max_hops] (None, None — если нет)."""
+        max_hops = min_hops if max_hops is None else max_hops
+        pairs = self.sample_pairs(1, bands=((min_hops, max_hops + 1),), seed=seed, max_origins=max_origins)
+        found = pairs[(min_hops, max_hops + 1)]
+        if not found:
+            return None, None
+        return found[0][0], found[0][1]
+
+
+def get_hop_sampler(network):
+    """Сэмплер сети (строится один раз и хранится в network.indexes)."""
+    return network.get_index('hop_sampler', lambda n: HopDistanceSampler(n.all_links, n.all_stops))
+
+
+def sample_od_pairs(network, n_per_band, bands=DEFAULT_HOP_BANDS, seed=42):
+    """sample_pairs с кэшированием результата в снимке сети."""
+    bands = tuple(tuple(band) for band in bands)
+    return network.get_index(('od_pairs', n_per_band, bands, seed),
+                             lambda n: get_hop_sampler(n).sample_pairs(n_per_band, bands, seed))
@@ -0,0 +1,369 @@
+import csv
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from algos.checkpoint import VolumeAccumulator, Checkpoint
+from algos.network import ingest_gtfs, build_network, save_network, read_network
+from profiling import NULL_PROFILER
+
+# Этапы расчёта с сохранением промежуточных результатов:
+#
+#   ingest         GTFS -> stop_times, рейсы, остановки, названия, координаты
+#   network        ingest -> Network (рёбра, интервалы, пешеходные пересадки, индексы)
+#   assign         network + OD-матрица + движок + T -> суммарные объёмы по всем назначениям
+#
+# Артефакт этапа лежит в <store>/<stage>/<key>/ (artifact.pkl и meta.json), где key — хэш
+# содержимого входов этапа (файлов GTFS и OD, ключа предыдущего этапа, параметров) и версии этапа.
+# Если артефакт с таким ключом уже есть, этап не пересчитывается; после смены только OD-матрицы
+# пересчитывается только assign. Снимок сети — обычный save_network, его можно отдать algos.server.
+
+DEFAULT_STORE = ".traffic_flows"
+STAGE_VERSIONS = {'ingest': 1, 'network': 1, 'assign': 1}
+GTFS_FILES = ('stops.txt', 'stop_times.txt', 'trips.txt', 'routes.txt', 'calendar.txt')
+# Во сколько раз разобранная в памяти сеть больше своего снимка на диске (оценка для --memory-budget)
+NETWORK_MEMORY_FACTOR = 4
+WORKER_BASE_MB = 100
+
+
+def _digest(data):
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class ArtifactStore:
+    def __init__(self, root=DEFAULT_STORE):
+        self.root = root
+        self._fingerprints_path = os.path.join(root, "fingerprints.json")
+        self._fingerprints = None
+
+    def key(self, stage, **inputs):
+        payload = json.dumps({'stage': stage, 'version': STAGE_VERSIONS[stage], **inputs}, sort_keys=True)
+        return _digest(payload.encode('utf-8'))
+
+    def path(self, stage, key, name="artifact.pkl"):
+        return os.path.join(self.root, stage, key, name)
+
+    def exists(self, stage, key):
+        return os.path.exists(self.path(stage, key, "meta.json"))
+
+    def save(self, stage, key, writer, meta, replace=False):
+        """
+        writer(path) пишет артефакт; каталог артефакта появляется целиком или не появляется вовсе.
+        replace — заменить уже записанный артефакт с тем же ключом (пересчёт с --force).
+        """
+        final_dir = os.path.join(self.root, stage, key)
+        tmp_dir = f"{final_dir}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        writer(os.path.join(tmp_dir, "artifact.pkl"))
+        with open(os.path.join(tmp_dir, "meta.json"), 'w', encoding='utf-8') as f:
+            json.dump({'stage': stage, 'key': key, 'created': time.time(), **meta}, f, indent=2, ensure_ascii=False)
+        if replace and os.path.isdir(final_dir):
+            old_dir = f"{final_dir}.old-{os.getpid()}"
+            os.replace(final_dir, old_dir)
+            shutil.rmtree(old_dir, ignore_errors=True)
+        try:
+            os.replace(tmp_dir, final_dir)
+        except OSError:  # тот же артефакт уже записал параллельный запуск
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def load(self, stage, key):
+        with open(self.path(stage, key), 'rb') as f:
+            return pickle.load(f)
+
+    def meta(self, stage, key):
+        with open(self.path(stage, key, "meta.json"), encoding='utf-8') as f:
+            return json.load(f)
+
+    def keys(self, stage):
+        """Ключи готовых артефактов этапа, от старых к новым."""
+        stage_dir = os.path.join(self.root, stage)
+        if not os.path.isdir(stage_dir):
+            return []
+        keys = [k for k in os.listdir(stage_dir) if self.exists(stage, k)]
+        return sorted(keys, key=lambda k: self.meta(stage, k)['created'])
+
+    def resolve(self, stage, prefix):
+        matches = [k for k in self.keys(stage) if k.startswith(prefix)]
+        if len(matches) != 1:
+            raise ValueError(f"Ключ {prefix!r} этапа {stage}: найдено артефактов {len(matches)}")
+        return matches[0]
+
+    def fingerprint(self, path):
+        """Хэш содержимого файла; пересчитывается, только если изменились размер или mtime."""
+        if self._fingerprints is None:
+            try:
+                with open(self._fingerprints_path, encoding='utf-8') as f:
+                    self._fingerprints = json.load(f)
+            except (OSError, ValueError):
+                self._fingerprints = {}
+        st = os.stat(path)
+        abs_path = os.path.abspath(path)
+        cached = self._fingerprints.get(abs_path)
+        if cached and cached['size'] == st.st_size and cached['mtime_ns'] == st.st_mtime_ns:
+            return cached['sha256']
+        digest = file_sha256(path)
+        self._fingerprints[abs_path] = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'sha256': digest}
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = f"{self._fingerprints_path}.tmp-{os.getpid()}"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._fingerprints, f)
+        os.replace(tmp_path, self._fingerprints_path)
+        return digest
+
+
+class StageResult:
+    def __init__(self, stage, key, value, cached, seconds):
+        self.stage = stage
+        self.key = key
+        self.value = value
+        self.cached = cached
+        self.seconds = seconds
+
+    def __repr__(self):
+        state = "из кэша" if self.cached else f"посчитан за {self.seconds:.2f} с"
+        return f"{self.stage} {self.key}: {state}"
+
+
+def _pickle_writer(value):
+    def write(path):
+        with open(path, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return write
+
+
+def run_ingest(store, gtfs_dir, limit, force=False, profiler=NULL_PROFILER):
+    key = store.key('ingest', limit=limit,
+                    files={name: store.fingerprint(os.path.join(gtfs_dir, name)) for name in GTFS_FILES})
+    start = time.perf_counter()
+    if store.exists('ingest', key) and not force:
+        return StageResult('ingest', key, None, True, 0.0)
+    ingested = ingest_gtfs(gtfs_dir, limit, profiler)
+    store.save('ingest', key, _pickle_writer(ingested),
+               {'gtfs_dir': os.path.abspath(gtfs_dir), 'limit': limit, 'n_stops': len(ingested[2]),
+                'n_trips': len(ingested[0])})
+    return StageResult('ingest', key, ingested, False, time.perf_counter() - start)
+
+
+def run_build_network(store, gtfs_dir, limit, walk_radius=0.0, force=False, profiler=NULL_PROFILER):
+    """Сеть по GTFS: ingest и построение сети выполняются, только если их артефактов ещё нет."""
+    from algos.reachability import get_reachability_index
+    from algos.spatial import get_walking_links
+
+    ingest = run_ingest(store, gtfs_dir, limit, force, profiler)
+    key = store.key('network', ingest=ingest.key, walk_radius=walk_radius)
+    start = time.perf_counter()
+    if store.exists('network', key) and not force:
+        return StageResult('network', key, None, True, 0.0)
+
+    ingested = ingest.value if ingest.value is not None else store.load('ingest', ingest.key)
+    network = build_network(ingested, profiler)
+    if walk_radius > 0:
+        with profiler.stage('walking_links'):
+            network.all_links = network.all_links + get_walking_links(network, walk_radius)
+    with profiler.stage('reachability'):
+        get_reachability_index(network)
+    store.save('network', key, lambda path: save_network(network, path),
+               {'ingest': ingest.key, 'walk_radius': walk_radius,
+                'n_stops': len(network.all_stops), 'n_links': len(network.all_links)})
+    return StageResult('network', key, network, False, time.perf_counter() - start)
+
+
+def read_od_matrix(path):
+    """OD-матрица из JSON {origin: {destination: demand}} или CSV с колонками origin, destination, demand."""
+    if path.endswith('.json'):
+        with open(path, encoding='utf-8') as f:
+            return {o: {d: float(v) for d, v in targets.items()} for o, targets in json.load(f).items()}
+    od_matrix = {}
+    with open(path, encoding='utf-8', newline='') as f:
+        for row in csv.DictReader(f):
+            targets = od_matrix.setdefault(row['origin'], {})
+            targets[row['destination']] = targets.get(row['destination'], 0.0) + float(row['demand'])
+    return od_matrix
+
+
+def plan_workers(workers, memory_budget_mb, snapshot_bytes):
+    """Число процессов, которое укладывается в memory_budget_mb (каждый держит свою копию сети)."""
+    if not memory_budget_mb:
+        return max(1, workers)
+    per_worker_mb = WORKER_BASE_MB + NETWORK_MEMORY_FACTOR * snapshot_bytes / 2 ** 20
+    return max(1, min(workers, int(memory_budget_mb // per_worker_mb)))
+
+
+_network = None
+
+
+def _init_worker(network):
+    global _network
+    _network = network
+
+
+def _assign_destination(destination, od_matrix, engine, T, network=None, record=False):
+    """(links, nodes) назначения; при record третьим элементом — запись для индекса выбранного ребра."""
+    from algos import florian, time_arrived_florian
+
+    network = network or _network
+    if engine == 'florian':
+        strategy = florian.find_optimal_strategy(network.all_links, network.all_stops, destination)
+        volumes = florian.assign_demand(network.all_links, network.all_stops, strategy, od_matrix, destination)
+    else:
+        strategy = time_arrived_florian.find_optimal_strategy(network.all_links, network.all_stops, destination, T)
+        volumes = time_arrived_florian.assign_demand(network.all_links, network.all_stops, strategy, od_matrix,
+                                                     destination)
+    if record:
+        from algos.selected_link import get_link_table, make_record
+        return volumes.links, volumes.nodes, make_record(get_link_table(network), destination, od_matrix, strategy,
+                                                         volumes)
+    return volumes.links, volumes.nodes
+
+
+def split_by_destination(od_matrix):
+    """{destination: {origin: {destination: demand}}} — части OD-матрицы для отдельных расчётов."""
+    by_destination = {}
+    for origin, targets in od_matrix.items():
+        for destination, demand in targets.items():
+            if demand and origin != destination:
+                by_destination.setdefault(destination, {})[origin] = {destination: demand}
+    return dict(sorted(by_destination.items()))
+
+
+def assign_all(network, od_matrix, engine='florian', T=60.0, workers=1, checkpoint_dir=None,
+               checkpoint_interval=60.0, resume=False, index=None):
+    """
+    Суммарные объёмы (Volumes) по всем назначениям OD-матрицы и число назначений.
+    При workers > 1 назначения считаются в пуле процессов. Назначения, которых нет в сети, пропускаются.
+    checkpoint_dir — каталог контрольной точки (algos.checkpoint), обновляется раз в checkpoint_interval
+    секунд; при resume уже посчитанные в ней назначения пропускаются.
+    index (algos.selected_link.SelectedLinkIndexBuilder) получает запись по каждому назначению.
+    """
+    parts = {d: od for d, od in split_by_destination(od_matrix).items() if d in network.all_stops}
+    accumulator = VolumeAccumulator(network)
+    checkpoint = None
+    if checkpoint_dir is not None:
+        checkpoint = Checkpoint(checkpoint_dir, len(parts), checkpoint_interval,
+                                on_save=index.flush if index is not None else None)
+        if resume and checkpoint.restore(accumulator):
+            if index is not None:
+                index.restore(checkpoint_dir, accumulator.completed)
+            done = set(accumulator.completed)
+            parts = {d: od for d, od in parts.items() if d not in done}
+            print(f"Продолжение с контрольной точки: готово {len(done)}, осталось {len(parts)} назначений")
+        elif index is not None:
+            index.discard(checkpoint_dir)
+
+    def add(destination, result):
+        accumulator.add(destination, *result[:2])
+        if index is not None:
+            index.add(destination, result[2])
+        if checkpoint is not None:
+            checkpoint.save(accumulator)
+
+    if workers > 1 and len(parts) > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(network,)) as pool:
+            n = len(parts)
+            results = pool.map(_assign_destination, parts.keys(), parts.values(), [engine] * n, [T] * n,
+                               [None] * n, [index is not None] * n, chunksize=max(1, min(16, n // (4 * workers))))
+            for destination, result in zip(parts, results):
+                add(destination, result)
+    else:
+        for destination, od in parts.items():
+            add(destination, _assign_destination(destination, od, engine, T, network, index is not None))
+    if checkpoint is not None:
+        checkpoint.save(accumulator, force=True)
+    return accumulator.volumes(), len(accumulator.completed)
+
+
+def run_assign(store, network_key, od_path, engine='florian', T=60.0, workers=1, memory_budget_mb=None,
+               force=False, network=None, profiler=NULL_PROFILER, resume=False, checkpoint_interval=60.0,
+               selected_link=False):
+    """
+    Этап assign поверх готового артефакта сети network_key; пересчитывается при смене OD, движка или T.
+    Пока этап идёт, частичный результат лежит в partial_dir(store, key) (см. algos.checkpoint);
+    resume продолжает прерванный расчёт с этой контрольной точки. selected_link — записать рядом
+    с артефактом индекс выбранного ребра (algos.selected_link); если его нет, этап пересчитывается.
+    """
+    from algos.selected_link import SELECTED_LINK_FILE, SelectedLinkIndexBuilder, get_link_table
+
+    key = assign_key(store, network_key, od_path, engine, T)
+    start = time.perf_counter()
+    if store.exists('assign', key) and not force and \
+            (not selected_link or os.path.exists(store.path('assign', key, SELECTED_LINK_FILE))):
+        return StageResult('assign', key, None, True, 0.0)
+
+    snapshot_path = store.path('network', network_key)
+    workers = plan_workers(workers, memory_budget_mb, os.path.getsize(snapshot_path))
+    od_matrix = read_od_matrix(od_path)
+    if network is None:
+        network = read_network(snapshot_path)
+    checkpoint_dir = partial_dir(store, key)
+    index = SelectedLinkIndexBuilder(get_link_table(network)) if selected_link else None
+    with profiler.stage(f'assign_{engine}'):
+        volumes, n_destinations = assign_all(network, od_matrix, engine, T, workers, checkpoint_dir,
+                                             checkpoint_interval, resume, index)
+    seconds = time.perf_counter() - start
+    save_assign(store, key, volumes, network_key, od_path, od_matrix, engine, T, n_destinations, seconds,
+                index=index.build() if index is not None else None, workers=workers)
+    return StageResult('assign', key, volumes, False, seconds)
+
+
+def assign_key(store, network_key, od_path, engine, T):
+    return store.key('assign', network=network_key, od=store.fingerprint(od_path), engine=engine,
+                     T=None if engine == 'florian' else T)
+
+
+def save_assign(store, key, volumes, network_key, od_path, od_matrix, engine, T, n_destinations, seconds,
+                index=None, **meta):
+    """Сохраняет результат assign (и индекс выбранного ребра index) и удаляет его контрольную точку."""
+    from algos.selected_link import SELECTED_LINK_FILE
+
+    def write(path):
+        _pickle_writer(volumes)(path)
+        if index is not None:
+            index.save(os.path.join(os.path.dirname(path), SELECTED_LINK_FILE))
+
+    store.save('assign', key, write,
+               {'network': network_key, 'od_path': os.path.abspath(od_path), 'engine': engine, 'T': T,
+                'n_destinations': n_destinations, 'seconds': seconds, 'selected_link': index is not None,
+                'total_demand': sum(sum(t.values()) for t in od_matrix.values()), **meta}, replace=True)
+    shutil.rmtree(partial_dir(store, key), ignore_errors=True)
+
+
+def partial_dir(store, assign_key):
+    return os.path.join(store.root, 'assign', assign_key + '.partial')
+
+
+def partial_runs(store):
+    """Ключи assign, у которых есть контрольная точка (идущие или прерванные расчёты)."""
+    assign_dir = os.path.join(store.root, 'assign')
+    if not os.path.isdir(assign_dir):
+        return []
+    return sorted(name[:-len('.partial')] for name in os.listdir(assign_dir)
+                  if name.endswith('.partial') and os.path.exists(os.path.join(assign_dir, name, 'progress.json')))
+
+
+def link_rows(volumes):
+    """[(from, to, volume)] по убыванию объёма."""
+    rows = [(i, j, v) for i, targets in volumes.links.items() for j, v in targets.items() if v > 0]
+    return sorted(rows, key=lambda row: -row[2])
+
+
+def summarize(store, assign_key):
+    volumes = store.load('assign', assign_key)
+    meta = store.meta('assign', assign_key)
+    rows = link_rows(volumes)
+    return {'key': assign_key, 'engine': meta['engine'], 'T': meta['T'],
+            'n_destinations': meta['n_destinations'], 'total_demand': meta['total_demand'],
+            'active_links': len(rows), 'total_link_volume': sum(v for _, _, v in rows),
+            'max_link_volume': rows[0][2] if rows else 0.0, 'seconds': meta['seconds']}
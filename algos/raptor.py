@@ -0,0 +1,286 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from utils import gtfs_time_to_seconds
+
+# Многокритериальные матрицы "остановка -> остановка" по расписанию (RAPTOR, Delling et al.)
+#
+# В отличие от find_optimal_strategy, которая считает метки к одному destination,
+# здесь за один проход раундов считаются времена от пачки origin до всех остановок.
+
+SKIM_NAMES = ("travel_time", "waiting_time", "transfers")
+
+
+class RoutePatterns:
+    """
+    Индекс паттернов маршрутов в виде массивов.
+
+    Паттерн — последовательность остановок, общая для группы рейсов одного маршрута.
+    stop_ids[k] — строковый id остановки с индексом k, stop_index — обратное отображение.
+    pattern_stop_ptr/pattern_stops — CSR: остановки паттерна p лежат в
+    pattern_stops[pattern_stop_ptr[p]:pattern_stop_ptr[p + 1]].
+    pattern_arr[p], pattern_dep[p] — матрицы (рейсы x остановки) времени прибытия и
+    отправления в секундах; рейсы отсортированы по отправлению и не обгоняют друг друга.
+    stop_pattern_ptr/stop_pattern_ids/stop_pattern_pos — CSR: паттерны, проходящие
+    через остановку, и позиция остановки в каждом из них.
+    """
+    def __init__(self, stop_ids, pattern_routes, pattern_stop_ptr, pattern_stops, pattern_arr, pattern_dep):
+        self.stop_ids = stop_ids
+        self.stop_index = {stop: k for k, stop in enumerate(stop_ids)}
+        self.pattern_routes = pattern_routes
+        self.pattern_stop_ptr = pattern_stop_ptr
+        self.pattern_stops = pattern_stops
+        self.pattern_arr = pattern_arr
+        self.pattern_dep = pattern_dep
+
+        n_stops = len(stop_ids)
+        n_entries = len(pattern_stops)
+        pattern_of_entry = np.repeat(np.arange(len(pattern_routes), dtype=np.int32), np.diff(pattern_stop_ptr))
+        pos_of_entry = np.arange(n_entries, dtype=np.int32) - np.repeat(pattern_stop_ptr[:-1], np.diff(pattern_stop_ptr)).astype(np.int32)
+        order = np.argsort(pattern_stops, kind='stable')
+        self.stop_pattern_ids = pattern_of_entry[order]
+        self.stop_pattern_pos = pos_of_entry[order]
+        counts = np.bincount(pattern_stops, minlength=n_stops)
+        self.stop_pattern_ptr = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+
+    @property
+    def n_stops(self):
+        return len(self.stop_ids)
+
+    @property
+    def n_patterns(self):
+        return len(self.pattern_routes)
+
+    def stops_of_pattern(self, p):
+        return self.pattern_stops[self.pattern_stop_ptr[p]:self.pattern_stop_ptr[p + 1]]
+
+    def patterns_at_stops(self, stop_idx):
+        """Уникальные индексы паттернов, проходящих через любую из остановок stop_idx."""
+        if len(stop_idx) == 0:
+            return np.empty(0, dtype=np.int32)
+        starts = self.stop_pattern_ptr[stop_idx]
+        ends = self.stop_pattern_ptr[stop_idx + 1]
+        chunks = [self.stop_pattern_ids[s:e] for s, e in zip(starts, ends) if e > s]
+        if not chunks:
+            return np.empty(0, dtype=np.int32)
+        return np.unique(np.concatenate(chunks))
+
+
+def _split_overtaking(arr, dep):
+    """
+    Делит рейсы паттерна на группы без обгонов (FIFO), чтобы посадку на самый ранний
+    рейс можно было искать через searchsorted по столбцу отправлений.
+    """
+    groups = []
+    for t in range(dep.shape[0]):
+        for group in groups:
+            last = group[-1]
+            if np.all(dep[t] >= dep[last]) and np.all(arr[t] >= arr[last]):
+                group.append(t)
+                break
+        else:
+            groups.append([t])
+    return groups
+
+
+def build_route_patterns(stop_times, active_trips, all_stops=None):
+    """
+    Строит RoutePatterns из stop_times и active_trips (результат parse_gtfs_limited).
+    Рейсы одного маршрута с одинаковой последовательностью остановок объединяются в паттерн.
+    """
+    grouped = {}
+    seen_stops = set() if all_stops is None else set(all_stops)
+    for trip_id, times in stop_times.items():
+        if trip_id not in active_trips or len(times) < 2:
+            continue
+        ordered = sorted(times, key=lambda x: int(x['stop_sequence']))
+        sequence = tuple(st['stop_id'] for st in ordered)
+        arr = [gtfs_time_to_seconds(st['arrival_time']) for st in ordered]
+        dep = [gtfs_time_to_seconds(st['departure_time']) for st in ordered]
+        grouped.setdefault((active_trips[trip_id], sequence), []).append((dep[0], arr, dep))
+        seen_stops.update(sequence)
+
+    stop_ids = sorted(seen_stops)
+    stop_index = {stop: k for k, stop in enumerate(stop_ids)}
+
+    pattern_routes = []
+    pattern_stops = []
+    pattern_stop_ptr = [0]
+    pattern_arr = []
+    pattern_dep = []
+    for (route_id, sequence), trips in sorted(grouped.items()):
+        trips.sort(key=lambda x: x[0])
+        arr = np.array([t[1] for t in trips], dtype=np.float64)
+        dep = np.array([t[2] for t in trips], dtype=np.float64)
+        stops = [stop_index[s] for s in sequence]
+        for group in _split_overtaking(arr, dep):
+            pattern_routes.append(route_id)
+            pattern_stops.extend(stops)
+            pattern_stop_ptr.append(len(pattern_stops))
+            pattern_arr.append(arr[group])
+            pattern_dep.append(dep[group])
+
+    return RoutePatterns(
+        stop_ids,
+        pattern_routes,
+        np.array(pattern_stop_ptr, dtype=np.int64),
+        np.array(pattern_stops, dtype=np.int32),
+        pattern_arr,
+        pattern_dep,
+    )
+
+
+def raptor_batch(patterns, origin_idx, departure_time, max_rounds=5):
+    """
+    Раунды RAPTOR сразу для пачки origin (векторизовано по пачке).
+
+    Возвращает матрицы (len(origin_idx) x n_stops):
+      arrival — самое раннее время прибытия в секундах (inf — недостижимо),
+      waiting — суммарное ожидание на остановках для этого прибытия (секунды),
+      rounds  — число посадок (0 для самой origin, -1 — недостижимо).
+    Раунд k соответствует поездкам с не более чем k посадками, т.е. k - 1 пересадкам.
+    """
+    origin_idx = np.asarray(origin_idx, dtype=np.int64)
+    batch = len(origin_idx)
+    n_stops = patterns.n_stops
+    rows = np.arange(batch)
+
+    best = np.full((batch, n_stops), np.inf)
+    best_wait = np.full((batch, n_stops), np.inf)
+    best_rounds = np.full((batch, n_stops), -1, dtype=np.int32)
+    best[rows, origin_idx] = departure_time
+    best_wait[rows, origin_idx] = 0.0
+    best_rounds[rows, origin_idx] = 0
+
+    prev_arr = best.copy()
+    prev_wait = best_wait.copy()
+    marked = np.zeros((batch, n_stops), dtype=bool)
+    marked[rows, origin_idx] = True
+
+    for k in range(1, max_rounds + 1):
+        marked_stops = np.flatnonzero(marked.any(axis=0))
+        if len(marked_stops) == 0:
+            break
+        cur_arr = prev_arr.copy()
+        cur_wait = prev_wait.copy()
+        new_marked = np.zeros_like(marked)
+
+        for p in patterns.patterns_at_stops(marked_stops):
+            stops = patterns.stops_of_pattern(p)
+            arr_times = patterns.pattern_arr[p]
+            dep_times = patterns.pattern_dep[p]
+            n_trips = arr_times.shape[0]
+            trip = np.full(batch, -1, dtype=np.int64)
+            trip_wait = np.zeros(batch)
+
+            for pos, s in enumerate(stops):
+                on = np.flatnonzero(trip >= 0)
+                if pos > 0 and len(on):
+                    t_arr = arr_times[trip[on], pos]
+                    better = t_arr < best[on, s]
+                    idx = on[better]
+                    if len(idx):
+                        best[idx, s] = t_arr[better]
+                        best_wait[idx, s] = trip_wait[idx]
+                        best_rounds[idx, s] = k
+                        cur_arr[idx, s] = t_arr[better]
+                        cur_wait[idx, s] = trip_wait[idx]
+                        new_marked[idx, s] = True
+
+                if pos == len(stops) - 1:
+                    continue
+                ready = prev_arr[:, s]
+                can = np.flatnonzero(marked[:, s] & np.isfinite(ready))
+                if len(can) == 0:
+                    continue
+                cand = np.searchsorted(dep_times[:, pos], ready[can], side='left')
+                ok = (cand < n_trips) & ((trip[can] < 0) | (cand < trip[can]))
+                idx = can[ok]
+                if len(idx):
+                    trip[idx] = cand[ok]
+                    trip_wait[idx] = prev_wait[idx, s] + dep_times[cand[ok], pos] - ready[idx]
+
+        prev_arr = cur_arr
+        prev_wait = cur_wait
+        marked = new_marked
+
+    return best, best_wait, best_rounds
+
+
+def _skim_rows(patterns, origin_idx, departure_time, max_rounds):
+    arrival, waiting, rounds = raptor_batch(patterns, origin_idx, departure_time, max_rounds)
+    travel_time = ((arrival - departure_time) / 60.0).astype(np.float32)
+    waiting_time = (waiting / 60.0).astype(np.float32)
+    transfers = np.maximum(rounds - 1, 0).astype(np.float32)
+    transfers[rounds < 0] = np.inf
+    return travel_time, waiting_time, transfers
+
+
+_worker_state = {}
+
+
+def _init_worker(patterns, paths, departure_time, max_rounds):
+    _worker_state['patterns'] = patterns
+    _worker_state['paths'] = paths
+    _worker_state['departure_time'] = departure_time
+    _worker_state['max_rounds'] = max_rounds
+
+
+def _run_batch(start, origin_idx):
+    patterns = _worker_state['patterns']
+    skims = _skim_rows(patterns, origin_idx, _worker_state['departure_time'], _worker_state['max_rounds'])
+    for name, values in zip(SKIM_NAMES, skims):
+        matrix = np.load(_worker_state['paths'][name], mmap_mode='r+')
+        matrix[start:start + len(origin_idx)] = values
+        matrix.flush()
+        del matrix
+    return start, len(origin_idx)
+
+
+def compute_skims(patterns, origins, departure_time, output_dir, max_rounds=5, batch_size=128, workers=1):
+    """
+    Считает матрицы travel_time / waiting_time (минуты) и transfers для origins x все остановки
+    и пишет их как memory-mapped float32 .npy в output_dir. Недостижимые пары — inf.
+
+    Origin обрабатываются пачками по batch_size; при workers > 1 пачки считаются в отдельных
+    процессах, каждый пишет свои строки прямо в memmap. Порядок столбцов — patterns.stop_ids,
+    порядок строк — origins; оба сохраняются в index.json рядом с матрицами.
+    Возвращает словарь {имя матрицы: np.memmap (только чтение)}.
+    """
+    if isinstance(departure_time, str):
+        departure_time = gtfs_time_to_seconds(departure_time)
+    os.makedirs(output_dir, exist_ok=True)
+
+    origin_idx = np.array([patterns.stop_index[o] for o in origins], dtype=np.int64)
+    shape = (len(origin_idx), patterns.n_stops)
+
+    paths = {}
+    for name in SKIM_NAMES:
+        paths[name] = os.path.join(output_dir, f"{name}.npy")
+        matrix = np.lib.format.open_memmap(paths[name], mode='w+', dtype=np.float32, shape=shape)
+        matrix.flush()
+        del matrix
+
+    with open(os.path.join(output_dir, "index.json"), 'w', encoding="utf-8") as f:
+        json.dump({
+            'origins': list(origins),
+            'stops': list(patterns.stop_ids),
+            'departure_time': departure_time,
+            'max_rounds': max_rounds,
+        }, f, ensure_ascii=False)
+
+    batches = [(start, origin_idx[start:start + batch_size]) for start in range(0, len(origin_idx), batch_size)]
+    if workers > 1 and len(batches) > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(patterns, paths, departure_time, max_rounds)) as pool:
+            list(pool.map(_run_batch, *zip(*batches)))
+    else:
+        _init_worker(patterns, paths, departure_time, max_rounds)
+        for start, batch in batches:
+            _run_batch(start, batch)
+        _worker_state.clear()
+
+    return {name: np.load(path, mmap_mode='r') for name, path in paths.items()}
@@ -0,0 +1,94 @@
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components, breadth_first_order
+
+# Индекс достижимости "какие остановки могут доехать до D" для многих destination.
+# Граф рёбер один раз сжимается в компоненты сильной связности; их конденсация — DAG,
+# в котором запрос сводится к обходу предков компоненты D (DAG обычно много меньше графа).
+
+
+class ReachabilityIndex:
+    def __init__(self, all_links, all_stops=None):
+        nodes = set(all_stops) if all_stops is not None else set()
+        for link in all_links:
+            nodes.add(link.from_node)
+            nodes.add(link.to_node)
+        self.node_ids = sorted(nodes)
+        self.node_index = {node: k for k, node in enumerate(self.node_ids)}
+        n = len(self.node_ids)
+
+        rows = np.fromiter((self.node_index[l.from_node] for l in all_links), dtype=np.int64, count=len(all_links))
+        cols = np.fromiter((self.node_index[l.to_node] for l in all_links), dtype=np.int64, count=len(all_links))
+        graph = csr_matrix((np.ones(len(rows), dtype=np.int8), (rows, cols)), shape=(n, n))
+        self.n_components, self.labels = connected_components(graph, directed=True, connection='strong')
+
+        comp_rows = self.labels[rows]
+        comp_cols = self.labels[cols]
+        between = comp_rows != comp_cols
+        # Обратная конденсация: ребро C(to) -> C(from), обход из C(D) даёт всех предков
+        self.condensation_reverse = csr_matrix(
+            (np.ones(int(between.sum()), dtype=np.int8), (comp_cols[between], comp_rows[between])),
+            shape=(self.n_components, self.n_components))
+
+        self.component_members = np.argsort(self.labels, kind='stable')
+        self.component_sizes = np.bincount(self.labels, minlength=self.n_components)
+        self.component_ptr = np.concatenate(([0], np.cumsum(self.component_sizes)))
+
+    def _component_of(self, destination):
+        return self.labels[self.node_index[destination]]
+
+    def ancestor_components(self, component):
+        """Компоненты, из которых достижима component (включая её саму)."""
+        return breadth_first_order(self.condensation_reverse, component, directed=True, return_predecessors=False)
+
+    def _members(self, components):
+        chunks = [self.component_members[self.component_ptr[c]:self.component_ptr[c + 1]] for c in components]
+        return np.sort(np.concatenate(chunks)) if chunks else np.empty(0, dtype=np.int64)
+
+    def origins_reaching(self, destination):
+        """Индексы узлов (в node_ids), из которых можно доехать до destination, включая его самого."""
+        if destination not in self.node_index:
+            return np.empty(0, dtype=np.int64)
+        return self._members(self.ancestor_components(self._component_of(destination)))
+
+    def origins_reaching_many(self, destinations):
+        """
+        Пакетный запрос: список массивов индексов для каждого destination.
+        Destination из одной компоненты сильной связности обслуживаются одним обходом.
+        """
+        by_component = {}
+        result = []
+        for destination in destinations:
+            if destination not in self.node_index:
+                result.append(np.empty(0, dtype=np.int64))
+                continue
+            component = self._component_of(destination)
+            if component not in by_component:
+                by_component[component] = self._members(self.ancestor_components(component))
+            result.append(by_component[component])
+        return result
+
+    def count_reaching(self, destinations):
+        """
+        Число узлов, из которых достижим каждый destination (включая его), без построения списков —
+        для оценки размера задач по всем destination заранее.
+        """
+        cache = {}
+        counts = np.zeros(len(destinations), dtype=np.int64)
+        for k, destination in enumerate(destinations):
+            if destination not in self.node_index:
+                continue
+            component = self._component_of(destination)
+            if component not in cache:
+                cache[component] = int(self.component_sizes[self.ancestor_components(component)].sum())
+            counts[k] = cache[component]
+        return counts
+
+    def stops_reaching(self, destination):
+        """Совместимо с get_all_origins_reaching_destination: множество id остановок."""
+        return {self.node_ids[k] for k in self.origins_reaching(destination)}
+
+
+def get_reachability_index(network):
+    """Индекс достижимости сети (строится один раз и хранится в network.indexes)."""
+    return network.get_index('reachability', lambda n: ReachabilityIndex(n.all_links, n.all_stops))
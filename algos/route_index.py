@@ -0,0 +1,104 @@
+import numpy as np
+
+from algos.raptor import build_route_patterns
+
+# Индекс маршрутов, строящийся при чтении GTFS:
+#   название/номер маршрута -> route_id -> trip_ids -> паттерны остановок (массивы индексов),
+#   остановка -> маршруты, которые её обслуживают (CSR).
+# Сохраняется в снимке сети (network.indexes['route_index']), поэтому stop_times после
+# чтения GTFS больше не нужны для запросов вида "остановки маршрута с962 по порядку".
+
+
+def _short_name(route_name):
+    return route_name.split(" - ", 1)[0].strip().lower()
+
+
+class RouteIndex:
+    def __init__(self, stop_times, active_trips, route_names=None, all_stops=None):
+        route_names = route_names or {}
+        self.patterns = build_route_patterns(stop_times, active_trips, all_stops)
+        self.route_names = dict(route_names)
+
+        self.route_trips = {}
+        for trip_id, route_id in active_trips.items():
+            if trip_id in stop_times:
+                self.route_trips.setdefault(route_id, []).append(trip_id)
+        for trips in self.route_trips.values():
+            trips.sort()
+
+        self.route_ids = sorted(set(self.route_trips) | set(self.patterns.pattern_routes))
+        self.route_index = {route_id: k for k, route_id in enumerate(self.route_ids)}
+
+        self.name_to_routes = {}
+        for route_id in self.route_ids:
+            name = route_names.get(route_id, route_id)
+            self.name_to_routes.setdefault(_short_name(name), []).append(route_id)
+
+        # Паттерны маршрута по убыванию числа рейсов: первый — канонический
+        self.route_patterns = {}
+        for p, route_id in enumerate(self.patterns.pattern_routes):
+            self.route_patterns.setdefault(route_id, []).append(p)
+        for route_id, pats in self.route_patterns.items():
+            pats.sort(key=lambda p: (-self.patterns.pattern_arr[p].shape[0],
+                                     -len(self.patterns.stops_of_pattern(p)), p))
+
+        # Остановка -> маршруты (CSR по индексам остановок patterns.stop_ids)
+        n_stops = self.patterns.n_stops
+        pattern_route_idx = np.array([self.route_index[r] for r in self.patterns.pattern_routes], dtype=np.int32)
+        entry_route = np.repeat(pattern_route_idx, np.diff(self.patterns.pattern_stop_ptr))
+        keys = np.unique(self.patterns.pattern_stops.astype(np.int64) * len(self.route_ids) + entry_route)
+        stop_of_key = keys // max(len(self.route_ids), 1)
+        self.stop_route_ids = (keys % max(len(self.route_ids), 1)).astype(np.int32)
+        self.stop_route_ptr = np.concatenate(([0], np.cumsum(np.bincount(stop_of_key, minlength=n_stops))))
+
+    def find_routes(self, name):
+        """
+        route_id по номеру/названию маршрута: сначала точное совпадение номера (без учёта регистра),
+        иначе — все маршруты, в полном названии которых встречается name.
+        """
+        key = name.strip().lower()
+        if key in self.name_to_routes:
+            return list(self.name_to_routes[key])
+        return [r for r in self.route_ids if key in self.route_names.get(r, r).lower()]
+
+    def _resolve(self, route):
+        if route in self.route_patterns or route in self.route_trips:
+            return route
+        found = self.find_routes(route)
+        return found[0] if found else None
+
+    def trips_of_route(self, route):
+        route_id = self._resolve(route)
+        return list(self.route_trips.get(route_id, ()))
+
+    def pattern_stop_indices(self, route, pattern=0):
+        """Массив индексов остановок (в patterns.stop_ids) паттерна маршрута; 0 — канонический."""
+        route_id = self._resolve(route)
+        pats = self.route_patterns.get(route_id)
+        if not pats or pattern >= len(pats):
+            return np.empty(0, dtype=np.int32)
+        return self.patterns.stops_of_pattern(pats[pattern])
+
+    def stops_of_route(self, route, pattern=0):
+        """Остановки маршрута (route_id или номер) по порядку следования."""
+        return [self.patterns.stop_ids[k] for k in self.pattern_stop_indices(route, pattern)]
+
+    def terminals(self, route):
+        stops = self.stops_of_route(route)
+        if len(stops) < 2:
+            return None, None
+        return stops[0], stops[-1]
+
+    def routes_serving(self, stop_id):
+        """route_id маршрутов, проходящих через остановку."""
+        k = self.patterns.stop_index.get(stop_id)
+        if k is None:
+            return []
+        return [self.route_ids[r] for r in self.stop_route_ids[self.stop_route_ptr[k]:self.stop_route_ptr[k + 1]]]
+
+
+def get_route_index(network):
+    """Индекс маршрутов сети; строится при чтении GTFS (load_network), т.к. требует stop_times."""
+    def missing(_):
+        raise ValueError("Индекс маршрутов строится при чтении GTFS: используйте load_network")
+    return network.get_index('route_index', missing)
@@ -0,0 +1,251 @@
+import os
+
+import numpy as np
+from scipy.sparse import csc_matrix, identity
+from scipy.sparse.linalg import spsolve
+
+from algos.checkpoint import _atomic_write
+from algos.compact import LinkTable, CompactVolumes, _concat
+from utils import INFINITE_FREQUENCY
+
+# Индекс выбранного ребра (select link) и выбранной зоны. При расчёте всех назначений для каждого
+# назначения сохраняются спрос из источников, ненулевые объёмы рёбер и привлекательное множество
+# в порядке загрузки с долями рёбер (частота ребра / частота узла). По индексу без повторного
+# назначения отвечают:
+#
+#   destinations_through(i, j)      объём на ребре i -> j по назначениям;
+#   od_through(i, j)                потоки OD-пар через ребро i -> j;
+#   zone_links(destinations)        объёмы рёбер от спроса в набор назначений (зону);
+#   od_links(origin, destination)   рёбра, которыми пользуется одна OD-пара.
+#
+# Поток OD-пары через ребро — спрос пары, умноженный на ожидаемое число проходов ребра из источника;
+# оно решается одной разреженной системой (I - P) q = b по стратегии назначения, где P — доли рёбер.
+# Рёбра адресуются парами (from, to) в порядке LinkTable.pairs; параллельные маршруты одной пары
+# в od_through и od_links складываются. Индекс — один сжатый .npz.
+
+SELECTED_LINK_FILE = "selected_link.npz"
+CHUNK_PREFIX = "selected_link_"
+
+
+def get_link_table(network):
+    return network.get_index('link_table', lambda n: LinkTable(n.all_links, n.all_stops))
+
+
+def make_record(table, destination, od_matrix, strategy, volumes):
+    """
+    Данные одного назначения для индекса: (источники, спрос, пары a_set, доли рёбер, позиции объёмов, объёмы).
+    strategy.a_set должен быть в порядке загрузки (его так сортирует assign_demand).
+    """
+    demand = sorted((table.node_pos[o], targets[destination]) for o, targets in od_matrix.items()
+                    if targets.get(destination) and o in table.node_pos)
+    freqs = strategy.freqs
+    shares = []
+    for a in strategy.a_set:
+        freq = INFINITE_FREQUENCY if a.headway <= 0 else 1 / a.headway
+        shares.append(freq / freqs[a.from_node] if freqs[a.from_node] else 0.0)
+    compact = CompactVolumes.from_volumes(volumes, table)
+    return (np.array([k for k, _ in demand], dtype=np.int32), np.array([v for _, v in demand], dtype=np.float32),
+            np.array([table.pair_pos[a.from_node, a.to_node] for a in strategy.a_set], dtype=np.int32),
+            np.array(shares, dtype=np.float32), compact.link_index, compact.link_values)
+
+
+RECORD_FIELDS = (('od_origin', 'offsets_od', np.int32), ('od_demand', 'offsets_od', np.float32),
+                 ('a_set_pair', 'offsets_a_set', np.int32), ('a_set_share', 'offsets_a_set', np.float32),
+                 ('link_index', 'offsets_links', np.int32), ('link_values', 'offsets_links', np.float32))
+
+
+def _record_columns(records):
+    columns = {}
+    for k, (name, offsets, dtype) in enumerate(RECORD_FIELDS):
+        columns[name], columns[offsets] = _concat([record[k] for record in records], dtype)
+    return columns
+
+
+def _split_records(columns):
+    records = []
+    for k in range(len(columns['destinations'])):
+        records.append(tuple(columns[name][columns[offsets][k]:columns[offsets][k + 1]]
+                             for name, offsets, _ in RECORD_FIELDS))
+    return records
+
+
+class SelectedLinkIndexBuilder:
+    """Собирает записи make_record по назначениям; flush/restore сохраняют их вместе с контрольной точкой."""
+    def __init__(self, table):
+        self.table = table
+        self.records = {}
+        self._flushed = 0
+
+    def add(self, destination, record):
+        self.records[destination] = record
+
+    def flush(self, directory):
+        """Дописывает в directory записи, добавленные после прошлого flush, отдельным файлом."""
+        destinations = list(self.records)[self._flushed:]
+        if not destinations:
+            return
+        columns = _record_columns([self.records[d] for d in destinations])
+        columns['destinations'] = np.array(destinations, dtype=str)
+        path = os.path.join(directory, f"{CHUNK_PREFIX}{self._flushed:08d}.npz")
+        _atomic_write(path, lambda f: np.savez(f, **columns))
+        self._flushed = len(self.records)
+
+    def discard(self, directory):
+        """Удаляет из directory записи прошлого расчёта (расчёт начинается заново)."""
+        for name in os.listdir(directory):
+            if name.startswith(CHUNK_PREFIX) and name.endswith('.npz'):
+                os.remove(os.path.join(directory, name))
+
+    def restore(self, directory, completed):
+        """Загружает записи из directory, оставляя только назначения из completed (учтённые в контрольной точке)."""
+        done = set(completed)
+        for name in sorted(os.listdir(directory)):
+            if not (name.startswith(CHUNK_PREFIX) and name.endswith('.npz')):
+                continue
+            with np.load(os.path.join(directory, name)) as data:
+                columns = {key: data[key] for key in data.files}
+            for destination, record in zip(columns['destinations'].tolist(), _split_records(columns)):
+                if destination in done:
+                    self.records[destination] = record
+        self._flushed = len(self.records)
+
+    def build(self):
+        table = self.table
+        destinations = sorted(self.records)
+        columns = _record_columns([self.records[d] for d in destinations])
+        columns['node_ids'] = np.array(table.node_ids, dtype=str)
+        columns['pair_from'] = np.array([table.node_pos[i] for i, _ in table.pairs], dtype=np.int32)
+        columns['pair_to'] = np.array([table.node_pos[j] for _, j in table.pairs], dtype=np.int32)
+        columns['destinations'] = np.array([table.node_pos[d] for d in destinations], dtype=np.int32)
+
+        # обратный индекс: пара -> (назначение, объём), отсортированный по паре
+        owners = np.repeat(np.arange(len(destinations), dtype=np.int32), np.diff(columns['offsets_links']))
+        order = np.argsort(columns['link_index'], kind='stable')
+        columns['by_pair_destination'] = owners[order]
+        columns['by_pair_value'] = columns['link_values'][order]
+        counts = np.bincount(columns['link_index'], minlength=len(table.pairs))
+        columns['offsets_by_pair'] = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        return SelectedLinkIndex(columns)
+
+
+class SelectedLinkIndex:
+    """Индекс в массивах (columns — содержимое .npz); запросы по именам узлов."""
+    def __init__(self, columns):
+        self.columns = columns
+        self.node_ids = columns['node_ids'].tolist()
+        self._node_pos = None
+        self._pair_pos = None
+        self._destination_pos = {s: k for k, s in enumerate(columns['destinations'].tolist())}
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls({name: data[name] for name in data.files})
+
+    def save(self, path):
+        np.savez_compressed(path, **self.columns)
+
+    @property
+    def destinations(self):
+        return [self.node_ids[k] for k in self.columns['destinations'].tolist()]
+
+    @property
+    def node_pos(self):
+        if self._node_pos is None:
+            self._node_pos = {s: k for k, s in enumerate(self.node_ids)}
+        return self._node_pos
+
+    def _node(self, node):
+        if node not in self.node_pos:
+            raise ValueError(f"Узла {node} нет в сети")
+        return self.node_pos[node]
+
+    def _pair(self, i, j):
+        if self._pair_pos is None:
+            self._pair_pos = {pair: k for k, pair in enumerate(zip(self.columns['pair_from'].tolist(),
+                                                                    self.columns['pair_to'].tolist()))}
+        pair = (self._node(i), self._node(j))
+        if pair not in self._pair_pos:
+            raise ValueError(f"Ребра {i} -> {j} нет в сети")
+        return self._pair_pos[pair]
+
+    def _slice(self, name, offsets, d):
+        bounds = self.columns[offsets]
+        return self.columns[name][bounds[d]:bounds[d + 1]]
+
+    def _pair_names(self, k):
+        return self.node_ids[self.columns['pair_from'][k]], self.node_ids[self.columns['pair_to'][k]]
+
+    def _strategy_system(self, d):
+        """Узлы стратегии назначения d, локальные номера хвостов рёбер, пары, доли и матрица I - P."""
+        pairs = self._slice('a_set_pair', 'offsets_a_set', d)
+        shares = self._slice('a_set_share', 'offsets_a_set', d).astype(np.float64)
+        ends = np.concatenate([self.columns['pair_from'][pairs], self.columns['pair_to'][pairs]])
+        nodes, local = np.unique(ends, return_inverse=True)
+        n, m = len(nodes), len(pairs)
+        matrix = identity(n, format='csc') - csc_matrix((shares, (local[:m], local[m:])), shape=(n, n))
+        return nodes, local[:m], pairs, shares, matrix
+
+    def destinations_through(self, i, j):
+        """{destination: объём на ребре i -> j} по назначениям, которые его загружают."""
+        k = self._pair(i, j)
+        lo, hi = self.columns['offsets_by_pair'][k:k + 2]
+        destinations = self.columns['destinations']
+        return {self.node_ids[destinations[d]]: v for d, v in
+                zip(self.columns['by_pair_destination'][lo:hi].tolist(), self.columns['by_pair_value'][lo:hi].tolist())}
+
+    def od_through(self, i, j):
+        """{(origin, destination): поток через ребро i -> j}."""
+        k = self._pair(i, j)
+        lo, hi = self.columns['offsets_by_pair'][k:k + 2]
+        flows = {}
+        for d in self.columns['by_pair_destination'][lo:hi].tolist():
+            nodes, tails, pairs, shares, matrix = self._strategy_system(d)
+            selected = pairs == k
+            b = np.zeros(len(nodes))
+            np.add.at(b, tails[selected], shares[selected])
+            # q[s] — ожидаемое число проходов ребра i -> j на пути из s в destination
+            q = np.atleast_1d(spsolve(matrix, b))
+            origins = self._slice('od_origin', 'offsets_od', d)
+            demand = self._slice('od_demand', 'offsets_od', d)
+            pos = np.minimum(np.searchsorted(nodes, origins), len(nodes) - 1)
+            found = nodes[pos] == origins
+            destination = self.node_ids[self.columns['destinations'][d]]
+            for o, v in zip(origins[found].tolist(), (demand[found] * q[pos[found]]).tolist()):
+                if v > 0:
+                    flows[self.node_ids[o], destination] = v
+        return flows
+
+    def zone_links(self, destinations):
+        """{(from, to): объём} от спроса в назначения destinations (например, остановки зоны)."""
+        values = np.zeros(len(self.columns['pair_from']))
+        for destination in destinations:
+            d = self._destination_pos.get(self.node_pos.get(destination))
+            if d is not None:
+                np.add.at(values, self._slice('link_index', 'offsets_links', d),
+                          self._slice('link_values', 'offsets_links', d))
+        return {self._pair_names(k): v for k, v in zip(np.flatnonzero(values).tolist(), values[values != 0].tolist())}
+
+    def od_links(self, origin, destination, demand=None):
+        """{(from, to): поток} одной OD-пары; demand по умолчанию — спрос пары из OD-матрицы расчёта."""
+        d = self._destination_pos.get(self._node(destination))
+        if d is None:
+            return {}
+        o = self._node(origin)
+        if demand is None:
+            origins = self._slice('od_origin', 'offsets_od', d)
+            demand = float(self._slice('od_demand', 'offsets_od', d)[origins == o].sum())
+        nodes, tails, pairs, shares, matrix = self._strategy_system(d)
+        pos = np.searchsorted(nodes, o)
+        if not demand or pos == len(nodes) or nodes[pos] != o:
+            return {}
+        e = np.zeros(len(nodes))
+        e[pos] = demand
+        # x[s] — сколько спроса пары проходит через узел s
+        x = np.atleast_1d(spsolve(matrix.T.tocsc(), e))
+        flows = {}
+        for k, v in zip(pairs.tolist(), (x[tails] * shares).tolist()):
+            if v > 0:
+                pair = self._pair_names(k)
+                flows[pair] = flows.get(pair, 0.0) + v
+        return flows
@@ -0,0 +1,135 @@
+from algos import florian
+from algos.pipeline import split_by_destination
+from utils import INFINITE_FREQUENCY, MATH_INF
+
+# Аналитические производные Spiess-Florian (florian) по интервалам движения и временам в пути рёбер
+# при фиксированной стратегии (малые изменения её не меняют, так что производные верны почти всюду).
+#
+# Метка узла u_i = (ALPHA + sum f_a (u_j + c_a)) / F_i по рёбрам стратегии из i, f_a = 1 / h_a,
+# F_i = sum f_a, доля ребра p_a = f_a / F_i. Тогда
+#
+#   du_i/dc_a = p_a,   du_i/dh_a = p_a * f_a * (u_i - u_j - c_a)
+#
+# а для метки источника o — то же, умноженное на вероятность пройти через узел i из o. Поэтому для
+# J = sum_o g_o u_o (суммарное ожидаемое время) dJ/dc_a = v_a и dJ/dh_a = v_a f_a (u_i - u_j - c_a):
+# хватает прямого прохода загрузки. Объёмы от времён в пути не зависят (только доли p_a), а для
+# производных функционала объёмов W = sum w_a v_a по интервалам нужен один обратный проход:
+# lambda_i = sum p_a (w_a + lambda_j) — сколько W даёт единица спроса в узле i, и
+#
+#   dW/dh_b = -f_b v_b (w_b + lambda_j - lambda_i).
+#
+# Рёбра с headway <= 0 (бесконечная частота) в производных по интервалу не участвуют.
+
+
+def _frequency(link):
+    return INFINITE_FREQUENCY if link.headway <= 0 else 1 / link.headway
+
+
+class StrategySensitivity:
+    """
+    Производные для одного назначения destination по стратегии florian strategy и спросу od_matrix.
+    Результаты — словари {Link: производная} по рёбрам стратегии; by_route сводит их по маршрутам.
+    """
+    def __init__(self, strategy, od_matrix, destination):
+        self.destination = destination
+        self.labels = strategy.labels
+        self.freqs = strategy.freqs
+        # порядок загрузки, как в florian.assign_demand
+        self.a_set = sorted(reversed(strategy.a_set), key=lambda a: -(strategy.labels[a.to_node] + a.travel_cost))
+        self.demand = {o: targets[destination] for o, targets in od_matrix.items() if targets.get(destination)}
+
+    def share(self, link):
+        freq = self.freqs[link.from_node]
+        return _frequency(link) / freq if freq else 0.0
+
+    def _load(self, demand):
+        node_volumes = dict(demand)
+        link_volumes = {}
+        for a in self.a_set:
+            v = self.share(a) * node_volumes.get(a.from_node, 0.0)
+            link_volumes[a] = v
+            node_volumes[a.to_node] = node_volumes.get(a.to_node, 0.0) + v
+        return link_volumes, node_volumes
+
+    def _time_gradient(self, demand):
+        link_volumes, _ = self._load(demand)
+        d_cost, d_headway = {}, {}
+        for a, v in link_volumes.items():
+            d_cost[a] = v
+            if a.headway > 0:
+                d_headway[a] = v / a.headway * (self.labels[a.from_node] - self.labels[a.to_node] - a.travel_cost)
+        return d_cost, d_headway
+
+    def total_time_gradient(self):
+        """(dJ/dc, dJ/dh) для J = сумма спроса, умноженного на метки источников."""
+        return self._time_gradient(self.demand)
+
+    def label_gradient(self, origin):
+        """(du_origin/dc, du_origin/dh) — производные метки одного источника."""
+        return self._time_gradient({origin: 1.0})
+
+    def volumes(self):
+        """{Link: объём} — загрузка спроса по стратегии (параллельные рёбра не сливаются)."""
+        return self._load(self.demand)[0]
+
+    def volume_gradient(self, weights):
+        """dW/dh для W = сумма weights[(from, to)] * объём ребра; один обратный проход по стратегии."""
+        link_volumes, _ = self._load(self.demand)
+        value = {self.destination: 0.0}
+        for a in reversed(self.a_set):
+            w = weights.get((a.from_node, a.to_node), 0.0)
+            value[a.from_node] = value.get(a.from_node, 0.0) + self.share(a) * (w + value[a.to_node])
+        d_headway = {}
+        for a, v in link_volumes.items():
+            if a.headway > 0:
+                w = weights.get((a.from_node, a.to_node), 0.0)
+                d_headway[a] = -v / a.headway * (w + value[a.to_node] - value[a.from_node])
+        return d_headway
+
+    def volume_derivatives(self, link):
+        """{Link: d объём / d headway link} для всех рёбер стратегии; прямой проход от узла ребра link."""
+        if link.headway <= 0 or link not in set(self.a_set):
+            return {}
+        node_volumes = self._load(self.demand)[1]
+        i = link.from_node
+        freq = _frequency(link)
+        delta_nodes = {}
+        derivatives = {}
+        for a in self.a_set:
+            if a.from_node == i:
+                # dp_a/dh = -f^2 * (delta_{a,link} F_i - f_a) / F_i^2; объём узла i от интервала не зависит
+                dp = -freq ** 2 * ((self.freqs[i] if a is link else 0.0) - _frequency(a)) / self.freqs[i] ** 2
+                dv = dp * node_volumes.get(i, 0.0)
+            else:
+                dv = self.share(a) * delta_nodes.get(a.from_node, 0.0)
+            derivatives[a] = dv
+            delta_nodes[a.to_node] = delta_nodes.get(a.to_node, 0.0) + dv
+        return derivatives
+
+
+def by_route(gradient):
+    """{route_id: сумма производных по рёбрам маршрута} — производная по общему интервалу маршрута."""
+    routes = {}
+    for link, value in gradient.items():
+        routes[link.route_id] = routes.get(link.route_id, 0.0) + value
+    return routes
+
+
+def total_time_gradient(network, od_matrix, destinations=None):
+    """
+    (J, dJ/dc, dJ/dh) по всем назначениям od_matrix (или только destinations): J — суммарное ожидаемое
+    время всех поездок, производные — словари {Link: значение} по рёбрам сети.
+    """
+    parts = {d: od for d, od in split_by_destination(od_matrix).items()
+             if d in network.all_stops and (destinations is None or d in destinations)}
+    total, d_cost, d_headway = 0.0, {}, {}
+    for destination, od in parts.items():
+        strategy = florian.find_optimal_strategy(network.all_links, network.all_stops, destination)
+        sensitivity = StrategySensitivity(strategy, od, destination)
+        total += sum(g * strategy.labels[o] for o, g in sensitivity.demand.items() if strategy.labels[o] < MATH_INF)
+        cost_part, headway_part = sensitivity.total_time_gradient()
+        for a, v in cost_part.items():
+            d_cost[a] = d_cost.get(a, 0.0) + v
+        for a, v in headway_part.items():
+            d_headway[a] = d_headway.get(a, 0.0) + v
+    return total, d_cost, d_headway
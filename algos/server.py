@@ -0,0 +1,336 @@
+import argparse
+import asyncio
+import json
+import math
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+
+from utils import normal_cdf
+
+# Локальный HTTP/JSON-сервис запросов к сети, загруженной один раз:
+#
+#   GET /strategy?destination=S[&engine=florian|time_arrived][&T=60]
+#   GET /volumes?destination=S[&engine=...][&T=60][&demand=1]
+#   GET /reliability?destination=S&T=45[&origin=O]
+#   GET /metrics, GET /health
+#
+# Расчёты идут в пуле процессов (сеть передаётся в каждый процесс один раз при старте), так что
+# цикл событий не блокируется. Одновременные запросы с одинаковыми параметрами ждут один расчёт,
+# готовые ответы хранятся в LRU-кэше. Стратегия — общий этап всех запросов: одновременные запросы
+# разных видов с одними (engine, destination, T) ждут один её расчёт, ответы строятся по ней. Спрос для /volumes — demand от каждой остановки, из которой
+# достижим destination (как в compare_volumes), если серверу не передана OD-матрица.
+
+DEFAULT_PORT = 8765
+DEFAULT_CACHE_SIZE = 256
+LATENCY_WINDOW = 10000
+ENGINES = ('florian', 'time_arrived')
+MAX_BODY = 1 << 20
+
+_network = None
+_od_matrix = None
+
+
+def _init_worker(network, od_matrix):
+    global _network, _od_matrix
+    _network = network
+    _od_matrix = od_matrix
+
+
+def _link_key(link):
+    return [link.from_node, link.to_node, link.route_id]
+
+
+def _od_for(destination, demand):
+    from algos.reachability import get_reachability_index
+
+    if _od_matrix is not None:
+        return {o: {destination: d[destination]} for o, d in _od_matrix.items() if destination in d}
+    origins = get_reachability_index(_network).stops_reaching(destination)
+    return {origin: {destination: demand} for origin in origins if origin != destination}
+
+
+def compute_strategy(engine, destination, T=60.0):
+    """Выполняется в процессе пула; стратегия engine для destination (T — дедлайн time_arrived)."""
+    from algos import florian, time_arrived_florian
+
+    if engine == 'florian':
+        return florian.find_optimal_strategy(_network.all_links, _network.all_stops, destination)
+    return time_arrived_florian.find_optimal_strategy(_network.all_links, _network.all_stops, destination, T)
+
+
+def compute(kind, destination, engine='florian', T=60.0, demand=1.0, strategy=None):
+    """
+    Выполняется в процессе пула; возвращает JSON-совместимый ответ. strategy — готовая стратегия
+    compute_strategy(engine, destination, T), без неё считается здесь.
+    """
+    from algos import florian, time_arrived_florian
+
+    if kind == 'reliability':
+        engine = 'time_arrived'
+    if strategy is None:
+        strategy = compute_strategy(engine, destination, T)
+
+    if kind == 'strategy':
+        if engine == 'florian':
+            labels = {s: u for s, u in strategy.labels.items() if u < math.inf}
+        else:
+            labels = {s: [m, v] for s, (m, v) in strategy.labels.items() if m < math.inf}
+        return {'destination': destination, 'engine': engine, 'labels': labels,
+                'a_set': [_link_key(link) for link in strategy.a_set]}
+
+    if kind == 'reliability':
+        reliability = {}
+        for stop, (mean, var) in strategy.labels.items():
+            if mean < math.inf:
+                r = normal_cdf(T - mean, scale=math.sqrt(max(var, 1e-8)))
+                reliability[stop] = {'R': r, 'mean': mean, 'std': math.sqrt(var)}
+        return {'destination': destination, 'T': T, 'reliability': reliability}
+
+    od_matrix = _od_for(destination, demand)
+    assign = florian.assign_demand if engine == 'florian' else time_arrived_florian.assign_demand
+    volumes = assign(_network.all_links, _network.all_stops, strategy, od_matrix, destination)
+    links = [[i, j, v] for i, targets in volumes.links.items() for j, v in targets.items() if v != 0.0]
+    nodes = {s: v for s, v in volumes.nodes.items() if v != 0.0}
+    return {'destination': destination, 'engine': engine, 'n_origins': len(od_matrix),
+            'links': links, 'nodes': nodes}
+
+
+class LatencyRecorder:
+    def __init__(self, window=LATENCY_WINDOW):
+        self.samples = {}
+        self.counts = {}
+        self.window = window
+
+    def add(self, endpoint, seconds):
+        self.samples.setdefault(endpoint, deque(maxlen=self.window)).append(seconds)
+        self.counts[endpoint] = self.counts.get(endpoint, 0) + 1
+
+    def summary(self):
+        result = {}
+        for endpoint, samples in self.samples.items():
+            ordered = sorted(samples)
+            pick = lambda q: ordered[min(len(ordered) - 1, int(math.ceil(q * len(ordered))) - 1)]
+            result[endpoint] = {'count': self.counts[endpoint], 'p50_ms': 1000 * pick(0.5),
+                                'p99_ms': 1000 * pick(0.99), 'max_ms': 1000 * ordered[-1]}
+        return result
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 500: 'Internal Server Error'}
+
+
+class QueryServer:
+    """
+    Сервер запросов. network — algos.network.Network; od_matrix — необязательная OD-матрица
+    {origin: {destination: demand}} для /volumes; workers — число процессов пула.
+    """
+    def __init__(self, network, od_matrix=None, workers=1, cache_size=DEFAULT_CACHE_SIZE):
+        self.network = network
+        self.known_stops = set(network.all_stops)
+        self.pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                        initargs=(network, od_matrix))
+        # процессы пула запускаются сразу: созданные fork'ом позже унаследовали бы сокеты клиентов,
+        # и закрытое сервером соединение оставалось бы открытым в процессе пула
+        self.pool.submit(int).result()
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+        self.inflight = {}
+        self.strategies_inflight = {}  # (engine, destination, T) -> future стратегии
+        self.latency = LatencyRecorder()
+        self.counters = {'computed': 0, 'cache_hits': 0, 'coalesced': 0, 'errors': 0,
+                         'strategies_computed': 0, 'strategies_shared': 0}
+        self.server = None
+
+    async def start(self, host='127.0.0.1', port=DEFAULT_PORT):
+        self.server = await asyncio.start_server(self._handle_connection, host, port)
+        return self.server.sockets[0].getsockname()[:2]
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        self.pool.shutdown(wait=True)
+
+    async def serve_forever(self, host='127.0.0.1', port=DEFAULT_PORT):
+        host, port = await self.start(host, port)
+        print(f"Сервер запросов слушает http://{host}:{port}")
+        try:
+            await self.server.serve_forever()
+        finally:
+            await self.close()
+
+    def _parse_query(self, kind, params):
+        destination = params.get('destination')
+        if not destination:
+            raise HTTPError(400, "Не задан destination")
+        if destination not in self.known_stops:
+            raise HTTPError(404, f"Остановка {destination} не найдена")
+        engine = params.get('engine', 'time_arrived' if kind == 'reliability' else 'florian')
+        if engine not in ENGINES:
+            raise HTTPError(400, f"Неизвестный engine {engine!r}")
+        try:
+            T = float(params.get('T', 60.0))
+            demand = float(params.get('demand', 1.0))
+        except ValueError:
+            raise HTTPError(400, "T и demand должны быть числами")
+        if kind == 'reliability':
+            engine = 'time_arrived'
+        if engine == 'florian':
+            T = None  # не влияет на результат и не должен дробить кэш
+        if kind != 'volumes':
+            demand = None
+        return (kind, destination, engine, T, demand)
+
+    async def _shared(self, inflight, key, make):
+        """
+        Результат await make(); одновременные вызовы с тем же key ждут один расчёт.
+        Возвращает (результат, получен ли он из чужого расчёта).
+        """
+        if key in inflight:
+            return await asyncio.shield(inflight[key]), True
+        future = asyncio.get_running_loop().create_future()
+        inflight[key] = future
+        try:
+            result = await make()
+            future.set_result(result)
+        except Exception as error:
+            future.set_exception(error)
+            future.exception()  # ошибка уже передана ожидающим, не логировать как потерянную
+            raise
+        finally:
+            del inflight[key]
+        return result, False
+
+    async def query(self, kind, params):
+        """Ответ на запрос kind с параметрами params (dict строк): из кэша, общий расчёт или новый."""
+        key = self._parse_query(kind, params)
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            self.counters['cache_hits'] += 1
+            return self.cache[key]
+        result, shared = await self._shared(self.inflight, key, lambda: self._answer(key))
+        if shared:
+            self.counters['coalesced'] += 1
+        return result
+
+    async def _answer(self, key):
+        kind, destination, engine, T, demand = key
+        T = 60.0 if T is None else T
+        loop = asyncio.get_running_loop()
+        strategy, shared = await self._shared(
+            self.strategies_inflight, (engine, destination, T),
+            lambda: loop.run_in_executor(self.pool, compute_strategy, engine, destination, T))
+        self.counters['strategies_shared' if shared else 'strategies_computed'] += 1
+        result = await loop.run_in_executor(self.pool, compute, kind, destination, engine, T,
+                                            1.0 if demand is None else demand, strategy)
+        self.counters['computed'] += 1
+        self.cache[key] = result
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return result
+
+    def metrics(self):
+        return {'latency': self.latency.summary(), 'cache_entries': len(self.cache),
+                'in_flight': len(self.inflight), **self.counters}
+
+    async def _dispatch(self, method, target):
+        url = urlsplit(target)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        path = url.path.rstrip('/') or '/'
+        if method != 'GET':
+            raise HTTPError(405, "Поддерживается только GET")
+        if path == '/health':
+            return {'status': 'ok', 'stops': len(self.known_stops), 'links': len(self.network.all_links)}
+        if path == '/metrics':
+            return self.metrics()
+        if path in ('/strategy', '/volumes', '/reliability'):
+            result = await self.query(path[1:], params)
+            if path == '/reliability' and params.get('origin'):
+                origin = params['origin']
+                value = result['reliability'].get(origin, {'R': 0.0, 'mean': None, 'std': None})
+                return {'destination': result['destination'], 'T': result['T'], 'origin': origin, **value}
+            return result
+        raise HTTPError(404, f"Неизвестный путь {path}")
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get('content-length', 0) or 0)
+                if length:
+                    await reader.readexactly(min(length, MAX_BODY))
+
+                start = time.perf_counter()
+                parts = request_line.decode('latin-1').split()
+                endpoint = urlsplit(parts[1]).path if len(parts) >= 2 else '?'
+                try:
+                    if len(parts) < 2:
+                        raise HTTPError(400, "Некорректная строка запроса")
+                    status, body = 200, await self._dispatch(parts[0].upper(), parts[1])
+                except HTTPError as error:
+                    status, body = error.status, {'error': str(error)}
+                    self.counters['errors'] += 1
+                except Exception as error:  # ошибка расчёта не должна ронять сервер
+                    status, body = 500, {'error': f"{type(error).__name__}: {error}"}
+                    self.counters['errors'] += 1
+
+                payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                writer.write((f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                              f"Content-Type: application/json; charset=utf-8\r\n"
+                              f"Content-Length: {len(payload)}\r\n"
+                              f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n").encode('latin-1')
+                             + payload)
+                await writer.drain()
+                if endpoint != '/metrics':
+                    self.latency.add(endpoint, time.perf_counter() - start)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+def main(argv=None):
+    from algos.network import load_network, read_network
+
+    parser = argparse.ArgumentParser(description='Локальный HTTP/JSON-сервер запросов к сети')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--snapshot', help='Снимок сети (algos.network.save_network)')
+    source.add_argument('--gtfs-dir', help='Каталог GTFS (сеть строится при старте)')
+    parser.add_argument('--limit', type=int, default=100000, help='Ограничение для GTFS данных')
+    parser.add_argument('--od', default=None, help='JSON с OD-матрицей {origin: {destination: demand}}')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_SIZE)
+    args = parser.parse_args(argv)
+
+    network = read_network(args.snapshot) if args.snapshot else load_network(args.gtfs_dir, args.limit)
+    od_matrix = None
+    if args.od:
+        with open(args.od, encoding='utf-8') as f:
+            od_matrix = json.load(f)
+    server = QueryServer(network, od_matrix, workers=args.workers, cache_size=args.cache_size)
+    asyncio.run(server.serve_forever(args.host, args.port))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+import math
+from collections import deque
+
+from utils import Link, Volumes
+
+# Упрощение топологии перед поиском стратегий:
+#  1. удаляются узлы, из которых нельзя доехать ни до одного destination OD-матрицы;
+#  2. цепочки транзитных остановок одного маршрута (ровно одно входящее и одно исходящее ребро,
+#     оба того же маршрута) стягиваются в составное ребро.
+# Составное ребро эквивалентно цепочке для обеих моделей: в промежуточной остановке с единственным
+# исходящим ребром стратегия всегда добавляет ожидание headway этого ребра (ALPHA / f при ALPHA = 1
+# в florian, среднее и дисперсия headway в time_arrived_florian), поэтому оно включается
+# в travel_cost и в дисперсию составного ребра, и метки оставшихся узлов совпадают.
+
+
+def od_destinations(od_matrix):
+    return {d for dests in od_matrix.values() for d in dests}
+
+
+def nodes_reaching(all_links, destinations):
+    """Все узлы, из которых достижим хотя бы один из destinations (обратный BFS от всех сразу)."""
+    rev_graph = {}
+    for link in all_links:
+        rev_graph.setdefault(link.to_node, []).append(link.from_node)
+
+    reachable = set(destinations)
+    queue = deque(destinations)
+    while queue:
+        current = queue.popleft()
+        for predecessor in rev_graph.get(current, ()):
+            if predecessor not in reachable:
+                reachable.add(predecessor)
+                queue.append(predecessor)
+    return reachable
+
+
+def _wait_of(link):
+    return link.headway if link.headway > 0 else 0.0
+
+
+def make_composite_link(chain):
+    """Составное ребро для цепочки рёбер одного маршрута."""
+    first, last = chain[0], chain[-1]
+    inner_wait = sum(_wait_of(link) for link in chain[1:])
+    travel_cost = sum(link.travel_cost for link in chain) + inner_wait
+    mean_travel_time = sum(link.mean_travel_time for link in chain) + inner_wait
+    variance = sum(link.travel_variance for link in chain) + inner_wait
+    return Link(first.from_node, last.to_node, first.route_id, travel_cost, first.headway,
+                mean_travel_time=mean_travel_time, std_travel_time=math.sqrt(variance))
+
+
+class SimplifiedNetwork:
+    """
+    Результат simplify_network.
+
+    all_links / all_stops — упрощённая сеть для find_optimal_strategy и compute_sf.
+    composites — {(from, to, route_id) составного ребра: [исходные рёбра цепочки]}.
+    contracted_nodes — стянутые транзитные остановки, pruned_nodes — удалённые тупики.
+    """
+    def __init__(self, all_links, all_stops, composites, contracted_nodes, pruned_nodes, original_links, original_stops):
+        self.all_links = all_links
+        self.all_stops = all_stops
+        self.composites = composites
+        self.contracted_nodes = contracted_nodes
+        self.pruned_nodes = pruned_nodes
+        self.original_links = original_links
+        self.original_stops = original_stops
+
+    def expand_volumes(self, volumes):
+        """Переносит Volumes упрощённой сети на рёбра и узлы исходной сети."""
+        links = {}
+        for link in self.original_links:
+            links.setdefault(link.from_node, {})[link.to_node] = 0.0
+        nodes = {stop: 0.0 for stop in self.original_stops}
+
+        for node, v in volumes.nodes.items():
+            nodes[node] = v
+
+        for link in self.all_links:
+            v = volumes.links.get(link.from_node, {}).get(link.to_node, 0.0)
+            key = (link.from_node, link.to_node, link.route_id)
+            chain = self.composites.get(key)
+            if chain is None:
+                links[link.from_node][link.to_node] = v
+                continue
+            for original in chain:
+                links[original.from_node][original.to_node] = v
+            for original in chain[1:]:
+                nodes[original.from_node] = v
+
+        return Volumes(links, nodes)
+
+
+def simplify_network(all_links, all_stops, destinations, keep_nodes=()):
+    """
+    Упрощает сеть для расчёта к destinations. keep_nodes (например, origin OD-матрицы) и
+    destinations никогда не стягиваются.
+    """
+    destinations = set(destinations)
+    reachable = nodes_reaching(all_links, destinations) & set(all_stops)
+    links = [link for link in all_links if link.from_node in reachable and link.to_node in reachable]
+    pruned_nodes = set(all_stops) - reachable
+
+    incoming = {}
+    outgoing = {}
+    for link in links:
+        incoming.setdefault(link.to_node, []).append(link)
+        outgoing.setdefault(link.from_node, []).append(link)
+
+    protected = destinations | set(keep_nodes)
+
+    def is_pass_through(node):
+        if node in protected:
+            return False
+        ins = incoming.get(node, ())
+        outs = outgoing.get(node, ())
+        return (len(ins) == 1 and len(outs) == 1
+                and ins[0].route_id == outs[0].route_id
+                and ins[0].from_node != outs[0].to_node)
+
+    pass_through = {node for node in reachable if is_pass_through(node)}
+
+    existing_pairs = {(link.from_node, link.to_node) for link in links}
+    new_links = []
+    composites = {}
+    contracted_nodes = set()
+    for link in links:
+        if link.from_node in pass_through:
+            continue  # ребро внутри цепочки, обработается от её начала
+        chain = [link]
+        while chain[-1].to_node in pass_through:
+            chain.append(outgoing[chain[-1].to_node][0])
+        if len(chain) == 1:
+            new_links.append(link)
+            continue
+
+        composite = make_composite_link(chain)
+        pair = (composite.from_node, composite.to_node)
+        if pair in existing_pairs or composite.from_node == composite.to_node:
+            # Параллельное ребро с теми же концами смешало бы объёмы в Volumes.links,
+            # а петля не нужна стратегии — такие цепочки не стягиваем
+            new_links.extend(chain)
+            continue
+        existing_pairs.add(pair)
+        composites[(composite.from_node, composite.to_node, composite.route_id)] = chain
+        contracted_nodes.update(l.from_node for l in chain[1:])
+        new_links.append(composite)
+
+    stops = reachable - contracted_nodes
+    return SimplifiedNetwork(new_links, stops, composites, contracted_nodes, pruned_nodes, list(all_links), set(all_stops))
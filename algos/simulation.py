@@ -0,0 +1,206 @@
+import math
+import time
+
+import numpy as np
+
+from algos import time_arrived_florian
+from algos.pipeline import split_by_destination
+from utils import INFINITE_FREQUENCY, normal_cdf
+
+# Имитация поездок пассажиров по стратегиям time_arrived для проверки нормального приближения R.
+# Пассажир выходит из источника, выбранного пропорционально спросу, и в каждом узле выбирает ребро
+# привлекательного множества с вероятностью частота ребра / частота узла — как при загрузке движком.
+# Ожидание и время в пути выбранного ребра случайны:
+#
+#   ожидание   'model'        — гамма-распределение со средним и дисперсией h (как в модели движка);
+#              'exponential'  — экспоненциальное со средним h (случайные интервалы);
+#              'uniform'      — равномерное на [0, 2h] (регулярные интервалы при том же среднем);
+#   в пути     нормальное N(travel_cost, travel_variance), как в модели движка.
+#
+# При 'model' среднее и дисперсия времени из узла совпадают с метками движка точно, так что
+# расхождение эмпирической вероятности прибытия к T с R показывает ошибку только самого нормального
+# приближения. Пассажиры обрабатываются пачками: на каждом шаге все ещё едущие пассажиры пачки
+# делают по одному ребру, выбор ребра — один searchsorted по накопленным долям.
+
+WAIT_MODELS = ('model', 'exponential', 'uniform')
+DEFAULT_BATCH_SIZE = 250000
+
+
+def wilson_interval(successes, n, z=1.96):
+    """(нижняя, верхняя) границы доверительного интервала Уилсона для доли successes / n (массивы)."""
+    successes = np.asarray(successes, dtype=float)
+    n = np.asarray(n, dtype=float)
+    safe = np.maximum(n, 1.0)
+    p = successes / safe
+    denominator = 1 + z ** 2 / safe
+    center = (p + z ** 2 / (2 * safe)) / denominator
+    spread = z * np.sqrt(p * (1 - p) / safe + z ** 2 / (4 * safe ** 2)) / denominator
+    empty = n == 0
+    low = np.where(empty, 0.0, np.maximum(center - spread, 0.0))
+    return low, np.where(empty, 1.0, np.minimum(center + spread, 1.0))
+
+
+class PassengerSimulator:
+    """Поездки к destination по стратегии time_arrived strategy; рёбра — записи strategy.a_set."""
+    def __init__(self, strategy, destination, T=60.0, wait='model'):
+        if wait not in WAIT_MODELS:
+            raise ValueError(f"Неизвестная модель ожидания {wait!r}: ожидается одна из {', '.join(WAIT_MODELS)}")
+        self.strategy = strategy
+        self.destination = destination
+        self.T = T
+        self.wait = wait
+        self.links = list(strategy.a_set)
+        nodes = sorted({destination} | {s for a in self.links for s in (a.from_node, a.to_node)})
+        self.nodes = nodes
+        self.node_pos = {s: k for k, s in enumerate(nodes)}
+
+        # рёбра по узлам; cumulative[e] = номер узла + накопленная доля, последняя доля узла равна 1
+        order = sorted(range(len(self.links)), key=lambda e: self.node_pos[self.links[e].from_node])
+        links = [self.links[e] for e in order]
+        self.order = np.array(order, dtype=np.int64)
+        freq = np.array([INFINITE_FREQUENCY if a.headway <= 0 else 1 / a.headway for a in links])
+        tail = np.array([self.node_pos[a.from_node] for a in links], dtype=np.int64)
+        self.head = np.array([self.node_pos[a.to_node] for a in links], dtype=np.int64)
+        totals = np.bincount(tail, weights=freq, minlength=len(nodes))
+        shares = freq / totals[tail] if len(links) else freq
+        starts = np.r_[0, np.cumsum(np.bincount(tail, minlength=len(nodes)))]
+        within = np.cumsum(shares) - np.repeat(np.r_[0.0, np.cumsum(shares)][starts[:-1]], np.diff(starts))
+        within[starts[1:][starts[1:] > starts[:-1]] - 1] = 1.0
+        self.cumulative = tail + within
+        self.has_links = np.diff(starts) > 0
+        self.shares = shares
+        self.mean_wait = np.where(freq < INFINITE_FREQUENCY, 1 / freq, 0.0)
+        self.cost = np.array([a.travel_cost for a in links], dtype=float)
+        self.std = np.sqrt([a.travel_variance for a in links])
+        self.max_steps = len(links) + 1
+
+    def _waits(self, rng, e):
+        h = self.mean_wait[e]
+        if self.wait == 'model':
+            return rng.gamma(h)
+        if self.wait == 'exponential':
+            return rng.exponential(h)
+        return 2 * h * rng.random(len(e))
+
+    def run(self, origins, rng):
+        """
+        (время в пути, число проходов по рёбрам a_set) для пассажиров из узлов origins (массив номеров
+        self.node_pos). Недоехавшие до destination получают время inf.
+        """
+        n = len(origins)
+        node = np.asarray(origins, dtype=np.int64).copy()
+        elapsed = np.zeros(n)
+        counts = np.zeros(len(self.links), dtype=np.int64)
+        target = self.node_pos[self.destination]
+        active = np.flatnonzero(node != target)
+        for _ in range(self.max_steps):
+            active = active[self.has_links[node[active]]]
+            if not len(active):
+                break
+            e = np.searchsorted(self.cumulative, node[active] + rng.random(len(active)), side='right')
+            elapsed[active] += self._waits(rng, e) + rng.normal(self.cost[e], self.std[e])
+            counts += np.bincount(e, minlength=len(self.links))
+            node[active] = self.head[e]
+            active = active[node[active] != target]
+        elapsed[node != target] = math.inf
+        result = np.zeros(len(self.links), dtype=np.int64)
+        result[self.order] = counts
+        return elapsed, result
+
+    def analytic_loads(self, demand):
+        """Объёмы записей a_set при спросе demand {origin: спрос} — как в загрузке движка, без слияния пар."""
+        labels = self.strategy.labels
+        node_volumes = dict(demand)
+        loads = np.zeros(len(self.links))
+        share = dict(zip(self.order.tolist(), self.shares.tolist()))
+        for e in sorted(range(len(self.links)), key=lambda e: -(labels[self.links[e].to_node][0]
+                                                                + self.links[e].travel_cost)):
+            a = self.links[e]
+            loads[e] = share[e] * node_volumes.get(a.from_node, 0.0)
+            node_volumes[a.to_node] = node_volumes.get(a.to_node, 0.0) + loads[e]
+        return loads
+
+
+class SimulationResult:
+    """
+    od: {(origin, destination): словарь} — passengers, on_time, R (эмпирическая доля прибывших к T),
+    R_low, R_high (интервал Уилсона), R_analytic (нормальное приближение движка), mean_time (среди
+    доехавших), analytic_mean. links: {Link: словарь} — volume (оценка объёма), low, high, analytic.
+    """
+    def __init__(self, od, links, n_passengers, seconds):
+        self.od = od
+        self.links = links
+        self.n_passengers = n_passengers
+        self.seconds = seconds
+
+    def outside_interval(self):
+        """OD-пары, у которых R движка вне доверительного интервала эмпирической доли."""
+        return [pair for pair, row in self.od.items() if not row['R_low'] <= row['R_analytic'] <= row['R_high']]
+
+
+def simulate(network, od_matrix, n_passengers=10 ** 6, T=60.0, wait='model', seed=None, z=1.96,
+             batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Имитация n_passengers поездок: пары (origin, destination) выбираются независимо пропорционально спросу,
+    так что каждый пассажир представляет общий спрос / n_passengers. Стратегии — time_arrived_florian
+    с дедлайном T. Пассажир проходит ребро не больше раза, поэтому число проходов ребра биномиально и
+    интервал объёма — интервал Уилсона для доли пассажиров, умноженный на общий спрос.
+    """
+    start = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    parts = {d: od for d, od in split_by_destination(od_matrix).items() if d in network.all_stops}
+    pairs = [(o, d, targets[d]) for d, od in parts.items() for o, targets in od.items()]
+    demand = np.array([g for _, _, g in pairs])
+    if not pairs:
+        return SimulationResult({}, {}, 0, time.perf_counter() - start)
+    total_demand = float(demand.sum())
+    counts = rng.multinomial(n_passengers, demand / total_demand)
+
+    od, link_counts, analytic = {}, {}, {}
+    k = 0
+    for destination, part in parts.items():
+        strategy = time_arrived_florian.find_optimal_strategy(network.all_links, network.all_stops, destination, T)
+        simulator = PassengerSimulator(strategy, destination, T, wait)
+        part_pairs = pairs[k:k + len(part)]
+        part_counts = counts[k:k + len(part)]
+        k += len(part)
+
+        origins = np.array([simulator.node_pos.get(o, -1) for o, _, _ in part_pairs], dtype=np.int64)
+        index = np.repeat(np.arange(len(part_pairs)), part_counts)
+        on_time = np.zeros(len(part_pairs))
+        arrived = np.zeros(len(part_pairs))
+        total_time = np.zeros(len(part_pairs))
+        passed = np.zeros(len(simulator.links), dtype=np.int64)
+        for lo in range(0, len(index), batch_size):
+            batch = index[lo:lo + batch_size]
+            batch = batch[origins[batch] >= 0]  # источник вне стратегии: пассажир не доедет
+            elapsed, batch_passed = simulator.run(origins[batch], rng)
+            passed += batch_passed
+            finite = np.isfinite(elapsed)
+            on_time += np.bincount(batch, weights=elapsed <= T, minlength=len(part_pairs))
+            arrived += np.bincount(batch[finite], minlength=len(part_pairs))
+            total_time += np.bincount(batch[finite], weights=elapsed[finite], minlength=len(part_pairs))
+
+        low, high = wilson_interval(on_time, part_counts, z)
+        for p, (origin, _, _) in enumerate(part_pairs):
+            mean, var = strategy.labels.get(origin, (math.inf, 0.0))
+            r = 0.0 if mean == math.inf else normal_cdf(T - mean, scale=math.sqrt(max(var, 1e-8)))
+            od[origin, destination] = {
+                'passengers': int(part_counts[p]), 'on_time': int(on_time[p]),
+                'R': float(on_time[p] / part_counts[p]) if part_counts[p] else math.nan,
+                'R_low': float(low[p]), 'R_high': float(high[p]), 'R_analytic': r,
+                'mean_time': float(total_time[p] / arrived[p]) if arrived[p] else math.inf, 'analytic_mean': mean}
+
+        # аналитические объёмы — при том же спросе, что у пассажиров (доли по multinomial не подставляются)
+        loads = simulator.analytic_loads({o: g for o, _, g in part_pairs})
+        for a, c, v in zip(simulator.links, passed.tolist(), loads.tolist()):
+            link_counts[a] = link_counts.get(a, 0) + c
+            analytic[a] = analytic.get(a, 0.0) + v
+
+    links_list = list(link_counts)
+    n = int(counts.sum())
+    low, high = wilson_interval([link_counts[a] for a in links_list], np.full(len(links_list), n), z)
+    links = {a: {'volume': total_demand * link_counts[a] / n, 'low': total_demand * float(lo),
+                 'high': total_demand * float(hi), 'analytic': analytic[a]}
+             for a, lo, hi in zip(links_list, low, high)}
+    return SimulationResult(od, links, n, time.perf_counter() - start)
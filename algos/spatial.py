@@ -0,0 +1,91 @@
+import math
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from utils import Link, WALK_SPEED_M_PER_MIN, project_coords
+
+# Пространственный индекс остановок: пешеходные пересадки в радиусе и привязка
+# произвольных координат к ближайшим остановкам. Строится один раз на сеть (см. get_stop_index).
+
+WALK_ROUTE_ID = "WALK"
+DEFAULT_WALK_RADIUS_M = 300.0
+DETOUR_FACTOR = 1.3  # отношение пешеходного пути к расстоянию по прямой
+
+
+class StopIndex:
+    def __init__(self, stop_coords):
+        self.stop_ids = sorted(stop_coords)
+        lats = np.array([stop_coords[s][0] for s in self.stop_ids], dtype=np.float64)
+        lons = np.array([stop_coords[s][1] for s in self.stop_ids], dtype=np.float64)
+        self.ref_lat = float(lats.mean()) if len(lats) else 0.0
+        x, y = project_coords(lats, lons, self.ref_lat)
+        self.xy = np.column_stack((x, y)) if len(lats) else np.empty((0, 2))
+        self.tree = cKDTree(self.xy)
+
+    def __len__(self):
+        return len(self.stop_ids)
+
+    def _project(self, lats, lons):
+        x, y = project_coords(np.atleast_1d(lats), np.atleast_1d(lons), self.ref_lat)
+        return np.column_stack((x, y))
+
+    def walking_pairs(self, radius_m=DEFAULT_WALK_RADIUS_M):
+        """Все пары остановок (i < j) не дальше radius_m по прямой и расстояния между ними (м)."""
+        pairs = self.tree.query_pairs(radius_m, output_type='ndarray')
+        if len(pairs) == 0:
+            return np.empty((0, 2), dtype=np.int64), np.empty(0)
+        dists = np.hypot(*(self.xy[pairs[:, 0]] - self.xy[pairs[:, 1]]).T)
+        return pairs, dists
+
+    def walking_links(self, radius_m=DEFAULT_WALK_RADIUS_M, walk_speed=WALK_SPEED_M_PER_MIN,
+                      detour_factor=DETOUR_FACTOR):
+        """
+        Пешеходные рёбра в обе стороны между остановками в радиусе radius_m.
+        travel_cost — время пешком в минутах, headway = 0 (ожидания нет).
+        """
+        pairs, dists = self.walking_pairs(radius_m)
+        times = dists * detour_factor / walk_speed
+        links = []
+        for (i, j), t in zip(pairs.tolist(), times.tolist()):
+            a, b = self.stop_ids[i], self.stop_ids[j]
+            links.append(Link(a, b, WALK_ROUTE_ID, t, 0.0))
+            links.append(Link(b, a, WALK_ROUTE_ID, t, 0.0))
+        return links
+
+    def snap(self, lats, lons, k=1, max_distance_m=math.inf):
+        """
+        Ближайшие k остановок к каждой точке.
+        Возвращает (stop_ids, distances): при k=1 — список id и массив расстояний (м),
+        при k>1 — списки списков и матрицу. Точки дальше max_distance_m получают None / inf.
+        """
+        dists, idx = self.tree.query(self._project(lats, lons), k=k, distance_upper_bound=max_distance_m)
+        idx = np.asarray(idx)
+        found = idx < len(self.stop_ids)
+
+        def to_id(i, ok):
+            return self.stop_ids[i] if ok else None
+
+        if k == 1:
+            return [to_id(i, ok) for i, ok in zip(idx.tolist(), found.tolist())], dists
+        return [[to_id(i, ok) for i, ok in zip(row_i, row_ok)] for row_i, row_ok in zip(idx.tolist(), found.tolist())], dists
+
+    def stops_within(self, lat, lon, radius_m):
+        """Остановки в радиусе radius_m от точки, от ближней к дальней."""
+        point = self._project(lat, lon)[0]
+        idx = np.asarray(self.tree.query_ball_point(point, radius_m), dtype=np.int64)
+        if len(idx) == 0:
+            return []
+        order = np.argsort(np.hypot(*(self.xy[idx] - point).T))
+        return [self.stop_ids[i] for i in idx[order]]
+
+
+def get_stop_index(network):
+    """Пространственный индекс сети (строится один раз и хранится в network.indexes)."""
+    return network.get_index('stop_index', lambda n: StopIndex(n.stop_coords))
+
+
+def get_walking_links(network, radius_m=DEFAULT_WALK_RADIUS_M, walk_speed=WALK_SPEED_M_PER_MIN):
+    """Пешеходные рёбра сети для заданного радиуса и скорости (кэшируются вместе с сетью)."""
+    return network.get_index(('walking_links', radius_m, walk_speed),
+                             lambda n: get_stop_index(n).walking_links(radius_m, walk_speed))
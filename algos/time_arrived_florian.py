@@ -1,15 +1,16 @@
 from utils import *
 import math
-from scipy import stats
+import time
 
-def find_optimal_strategy(all_links, all_stops, destination, T=60.0):
+def find_optimal_strategy(all_links, all_stops, destination, T=60.0, stats=None):
     """
     Модифицированная версия Spiess-Florian: максимизация вероятности прибытия вовремя (reliability).
     
     mean_var[i] = (mean_time, variance_time) — параметры нормального распределения
                   оставшегося времени от узла i до destination.
-    R_i = P(оставшееся время ≤ T) = norm.cdf(T - mean, scale=sqrt(variance))
+    R_i = P(оставшееся время ≤ T) = normal_cdf(T - mean, scale=sqrt(variance))
     """
+    start = time.perf_counter()
     if VERBOSE:
         print("Initialization for arrive time model")
 
@@ -39,16 +40,20 @@ def find_optimal_strategy(all_links, all_stops, destination, T=60.0):
             var_wait = 1 / freq if freq < INFINITE_FREQUENCY else 0.0
 
             tent_mean = mean_wait + link.travel_cost  + mean_var[destination][0]
-            tent_var = var_wait + mean_var[destination][1]
+            tent_var = var_wait + link.travel_variance + mean_var[destination][1]
 
-            tent_r = stats.norm.cdf(T - tent_mean, scale=math.sqrt(max(tent_var, 1e-8)))
+            tent_r = normal_cdf(T - tent_mean, scale=math.sqrt(max(tent_var, 1e-8)))
 
             pq.push(link, -tent_r, tent_mean)
 
+    search_start = time.perf_counter()
+    n_pops = 0
+    n_cdf = 0  # normal_cdf вне push (каждый push сопровождается одним вызовом)
     while True:
         entry = pq.pop()
         if entry[0] is None:
             break
+        n_pops += 1
         link, priority, orig_priority = entry
         current_priority_r = -priority
         mean_travel_time_priority = orig_priority
@@ -60,7 +65,8 @@ def find_optimal_strategy(all_links, all_stops, destination, T=60.0):
         if curr_mean == math.inf:
             current_r = 0.0
         else:
-            current_r = stats.norm.cdf(T - curr_mean, scale=math.sqrt(max(curr_var, 1e-8)))
+            current_r = normal_cdf(T - curr_mean, scale=math.sqrt(max(curr_var, 1e-8)))
+            n_cdf += 1
 
         # sum_uc = mean_travel_time_priority
 
@@ -79,7 +85,7 @@ def find_optimal_strategy(all_links, all_stops, destination, T=60.0):
         var_wait = 1 / freq if freq < INFINITE_FREQUENCY else 0.0
 
         new_mean_via_link = mean_wait + link.travel_cost + mean_var[j][0]
-        new_var_via_link = var_wait + mean_var[j][1]
+        new_var_via_link = var_wait + link.travel_variance + mean_var[j][1]
 
         if VERBOSE:
             print(f"  f_a = {freq}")
@@ -88,10 +94,11 @@ def find_optimal_strategy(all_links, all_stops, destination, T=60.0):
             print(f"  new_mean_via_link = {new_mean_via_link}")
             print(f"  new_var_via_link = {new_var_via_link}")
 
+        n_cdf += 1
         if freqs[i] == 0.0:
             updated_mean = new_mean_via_link
             updated_var = new_var_via_link
-            updated_r = stats.norm.cdf(T - updated_mean, scale=math.sqrt(max(updated_var, 1e-8)))
+            updated_r = normal_cdf(T - updated_mean, scale=math.sqrt(max(updated_var, 1e-8)))
         else:
             total_freq = freqs[i] + freq
             
@@ -104,7 +111,7 @@ def find_optimal_strategy(all_links, all_stops, destination, T=60.0):
             updated_var = updated_m2 - updated_mean**2
             updated_var = max(updated_var, 0.0)
 
-            updated_r = stats.norm.cdf(T - updated_mean, scale=math.sqrt(max(updated_var, 1e-8)))
+            updated_r = normal_cdf(T - updated_mean, scale=math.sqrt(max(updated_var, 1e-8)))
 
         if updated_r > current_r + 1e-6 or (abs(updated_r - current_r) <= EPSILON and updated_mean < curr_mean):
             mean_var[i] = (updated_mean, updated_var)
@@ -122,26 +129,41 @@ def find_optimal_strategy(all_links, all_stops, destination, T=60.0):
                     prev_tent_mean = prev_mean_wait + prev_link.travel_cost  + updated_mean
                     
                     prev_var_wait = prev_mean_wait  # (1.0 / prev_freq)**2 / 12.0
-                    prev_tent_var = prev_var_wait  + updated_var
+                    prev_tent_var = prev_var_wait + prev_link.travel_variance + updated_var
 
                     prev_tent_var = max(prev_tent_var, 1e-8)
-                    prev_tent_r = stats.norm.cdf(T - prev_tent_mean, scale=math.sqrt(prev_tent_var))
+                    prev_tent_r = normal_cdf(T - prev_tent_mean, scale=math.sqrt(prev_tent_var))
 
                     pq.update(prev_link, -prev_tent_r, prev_tent_mean)
 
+    if stats is not None:
+        stats.runs += 1
+        stats.add_queue(pq, n_pops)
+        stats.relaxations_accepted += len(attractive_set)
+        stats.relaxations_rejected += n_pops - len(attractive_set)
+        stats.nodes_settled += sum(1 for mean, _ in mean_var.values() if mean < math.inf)
+        stats.cdf_evaluations += pq.counter + n_cdf
+        stats.add_time('strategy.init', search_start - start)
+        stats.add_time('strategy.search', time.perf_counter() - search_start)
+
     return Strategy(mean_var, freqs, attractive_set)
 
-def assign_demand(all_links, all_stops, optimal_strategy, od_matrix, destination):
+def assign_demand(all_links, all_stops, optimal_strategy, od_matrix, destination, stats=None):
+    start = time.perf_counter()
     # Sort a_set by descending expected time (proxy)
-    optimal_strategy.a_set = sorted(optimal_strategy.a_set, key=lambda a: -(optimal_strategy.labels[a.to_node][0] + a.travel_cost))
+    # При равных ключах раньше идут рёбра, попавшие в стратегию позже (они ближе к origin)
+    optimal_strategy.a_set = sorted(reversed(optimal_strategy.a_set), key=lambda a: -(optimal_strategy.labels[a.to_node][0] + a.travel_cost))
+    if stats is not None:
+        stats.add_time('assign.sort', time.perf_counter() - start)
 
-    return calculate_flow_volumes(all_links, all_stops, optimal_strategy, od_matrix, destination)
+    return calculate_flow_volumes(all_links, all_stops, optimal_strategy, od_matrix, destination, stats)
 
 
-def compute_sf(all_links, all_stops, destination, od_matrix, T=60):
-    ops = find_optimal_strategy(all_links, all_stops, destination, T)
-    volumes = assign_demand(all_links, all_stops, ops, od_matrix, destination)
-    return SFResult(ops, volumes)
+def compute_sf(all_links, all_stops, destination, od_matrix, T=60, collect_stats=False):
+    stats = EngineStats() if collect_stats else None
+    ops = find_optimal_strategy(all_links, all_stops, destination, T, stats)
+    volumes = assign_demand(all_links, all_stops, ops, od_matrix, destination, stats)
+    return SFResult(ops, volumes, stats)
 
 def parse_gtfs(directory, limit=10000):
     stop_times, active_trips, all_stops = parse_gtfs_limited(directory, limit)
@@ -0,0 +1,182 @@
+import csv
+import math
+
+import numpy as np
+
+from utils import Link, Volumes, WALK_SPEED_M_PER_MIN, project_coords
+
+# Слой транспортных районов (TAZ): остановки агрегируются в зоны, у каждой зоны есть центроид,
+# связанный с её остановками коннекторами. Стратегии и загрузка считаются к центроиду зоны,
+# а объёмы по-прежнему выдаются на рёбрах между остановками.
+
+ZONE_PREFIX = "zone:"
+ACCESS_ROUTE_ID = "ACCESS"
+EGRESS_ROUTE_ID = "EGRESS"
+DEFAULT_CELL_SIZES_M = (250, 500, 1000, 2000, 4000)
+
+
+def zone_node(zone_id):
+    return f"{ZONE_PREFIX}{zone_id}"
+
+
+def is_zone_node(node):
+    return isinstance(node, str) and node.startswith(ZONE_PREFIX)
+
+
+def load_zone_mapping(path):
+    """Читает CSV с колонками stop_id, zone_id и возвращает {stop_id: zone_id}."""
+    stop_to_zone = {}
+    with open(path, 'r', encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            stop_to_zone[row['stop_id']] = row['zone_id']
+    return stop_to_zone
+
+
+def grid_zone_mapping(stop_coords, cell_size_m):
+    """
+    Разбивает остановки на квадратные зоны со стороной cell_size_m метров.
+    Чем крупнее ячейка, тем меньше зон (быстрее расчёт) и длиннее коннекторы (больше ошибка).
+    """
+    stops = list(stop_coords)
+    if not stops:
+        return {}
+    lats = np.array([stop_coords[s][0] for s in stops])
+    lons = np.array([stop_coords[s][1] for s in stops])
+    x, y = project_coords(lats, lons)
+    cols = np.floor((x - x.min()) / cell_size_m).astype(np.int64)
+    rows = np.floor((y - y.min()) / cell_size_m).astype(np.int64)
+    return {stop: f"r{r}_c{c}" for stop, r, c in zip(stops, rows, cols)}
+
+
+class ZoneSystem:
+    """
+    Зоны поверх сети остановок.
+
+    stop_to_zone — {stop_id: zone_id}; stop_coords (необязательно) — {stop_id: (lat, lon)}.
+    Если координаты заданы, стоимость коннектора — время пешком от центроида зоны до остановки,
+    иначе коннекторы бесплатные. Коннекторы имеют headway = 0 (без ожидания).
+    """
+    def __init__(self, stop_to_zone, stop_coords=None, walk_speed=WALK_SPEED_M_PER_MIN):
+        self.stop_to_zone = dict(stop_to_zone)
+        self.zone_stops = {}
+        for stop, zone in self.stop_to_zone.items():
+            self.zone_stops.setdefault(zone, []).append(stop)
+
+        self.connector_length = {}
+        self.centroids = {}
+        if stop_coords:
+            for zone, stops in self.zone_stops.items():
+                located = [s for s in stops if s in stop_coords]
+                if not located:
+                    continue
+                lats = np.array([stop_coords[s][0] for s in located])
+                lons = np.array([stop_coords[s][1] for s in located])
+                self.centroids[zone] = (float(lats.mean()), float(lons.mean()))
+                x, y = project_coords(lats, lons, ref_lat=self.centroids[zone][0])
+                cx, cy = project_coords(self.centroids[zone][0], self.centroids[zone][1], ref_lat=self.centroids[zone][0])
+                for stop, dist in zip(located, np.hypot(x - cx, y - cy)):
+                    self.connector_length[stop] = float(dist)
+
+        self.access_links = []
+        self.egress_links = {}
+        for stop, zone in self.stop_to_zone.items():
+            cost = self.connector_length.get(stop, 0.0) / walk_speed
+            centroid = zone_node(zone)
+            self.access_links.append(Link(centroid, stop, ACCESS_ROUTE_ID, cost, 0.0))
+            self.egress_links.setdefault(zone, []).append(Link(stop, centroid, EGRESS_ROUTE_ID, cost, 0.0))
+
+    @property
+    def zones(self):
+        return list(self.zone_stops)
+
+    def aggregate_od(self, od_matrix):
+        """
+        Переводит OD-матрицу остановок в OD-матрицу центроидов зон.
+        Внутризонный спрос отбрасывается (он не попадает на рёбра между зонами).
+        """
+        zone_od = {}
+        for origin, dests in od_matrix.items():
+            o_zone = self.stop_to_zone.get(origin)
+            if o_zone is None:
+                continue
+            for destination, demand in dests.items():
+                d_zone = self.stop_to_zone.get(destination)
+                if d_zone is None or d_zone == o_zone:
+                    continue
+                row = zone_od.setdefault(zone_node(o_zone), {})
+                row[zone_node(d_zone)] = row.get(zone_node(d_zone), 0.0) + demand
+        return zone_od
+
+    def network_for(self, all_links, all_stops, zone):
+        """
+        Сеть для расчёта к зоне zone: все остановки и рёбра, коннекторы доступа от всех центроидов
+        и коннекторы выхода только в центроид zone — иначе центроиды стали бы "телепортами" внутри зон.
+        """
+        links = list(all_links) + self.access_links + self.egress_links.get(zone, [])
+        nodes = set(all_stops) | {zone_node(z) for z in self.zone_stops}
+        return links, nodes
+
+    def summary(self):
+        """Размер задачи и пространственная ошибка агрегации для выбора разрешения зон."""
+        lengths = list(self.connector_length.values())
+        return {
+            'n_zones': len(self.zone_stops),
+            'n_stops': len(self.stop_to_zone),
+            'mean_stops_per_zone': len(self.stop_to_zone) / max(len(self.zone_stops), 1),
+            'mean_connector_m': float(np.mean(lengths)) if lengths else 0.0,
+            'max_connector_m': float(np.max(lengths)) if lengths else 0.0,
+        }
+
+
+def grid_resolution_tradeoff(stop_coords, cell_sizes=DEFAULT_CELL_SIZES_M):
+    """Сводка ZoneSystem.summary() для каждого размера ячейки — для выбора компромисса точность/время."""
+    table = []
+    for cell_size in cell_sizes:
+        zones = ZoneSystem(grid_zone_mapping(stop_coords, cell_size), stop_coords)
+        table.append(dict(cell_size_m=cell_size, **zones.summary()))
+    return table
+
+
+def suggest_cell_size(stop_coords, max_zones, cell_sizes=DEFAULT_CELL_SIZES_M):
+    """
+    Самая мелкая (точная) сетка, в которой не больше max_zones зон.
+    Число зон определяет число прогонов compute_sf, т.е. время расчёта всех назначений.
+    """
+    for cell_size in sorted(cell_sizes):
+        if len(set(grid_zone_mapping(stop_coords, cell_size).values())) <= max_zones:
+            return cell_size
+    return max(cell_sizes)
+
+
+def compute_sf_zones(compute_sf, all_links, all_stops, zones, od_matrix, **kwargs):
+    """
+    Запускает compute_sf (florian или time_arrived_florian) для каждой зоны назначения
+    и суммирует объёмы. Возвращает Volumes только по рёбрам и узлам исходной сети остановок;
+    kwargs передаются в compute_sf (например, T).
+    """
+    zone_od = zones.aggregate_od(od_matrix)
+    destinations = sorted({d for dests in zone_od.values() for d in dests})
+
+    link_volumes = {}
+    for link in all_links:
+        link_volumes.setdefault(link.from_node, {})[link.to_node] = 0.0
+    node_volumes = {stop: 0.0 for stop in all_stops}
+
+    for destination in destinations:
+        zone = destination[len(ZONE_PREFIX):]
+        links, nodes = zones.network_for(all_links, all_stops, zone)
+        od_for_dest = {o: {destination: dests[destination]} for o, dests in zone_od.items() if destination in dests}
+        result = compute_sf(links, nodes, destination, od_for_dest, **kwargs)
+
+        for from_node, to_dict in result.volumes.links.items():
+            if is_zone_node(from_node):
+                continue
+            for to_node, v in to_dict.items():
+                if v != 0 and not is_zone_node(to_node):
+                    link_volumes[from_node][to_node] += v
+        for node, v in result.volumes.nodes.items():
+            if v != 0 and not is_zone_node(node) and not math.isnan(v):
+                node_volumes[node] += v
+
+    return Volumes(link_volumes, node_volumes)
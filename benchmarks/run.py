@@ -0,0 +1,305 @@
+import argparse
+import contextlib
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+# Бенчмарк этапов расчёта на сетях разного размера.
+# Для каждого этапа пишется время (минимум по --repeat запускам), пиковый RSS процесса во время
+# этапа и пик выделений Python (tracemalloc, отдельным прогоном — он замедляет код в разы).
+# Каждый размер считается в отдельном процессе, чтобы память предыдущего не искажала RSS.
+# Сети генерируются synthetic_gtfs и читаются настоящим parse_gtfs_limited.
+#
+#   python -m benchmarks.run --sizes 1000 10000 --output bench.json
+#   python -m benchmarks.run --sizes 1000 10000 --compare bench.json
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000, 1_000_000)
+TIME_THRESHOLD = 0.25  # относительный рост времени, считающийся регрессией
+RSS_THRESHOLD = 0.25
+MIN_SECONDS = 0.05  # более короткие этапы слишком шумные для сравнения по времени
+MIN_RSS_MB = 5.0
+MIN_IMPORT_SECONDS = 0.01
+# Модули расчётного ядра: их импорт не должен тянуть графику (важно для воркеров пулов и CLI)
+IMPORT_MODULES = ('utils', 'algos.florian', 'algos.time_arrived_florian', 'algos.network')
+HEAVY_MODULES = ('matplotlib', 'networkx', 'tqdm', 'scipy.stats', 'pandas')
+T_DEADLINE = 60.0
+DEMAND = 100.0
+
+
+def _read_status_kb(field):
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _reset_peak_rss():
+    """Сбрасывает VmHWM (Linux >= 4.0); False — если сбросить нельзя и пик считается с начала процесса."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_kb():
+    peak = _read_status_kb('VmHWM')
+    if peak is None:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak
+
+
+def measure(stage, fn, repeat=1, allocations=True):
+    """Выполняет fn() repeat раз (+1 раз под tracemalloc) и возвращает (результат, запись замера)."""
+    times = []
+    rss_before = _read_status_kb('VmRSS')
+    peak_reset = _reset_peak_rss()
+    result = None
+    for _ in range(repeat):
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            start = time.perf_counter()
+            result = fn()
+            times.append(time.perf_counter() - start)
+    record = {
+        'stage': stage,
+        'wall_s': min(times),
+        'wall_all_s': times,
+        'rss_before_mb': None if rss_before is None else rss_before / 1024.0,
+        'peak_rss_mb': _peak_rss_kb() / 1024.0,
+        'peak_rss_delta_mb': None if rss_before is None else (_peak_rss_kb() - rss_before) / 1024.0,
+        'peak_rss_since_start': not peak_reset,
+    }
+    if allocations:
+        tracemalloc.start()
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            fn()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        record['alloc_peak_mb'] = peak / 2 ** 20
+        record['alloc_retained_mb'] = current / 2 ** 20
+    return result, record
+
+
+def measure_import(module, repeat=5):
+    """
+    Время импорта module в чистом интерпретаторе (минимум по repeat запускам, по -X importtime)
+    и тяжёлые модули, которые он подтягивает.
+    """
+    code = (f"import sys, {module}; "
+            f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))")
+    times = []
+    heavy = []
+    for _ in range(repeat):
+        proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True,
+                              check=True, env=dict(os.environ, PYTHONPATH=os.getcwd()))
+        for line in proc.stderr.splitlines():
+            parts = line.split('|')
+            if len(parts) == 3 and parts[2].strip() == module:
+                times.append(int(parts[1]) / 1e6)
+        heavy = [m for m in proc.stdout.strip().split(',') if m]
+    if not times:
+        raise RuntimeError(f"В выводе -X importtime нет строки для модуля {module}: "
+                           f"он импортирован при старте интерпретатора или формат вывода другой")
+    return {'stage': f"import:{module}", 'size': 0, 'wall_s': min(times), 'wall_all_s': times,
+            'heavy_modules': heavy}
+
+
+def feed_params(n_links):
+    """
+    Параметры synthetic_gtfs для ленты с ~n_links рёбрами (строк stop_times минус рейсов).
+    Берётся утренний час пик (2 часа): у маршрута ~8 рейсов в каждую сторону, а объём набирается
+    числом маршрутов — calculate_links даёт ребро на каждый рейс, и многорейсовые маршруты
+    раздувают очередь find_optimal_strategy сильнее, чем ограниченная по limit реальная лента.
+    """
+    n_stops = min(max(n_links // 100, 30), 10000)
+    route_len = max(3.0, 0.75 * math.sqrt(n_stops / math.pi))
+    n_routes = max(4, int(n_links / (2 * 8 * route_len)))
+    return dict(n_stops=n_stops, n_routes=n_routes, headway_range=(10, 20), service_hours=(7.0, 9.0),
+                target_stop_times=int(n_links * 1.05))
+
+
+def pick_destination(all_links):
+    """Остановка с наибольшим числом входящих рёбер (детерминированно)."""
+    indegree = {}
+    for link in all_links:
+        indegree[link.to_node] = indegree.get(link.to_node, 0) + 1
+    return max(sorted(indegree), key=lambda node: indegree[node])
+
+
+def run_size(n_links, data_dir, repeat=1, allocations=True, engines=('florian', 'time_arrived'),
+             topology='radial', seed=42):
+    """Все этапы на сети из ~n_links рёбер; возвращает список записей."""
+    from utils import parse_gtfs_limited, calculate_links, calculate_headways
+    from algos import florian, time_arrived_florian
+    from synthetic_gtfs import generate_gtfs
+    from algos.network import Network
+    from algos.reachability import get_reachability_index
+
+    directory = os.path.join(data_dir, f"{topology}_{n_links}_{seed}")
+    if not os.path.exists(os.path.join(directory, 'stop_times.txt')):
+        generate_gtfs(directory, topology=topology, seed=seed, **feed_params(n_links))
+
+    records = []
+    limit = 10 ** 9
+
+    def run(stage, fn):
+        result, record = measure(stage, fn, repeat, allocations)
+        records.append(record)
+        return result
+
+    stop_times, active_trips, all_stops, _, _ = run(
+        'parse_gtfs_limited', lambda: parse_gtfs_limited(directory, limit=limit))
+    all_links = run('calculate_links', lambda: calculate_links(stop_times, active_trips, all_stops))
+    all_links = run('calculate_headways', lambda: calculate_headways(stop_times, active_trips, all_links))
+
+    destination = pick_destination(all_links)
+    od_matrix = {origin: {destination: DEMAND}
+                 for origin in get_reachability_index(Network(all_links, all_stops)).stops_reaching(destination)
+                 if origin != destination}
+
+    if 'florian' in engines:
+        strategy = run('florian.find_optimal_strategy',
+                       lambda: florian.find_optimal_strategy(all_links, all_stops, destination))
+        run('florian.assign_demand',
+            lambda: florian.assign_demand(all_links, all_stops, strategy, od_matrix, destination))
+    if 'time_arrived' in engines:
+        strategy = run('time_arrived.find_optimal_strategy',
+                       lambda: time_arrived_florian.find_optimal_strategy(all_links, all_stops, destination, T_DEADLINE))
+        run('time_arrived.assign_demand',
+            lambda: time_arrived_florian.assign_demand(all_links, all_stops, strategy, od_matrix, destination))
+
+    for record in records:
+        record.update(size=n_links, n_links=len(all_links), n_stops=len(all_stops), n_origins=len(od_matrix))
+    return records
+
+
+def environment():
+    info = {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+    for module in ('numpy', 'scipy'):
+        try:
+            info[module] = __import__(module).__version__
+        except ImportError:
+            info[module] = None
+    try:
+        info['git_commit'] = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                            check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        info['git_commit'] = None
+    return info
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, data_dir=None, repeat=1, allocations=True,
+                   engines=('florian', 'time_arrived'), topology='radial', seed=42):
+    """Прогоняет все размеры (каждый в отдельном процессе) и возвращает словарь результатов."""
+    records = [measure_import(module) for module in IMPORT_MODULES]
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = data_dir or tmp
+        for size in sizes:
+            with ProcessPoolExecutor(max_workers=1) as pool:
+                records += pool.submit(run_size, size, data_dir, repeat, allocations, tuple(engines),
+                                       topology, seed).result()
+    return {'environment': environment(), 'results': records}
+
+
+def compare_results(current, baseline, time_threshold=TIME_THRESHOLD, rss_threshold=RSS_THRESHOLD):
+    """
+    Сравнивает результаты с базовыми по парам (size, stage).
+    Возвращает список регрессий: {'size', 'stage', 'metric', 'baseline', 'current', 'ratio'}.
+    """
+    base = {(r['size'], r['stage']): r for r in baseline['results']}
+    regressions = []
+    for record in current['results']:
+        old = base.get((record['size'], record['stage']))
+        if old is None:
+            continue
+        new_heavy = sorted(set(record.get('heavy_modules', ())) - set(old.get('heavy_modules', ())))
+        if new_heavy:
+            regressions.append({'size': record['size'], 'stage': record['stage'], 'metric': 'heavy_modules',
+                                'baseline': old.get('heavy_modules', []), 'current': new_heavy, 'ratio': None})
+        min_seconds = MIN_IMPORT_SECONDS if record['stage'].startswith('import:') else MIN_SECONDS
+        checks = (('wall_s', time_threshold, min_seconds), ('peak_rss_mb', rss_threshold, MIN_RSS_MB))
+        for metric, threshold, minimum in checks:
+            if old.get(metric) is None or record.get(metric) is None:
+                continue
+            if record[metric] - old[metric] < minimum:
+                continue
+            ratio = record[metric] / old[metric] if old[metric] > 0 else float('inf')
+            if ratio > 1.0 + threshold:
+                regressions.append({'size': record['size'], 'stage': record['stage'], 'metric': metric,
+                                    'baseline': old[metric], 'current': record[metric], 'ratio': ratio})
+    return regressions
+
+
+def format_table(results):
+    lines = [f"{'size':>9} {'stage':<36} {'wall, s':>9} {'peak RSS, MB':>13} {'alloc, MB':>10}"]
+    for r in results['results']:
+        rss, alloc = r.get('peak_rss_mb'), r.get('alloc_peak_mb')
+        line = (f"{r['size']:>9} {r['stage']:<36} {r['wall_s']:>9.3f} {'-' if rss is None else format(rss, '.1f'):>13} "
+                f"{'-' if alloc is None else format(alloc, '.1f'):>10}")
+        if r.get('heavy_modules'):
+            line += "  тянет: " + ", ".join(r['heavy_modules'])
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Бенчмарк этапов: чтение GTFS, рёбра, интервалы, стратегии, загрузка')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES), help='Число рёбер сети')
+    parser.add_argument('--repeat', type=int, default=1, help='Повторов каждого этапа (берётся минимум времени)')
+    parser.add_argument('--no-alloc', action='store_true', help='Не замерять выделения (tracemalloc)')
+    parser.add_argument('--engines', nargs='+', default=['florian', 'time_arrived'], choices=['florian', 'time_arrived'])
+    parser.add_argument('--topology', choices=['radial', 'grid'], default='radial')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--data-dir', default=None, help='Каталог для сгенерированных лент (по умолчанию временный)')
+    parser.add_argument('--output', default=None, help='Куда записать JSON с результатами')
+    parser.add_argument('--compare', default=None, help='JSON с базовыми результатами для поиска регрессий')
+    parser.add_argument('--time-threshold', type=float, default=TIME_THRESHOLD)
+    parser.add_argument('--rss-threshold', type=float, default=RSS_THRESHOLD)
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault('TQDM_DISABLE', '1')  # до запуска процессов замеров
+    results = run_benchmarks(args.sizes, args.data_dir, args.repeat, not args.no_alloc, args.engines,
+                             args.topology, args.seed)
+    print(format_table(results))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare_results(results, baseline, args.time_threshold, args.rss_threshold)
+        for r in regressions:
+            if r['ratio'] is None:
+                print(f"РЕГРЕССИЯ {r['stage']}: новые тяжёлые импорты {', '.join(r['current'])}")
+            else:
+                print(f"РЕГРЕССИЯ {r['size']} {r['stage']} {r['metric']}: "
+                      f"{r['baseline']:.3f} -> {r['current']:.3f} (x{r['ratio']:.2f})")
+        if regressions:
+            return 1
+        print("Регрессий нет")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.path.append('.')
+    sys.exit(main())
@@ -1,6 +1,7 @@
 from matplotlib import pyplot as plt
 import numpy as np
 from utils import find_shortest_route_pair
+from algos.route_index import RouteIndex
 
 def find_shortest_bus_route(original_links, all_stops):
     origin, destination = find_shortest_route_pair(original_links, max_stops=10)
@@ -15,63 +16,23 @@ def find_shortest_bus_route(original_links, all_stops):
         print(f"Найдена пара с маршрутом длиной до 10 остановок: {origin} -> {destination}")
     return origin, destination
 
-def find_bus_route(bus_route_name, active_trips, stop_times, all_stops, route_names, all_links):
-    # Параметры для тестирования
-    # Найдем маршрут C962 и используем его остановки
-    # Ищем маршрут по названию, а не по ID
-    c962_route_id = None
-    for route_id, route_name in route_names.items():
-        if bus_route_name in route_name.lower():
-            c962_route_id = route_id
-            print(f"Найден маршрут C962 с ID: {c962_route_id}, название: {route_name}")
-            break
-    
-    c962_stops = []
-    if c962_route_id:
-        for link in all_links:
-            if link.route_id == c962_route_id:  # Ищем связи, принадлежащие найденному маршруту C962
-                if link.from_node not in c962_stops:
-                    c962_stops.append(link.from_node)
-                if link.to_node not in c962_stops:
-                    c962_stops.append(link.to_node)
-    
-    # Если маршрут C962 найден, используем его первую и последнюю остановку
-    if c962_stops:
-        # Сортируем остановки по порядку следования в маршруте
-        # Для этого нужно построить путь
-        c962_trip_ids = []
-        for trip_id, route_id in active_trips.items():
-            if route_id == c962_route_id:
-                c962_trip_ids.append(trip_id)
-        
-        if c962_trip_ids:
-            # Берем первую поездку маршрута C962 и получаем остановки в правильном порядке
-            first_trip = c962_trip_ids[0]
-            if first_trip in stop_times:
-                trip_stops = stop_times[first_trip]
-                # Сортируем по stop_sequence
-                trip_stops.sort(key=lambda x: int(x['stop_sequence']))
-                ordered_c962_stops = [stop['stop_id'] for stop in trip_stops]
-                
-                if len(ordered_c962_stops) >= 2:
-                    origin = ordered_c962_stops[0]
-                    destination = ordered_c962_stops[-1]
-                    print(f"Используем маршрут C962: {origin} -> {destination}")
+def find_bus_route(bus_route_name, active_trips, stop_times, all_stops, route_names, all_links, route_index=None):
+    # Ищем маршрут по названию (номеру) и используем его конечные остановки.
+    # Индекс маршрутов лучше передавать готовым (get_route_index(network) — он сохраняется со снимком),
+    # иначе он строится здесь по stop_times.
+    if route_index is None:
+        route_index = RouteIndex(stop_times, active_trips, route_names, all_stops)
 
-                    return origin, destination
-                else:
-                    # Если в маршруте менее 2 остановок, используем стандартную логику
-                    pass
-            else:
-                # Если не найдена поездка C962, используем стандартную логику
-                pass
-        else:
-            # Если не найдена поездка C962, используем стандартную логику
-            pass
-    else:
-        # Если маршрут C962 не найден, используем стандартную логику
-        pass
+    route_ids = route_index.find_routes(bus_route_name)
+    if route_ids:
+        route_id = route_ids[0]
+        print(f"Найден маршрут {bus_route_name} с ID: {route_id}, название: {route_names.get(route_id, route_id)}")
+        origin, destination = route_index.terminals(route_id)
+        if origin is not None:
+            print(f"Используем маршрут {bus_route_name}: {origin} -> {destination}")
+            return origin, destination
 
+    # Если маршрут не найден или в нём менее 2 остановок, используем стандартную логику
     origin, destination = find_shortest_bus_route(all_links, all_stops)
     return origin, destination
 
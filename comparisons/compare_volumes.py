@@ -1,7 +1,12 @@
 
 from algos.florian import find_optimal_strategy, assign_demand as assign_demand_florain, parse_gtfs
 from algos.time_arrived_florian import find_optimal_strategy as  find_optimal_strategy_modified, assign_demand as assign_demand_time_arrived
+from algos.network import Network, load_network
+from algos.reachability import get_reachability_index
+from algos.spatial import get_walking_links
+from profiling import StageProfiler
 from utils import *
+from visualization import get_geo_layout, visualize_volumes, visualize_volumes_geo, render_heatmap_tiles
 import networkx as nx
 import matplotlib.pyplot as plt
 import os
@@ -59,19 +64,31 @@ def parse_sample_data():
     return all_links, all_stops
 
 
-def compare_approaches(T=60, limit=200000):
-    directory = "improved-gtfs-moscow-official"
-    all_links, all_stops = parse_gtfs(directory, limit)
+def compare_approaches(T=60, limit=200000, walk_radius=0.0, render_map=False, tiles_dir=None,
+                       directory="improved-gtfs-moscow-official", profile_dir=None):
+    profiler = StageProfiler(profile_dir)
+    network = load_network(directory, limit, profiler)
+    all_links, all_stops = network.all_links, network.all_stops
+
+    if walk_radius > 0:
+        with profiler.stage('walking_links'):
+            walking_links = get_walking_links(network, walk_radius)
+        all_links = all_links + walking_links
+        print(f"Добавлено {len(walking_links)} пешеходных пересадок в радиусе {walk_radius} м")
 
     print("Ищем пару связанных остановок...")
-    origin, destination = find_connected_od_pair_with_min_hops(all_links)
+    with profiler.stage('od_pair'):
+        origin, destination = find_connected_od_pair_with_min_hops(all_links)
 
     if origin is None or destination is None:
         raise ValueError("Не удалось найти ни одной пары остановок с путём между ними!")
 
     print(f"Найдена пара: origin={origin}, destination={destination}")
 
-    origins_reaching_dest = get_all_origins_reaching_destination(all_links, destination)
+    with profiler.stage('reachability'):
+        # с пешеходными рёбрами граф другой — индекс строится по нему, а не по закэшированной сети
+        reachable_network = network if walk_radius <= 0 else Network(all_links, all_stops)
+        origins_reaching_dest = get_reachability_index(reachable_network).stops_reaching(destination)
 
     print(f"Найдено {len(origins_reaching_dest)} остановок, из которых можно доехать до {destination}")
 
@@ -85,10 +102,14 @@ def compare_approaches(T=60, limit=200000):
     # result = compute_sf(all_links, all_stops, destination, od_matrix)
     
     # all_links, all_stops = parse_sample_data()
-    strategy_orig = find_optimal_strategy(all_links, all_stops, destination)
-    volumes_orig = assign_demand_florain(all_links, all_stops, strategy_orig, od_matrix, destination)
-    strategy_mod = find_optimal_strategy_modified(all_links, all_stops, destination, T)
-    volumes_mod = assign_demand_time_arrived(all_links, all_stops, strategy_mod, od_matrix, destination)
+    with profiler.stage('strategy_original'):
+        strategy_orig = find_optimal_strategy(all_links, all_stops, destination)
+    with profiler.stage('assignment_original'):
+        volumes_orig = assign_demand_florain(all_links, all_stops, strategy_orig, od_matrix, destination)
+    with profiler.stage('strategy_modified'):
+        strategy_mod = find_optimal_strategy_modified(all_links, all_stops, destination, T)
+    with profiler.stage('assignment_modified'):
+        volumes_mod = assign_demand_time_arrived(all_links, all_stops, strategy_mod, od_matrix, destination)
     
     avg_orig_A, total_orig_A, count_orig_A = compute_average_volume(volumes_orig)
     avg_mod_A, total_mod_A, count_mod_A = compute_average_volume(volumes_mod)
@@ -122,6 +143,25 @@ def compare_approaches(T=60, limit=200000):
     print("\nСредний объём на рёбрах:")
     print(f"Original (только активные):  среднее = {avg_orig_A:.2f}, всего рёбер = {count_orig_A}")
     print(f"Modified (только активные): среднее = {avg_mod_A:.2f}, всего рёбер = {count_mod_A}")
+
+    if render_map and network.stop_coords:
+        with profiler.stage('visualization'):
+            layout = get_geo_layout(network)
+            visualize_volumes_geo(layout, volumes_orig, os.path.join("visual", "map_volumes_original.png"),
+                                  destination=destination, origins=od_matrix.keys(),
+                                  title=f"Original: destination = {destination}")
+            visualize_volumes_geo(layout, volumes_orig, os.path.join("visual", "map_volumes_diff.png"),
+                                  volumes_mod=volumes_mod, destination=destination,
+                                  title=f"Original - Modified: destination = {destination}, T = {T} мин")
+
+    if tiles_dir and network.stop_coords:
+        with profiler.stage('heatmap_tiles'):
+            layout = get_geo_layout(network)
+            tiles = render_heatmap_tiles(layout, volumes_orig, os.path.join(tiles_dir, "original"))
+            tiles += render_heatmap_tiles(layout, volumes_orig, os.path.join(tiles_dir, "diff"), volumes_mod=volumes_mod)
+        print(f"Записано {len(tiles)} тайлов карты плотности в {tiles_dir}")
+
+    profiler.write_summary()
     
 
 def compare_fix_approaches(od_matrix, destination, T=60):
@@ -148,11 +188,22 @@ def main():
                        help='Deadline для модифицированного алгоритма (в минутах)')
     parser.add_argument('--limit', type=int, default=100000,
                        help='Ограничение для GTFS данных')
+    parser.add_argument('--gtfs-dir', default="improved-gtfs-moscow-official",
+                       help='Каталог GTFS (например, лента synthetic_gtfs.py)')
+    parser.add_argument('--profile', default=None, metavar='DIR',
+                       help='Профилировать этапы (cProfile, tracemalloc, стеки для flamegraph) в каталог DIR')
+    parser.add_argument('--walk-radius', type=float, default=0.0,
+                       help='Радиус пешеходных пересадок между остановками в метрах (0 — без пересадок)')
+    parser.add_argument('--map', action='store_true',
+                       help='Нарисовать карту объёмов в координатах остановок (режим gtfs)')
+    parser.add_argument('--tiles', default=None,
+                       help='Каталог для PNG-тайлов растровой карты плотности и разности объёмов (режим gtfs)')
     
     args = parser.parse_args()
     
     if args.mode == 'gtfs':
-        compare_approaches(args.T, limit=args.limit)
+        compare_approaches(args.T, limit=args.limit, walk_radius=args.walk_radius, render_map=args.map, tiles_dir=args.tiles,
+                           directory=args.gtfs_dir, profile_dir=args.profile)
         
     elif args.mode == 'sample':
         od_matrix = {
@@ -1,31 +1,35 @@
+import argparse
 import sys
 import matplotlib.pyplot as plt
 
 sys.path.append('.')
 
-from algos.florian import compute_sf
+from algos.florian import compute_sf, find_optimal_strategy, assign_demand
 from algos.time_arrived_florian import compute_sf as compute_sf_with_time_arrived
-from utils import parse_gtfs_limited, calculate_links, calculate_headways, get_all_origins_reaching_destination
+from algos.time_arrived_florian import find_optimal_strategy as find_optimal_strategy_with_time_arrived
+from algos.time_arrived_florian import assign_demand as assign_demand_with_time_arrived
+from utils import SFResult
+from algos.network import ingest_gtfs, build_network
+from algos.route_index import get_route_index
+from algos.reachability import get_reachability_index
+from profiling import StageProfiler
 from comparisons.bus_route_visualization import find_bus_route, create_bus_route_visualization
 
-def run_comparison_with_gtfs(limit=10000):
+def run_comparison_with_gtfs(limit=10000, directory="improved-gtfs-moscow-official", profile_dir=None):
     """
     Функция для сравнения оригинального алгоритма Флориана и модифицированного
-    с использованием GTFS-данных с ограничением
+    с использованием GTFS-данных с ограничением.
+    profile_dir — каталог для профилей этапов (см. profiling.StageProfiler)
     """
+    profiler = StageProfiler(profile_dir)
     print(f"Сравнение оригинального алгоритма Флориана и алгоритма с учетом вероятности опоздания")
     print(f"Используется ограничение на {limit} записей из каждого файла GTFS")
     
-    # Используем ограниченный парсинг GTFS
-    directory = "improved-gtfs-moscow-official"
-    
-    # Парсим GTFS с ограничением
-    stop_times, active_trips, all_stops, stop_names, route_names = parse_gtfs_limited(directory, limit=limit)
-
-    all_links = calculate_links(stop_times, active_trips, all_stops)
-    
-    # Рассчитываем интервалы
-    all_links = calculate_headways(stop_times, active_trips, all_links)
+    # Парсим GTFS с ограничением; рёбра, интервалы и индекс маршрутов строятся вместе с сетью
+    ingested = ingest_gtfs(directory, limit, profiler)
+    network = build_network(ingested, profiler)
+    stop_times, active_trips, all_stops, stop_names, route_names, _ = ingested
+    all_links = network.all_links
     
     # Создаем словарь интервалов из модифицированных связей
     departures = {}
@@ -33,11 +37,14 @@ def run_comparison_with_gtfs(limit=10000):
         key = (link.route_id, link.from_node)
         departures[key] = link.headway
 
-    origin, destination = find_bus_route('с962', active_trips, stop_times, all_stops, route_names, all_links)
+    with profiler.stage('od_pair'):
+        origin, destination = find_bus_route('с962', active_trips, stop_times, all_stops, route_names, all_links,
+                                             route_index=get_route_index(network))
     
     arrival_deadline = 45  # дедлайн в 45 минут
 
-    origins_reaching_dest = get_all_origins_reaching_destination(all_links, destination)
+    with profiler.stage('reachability'):
+        origins_reaching_dest = get_reachability_index(network).stops_reaching(destination)
 
     print(f"Найдено {len(origins_reaching_dest)} остановок, из которых можно доехать до {destination}")
 
@@ -52,16 +59,21 @@ def run_comparison_with_gtfs(limit=10000):
     print(f"Количество связей (original): {len(all_links)}")
 
     print("Вычисление результатов с оригинальным алгоритмом...")
-    original_result = compute_sf(all_links, all_stops, destination, od_matrix)
+    with profiler.stage('strategy_original'):
+        strategy = find_optimal_strategy(all_links, all_stops, destination)
+    with profiler.stage('assignment_original'):
+        original_result = SFResult(strategy, assign_demand(all_links, all_stops, strategy, od_matrix, destination))
     
     print(f"\nРезультаты оригинального алгоритма Флориана:")
     print(f"Обобщенные затраты из {origin}: {original_result.strategy.labels.get(origin, 'N/A')}")
     print(f"Обобщенные затраты в целевом узле: {original_result.strategy.labels.get(destination, 'N/A')}")
     
     print("Вычисление результатов с модифицированным алгоритмом...")
-    result_time_arrived = compute_sf_with_time_arrived(
-        all_links, all_stops, destination, od_matrix, arrival_deadline
-    )
+    with profiler.stage('strategy_modified'):
+        strategy = find_optimal_strategy_with_time_arrived(all_links, all_stops, destination, arrival_deadline)
+    with profiler.stage('assignment_modified'):
+        result_time_arrived = SFResult(strategy, assign_demand_with_time_arrived(
+            all_links, all_stops, strategy, od_matrix, destination))
     
     print(f"\nРезультаты модифицированного алгоритма:")
     print(f"Вероятность прибытия вовремя из {origin}: {result_time_arrived.strategy.labels.get(origin, 'N/A')}")
@@ -73,8 +85,10 @@ def run_comparison_with_gtfs(limit=10000):
     print(f"Новый алгоритм - вероятность прибытия вовремя из {origin}: {result_time_arrived.strategy.labels.get(origin, 'N/A')}")
     
     # Создаем визуализацию
-    create_bus_route_visualization(original_result, result_time_arrived, all_stops, origin, destination, stop_names, route_names)
-    
+    with profiler.stage('visualization'):
+        create_bus_route_visualization(original_result, result_time_arrived, all_stops, origin, destination, stop_names, route_names)
+
+    profiler.write_summary()
     return original_result, result_time_arrived
 
 def run_extended_comparison_with_gtfs(limit=5000):
@@ -86,12 +100,10 @@ def run_extended_comparison_with_gtfs(limit=5000):
     directory = "improved-gtfs-moscow-official"
     
     # Парсим GTFS с ограничением
-    stop_times, active_trips, all_stops, stop_names, route_names = parse_gtfs_limited(directory, limit=limit)
-    
-    all_links = calculate_links(stop_times, active_trips, all_stops)
-
-    # Рассчитываем интервалы
-    all_links = calculate_headways(stop_times, active_trips, all_links)
+    ingested = ingest_gtfs(directory, limit)
+    network = build_network(ingested)
+    stop_times, active_trips, all_stops, stop_names, route_names, _ = ingested
+    all_links = network.all_links
     
     # Создаем словарь интервалов из модифицированных связей
     departures = {}
@@ -99,9 +111,10 @@ def run_extended_comparison_with_gtfs(limit=5000):
         key = (link.route_id, link.from_node)
         departures[key] = link.headway
 
-    origin, destination = find_bus_route('с962', active_trips, stop_times, all_stops, route_names, all_links)
+    origin, destination = find_bus_route('с962', active_trips, stop_times, all_stops, route_names, all_links,
+                                         route_index=get_route_index(network))
 
-    origins_reaching_dest = get_all_origins_reaching_destination(all_links, destination)
+    origins_reaching_dest = get_reachability_index(network).stops_reaching(destination)
 
     print(f"Найдено {len(origins_reaching_dest)} остановок, из которых можно доехать до {destination}")
 
@@ -173,8 +186,16 @@ def run_extended_comparison_with_gtfs(limit=5000):
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Сравнение алгоритмов Florian на GTFS-данных')
+    parser.add_argument('--limit', type=int, default=100000, help='Ограничение для GTFS данных')
+    parser.add_argument('--gtfs-dir', default="improved-gtfs-moscow-official", help='Каталог GTFS')
+    parser.add_argument('--profile', default=None, metavar='DIR',
+                        help='Профилировать этапы (cProfile, tracemalloc, стеки для flamegraph) в каталог DIR')
+    args = parser.parse_args()
+
     # Выполняем основное сравнение с GTFS-данными
-    original_result, prob_result = run_comparison_with_gtfs(limit=100000)
+    original_result, prob_result = run_comparison_with_gtfs(limit=args.limit, directory=args.gtfs_dir,
+                                                            profile_dir=args.profile)
     
     # Выполняем расширенное сравнение
     # run_extended_comparison_with_gtfs(limit=500)
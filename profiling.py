@@ -0,0 +1,128 @@
+import contextlib
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+# Профилирование этапов расчёта без правки кода:
+#
+#   profiler = StageProfiler("profile")
+#   with profiler.stage("ingest"):
+#       ...
+#   profiler.write_summary()
+#
+# Для каждого этапа в каталог пишутся:
+#   NN_<stage>.prof       — cProfile (pstats, snakeviz);
+#   NN_<stage>.alloc.txt  — пик tracemalloc и топ мест выделения памяти, оставшейся после этапа;
+#   NN_<stage>.collapsed  — стеки главного потока, снятые с периодом sample_interval, в формате
+#                           "f1;f2;f3 count" для flamegraph.pl / speedscope.
+# StageProfiler(None) выключен: stage() ничего не делает.
+
+
+class _StackSampler(threading.Thread):
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class StageProfiler:
+    def __init__(self, output_dir=None, top_n=25, sample_interval=0.005, trace_memory=True):
+        self.output_dir = output_dir
+        self.top_n = top_n
+        self.sample_interval = sample_interval
+        self.trace_memory = trace_memory
+        self.stages = []
+        if output_dir is not None:
+            os.makedirs(output_dir, exist_ok=True)
+
+    @property
+    def enabled(self):
+        return self.output_dir is not None
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        if not self.enabled:
+            yield
+            return
+
+        prefix = os.path.join(self.output_dir, f"{len(self.stages):02d}_{name}")
+        sampler = _StackSampler(threading.get_ident(), self.sample_interval)
+        profile = cProfile.Profile()
+        # чужую трассировку не перезапускаем: без reset_peak (Python 3.8) пик этапа тогда не известен
+        started_tracing = self.trace_memory and not tracemalloc.is_tracing()
+        known_peak = started_tracing or hasattr(tracemalloc, 'reset_peak')
+        if started_tracing:
+            tracemalloc.start()
+        elif self.trace_memory and known_peak:
+            tracemalloc.reset_peak()
+        sampler.start()
+        start = time.perf_counter()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            wall = time.perf_counter() - start
+            sampler.stop()
+            record = {'stage': name, 'wall_s': wall, 'samples': sum(sampler.stacks.values())}
+
+            profile.dump_stats(prefix + ".prof")
+            with open(prefix + ".collapsed", 'w') as f:
+                for stack, count in sampler.stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+
+            if self.trace_memory:
+                current, peak = tracemalloc.get_traced_memory()
+                snapshot = tracemalloc.take_snapshot().filter_traces((
+                    tracemalloc.Filter(False, tracemalloc.__file__),
+                    tracemalloc.Filter(False, __file__),
+                ))
+                if started_tracing:
+                    tracemalloc.stop()
+                record['alloc_current_mb'] = current / 2 ** 20
+                if known_peak:
+                    record['alloc_peak_mb'] = peak / 2 ** 20
+                peak = f"{peak / 2 ** 20:.1f} MB" if known_peak else "n/a"
+                with open(prefix + ".alloc.txt", 'w') as f:
+                    f.write(f"stage: {name}\npeak: {peak}\ncurrent: {current / 2 ** 20:.1f} MB\n\n")
+                    for stat in snapshot.statistics('lineno')[:self.top_n]:
+                        f.write(f"{stat.size / 2 ** 20:10.2f} MB {stat.count:10d} blocks  {stat.traceback[0]}\n")
+            self.stages.append(record)
+
+    def write_summary(self):
+        """Пишет summary.json и печатает таблицу этапов; возвращает список записей."""
+        if not self.enabled:
+            return []
+        with open(os.path.join(self.output_dir, "summary.json"), 'w') as f:
+            json.dump(self.stages, f, indent=2)
+        print(f"Профиль этапов (каталог {self.output_dir}):")
+        for record in self.stages:
+            alloc = record.get('alloc_peak_mb')
+            alloc = "" if alloc is None else f", пик памяти {alloc:.1f} МБ"
+            print(f"  {record['stage']:<24} {record['wall_s']:9.3f} с{alloc}")
+        return self.stages
+
+
+NULL_PROFILER = StageProfiler(None)
@@ -4,5 +4,7 @@ setup(
     name="traffic_flows",
     version="0.1.0",
     packages=find_packages(),
+    py_modules=["utils", "profiling", "visualization", "synthetic_gtfs"],
+    entry_points={"console_scripts": ["traffic_flows=algos.cli:main"]},
     python_requires=">=3.8",
 )
\ No newline at end of file
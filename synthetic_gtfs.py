@@ -0,0 +1,231 @@
+import argparse
+import csv
+import math
+import os
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+
+# Генератор синтетической GTFS-ленты города заданного масштаба (детерминирован по seed).
+# Остановки расставляются сеткой (grid) или кольцами вокруг центра (radial), соседние остановки
+# соединяются улицами; маршрут — кратчайший путь по улицам со случайными весами между двумя
+# случайными остановками, рейсы идут в обе стороны с постоянным интервалом весь день.
+# Ленту читает parse_gtfs_limited: календарь покрывает дату, которую он использует.
+
+CENTER_LAT = 55.7522
+CENTER_LON = 37.6156
+SERVICE_ID = "weekday"
+START_DATE = "20250101"
+END_DATE = "20271231"
+BUS_SPEED_KMH = 20.0
+DWELL_S = 20
+
+# Moscow ~ 10 тыс. остановок и ~2.6 млн строк stop_times
+PRESETS = {
+    'small': dict(n_stops=200, n_routes=12, headway_range=(8, 20)),
+    'city': dict(n_stops=2000, n_routes=150, headway_range=(6, 20)),
+    'moscow': dict(n_stops=10000, n_routes=900, headway_range=(6, 20), target_stop_times=2_600_000),
+}
+
+
+def grid_layout(n_stops, spacing_m, rng):
+    """Координаты (м) и рёбра улиц для прямоугольной сетки из n_stops остановок."""
+    side = int(math.ceil(math.sqrt(n_stops)))
+    k = np.arange(n_stops)
+    row, col = k // side, k % side
+    xy = np.column_stack((col, row)).astype(np.float64) * spacing_m
+    xy += rng.uniform(-0.15, 0.15, size=xy.shape) * spacing_m
+    right = k[(col + 1 < side) & (k + 1 < n_stops)]
+    down = k[k + side < n_stops]
+    edges = np.concatenate((np.column_stack((right, right + 1)), np.column_stack((down, down + side))))
+    return xy, edges
+
+
+def radial_layout(n_stops, spacing_m, rng):
+    """Координаты (м) и рёбра улиц для колец вокруг центра: улицы вдоль колец и к соседнему кольцу."""
+    radius, angle, ring_of = [0.0], [0.0], [0]
+    ring = 1
+    while len(radius) < n_stops:
+        count = min(max(6, int(round(2 * math.pi * ring))), n_stops - len(radius))
+        phase = rng.uniform(0, 2 * math.pi)
+        for j in range(count):
+            radius.append(ring * spacing_m)
+            angle.append(phase + 2 * math.pi * j / count)
+            ring_of.append(ring)
+        ring += 1
+    radius, angle, ring_of = np.array(radius), np.array(angle), np.array(ring_of)
+    radius += rng.uniform(-0.1, 0.1, size=n_stops) * spacing_m * (ring_of > 0)
+    xy = np.column_stack((radius * np.cos(angle), radius * np.sin(angle)))
+
+    edges = []
+    for r in range(1, ring_of.max() + 1):
+        members = np.flatnonzero(ring_of == r)
+        members = members[np.argsort(angle[members] % (2 * math.pi))]
+        if len(members) > 2:
+            edges.append(np.column_stack((members, np.roll(members, -1))))
+        inner = np.flatnonzero(ring_of == r - 1)
+        # каждая остановка кольца соединяется с ближайшей остановкой внутреннего кольца
+        d = np.linalg.norm(xy[members][:, None, :] - xy[inner][None, :, :], axis=2)
+        edges.append(np.column_stack((members, inner[np.argmin(d, axis=1)])))
+    return xy, np.concatenate(edges)
+
+
+LAYOUTS = {'grid': grid_layout, 'radial': radial_layout}
+
+
+def _street_graph(xy, edges, rng):
+    length = np.linalg.norm(xy[edges[:, 0]] - xy[edges[:, 1]], axis=1)
+    weight = length * rng.uniform(1.0, 1.3, size=len(edges))  # разнообразие путей маршрутов
+    n = len(xy)
+    rows = np.concatenate((edges[:, 0], edges[:, 1]))
+    cols = np.concatenate((edges[:, 1], edges[:, 0]))
+    return csr_matrix((np.concatenate((weight, weight)), (rows, cols)), shape=(n, n))
+
+
+def _trace_path(predecessors, target):
+    path = [target]
+    while predecessors[path[-1]] >= 0:
+        path.append(predecessors[path[-1]])
+    return path[::-1]
+
+
+def build_routes(xy, edges, n_routes, rng, min_route_stops=5, batch_size=128):
+    """
+    Последовательности остановок маршрутов: путь по улицам от случайной остановки до остановки
+    на случайном удалении (0.3..1.2 радиуса города).
+    """
+    graph = _street_graph(xy, edges, rng)
+    city_radius = np.max(np.linalg.norm(xy - xy.mean(axis=0), axis=1))
+    routes = []
+    attempts = 0
+    while len(routes) < n_routes and attempts < 20 * n_routes + 100:
+        origins = rng.integers(0, len(xy), size=min(batch_size, n_routes - len(routes)))
+        attempts += len(origins)
+        dist, predecessors = dijkstra(graph, indices=origins, return_predecessors=True)
+        for row, origin in enumerate(origins):
+            target_len = rng.uniform(0.3, 1.2) * city_radius
+            reachable = np.flatnonzero(np.isfinite(dist[row]) & (dist[row] > 0))
+            if len(reachable) == 0:
+                continue
+            near = reachable[np.abs(dist[row, reachable] - target_len) <= 0.2 * target_len]
+            target = rng.choice(near) if len(near) else reachable[np.argmax(dist[row, reachable])]
+            path = _trace_path(predecessors[row], target)
+            if len(path) >= min_route_stops:
+                routes.append(path)
+    return routes
+
+
+def _time_strings(max_seconds):
+    return [f"{s // 3600:02d}:{s // 60 % 60:02d}:{s % 60:02d}" for s in range(max_seconds + 1)]
+
+
+def generate_gtfs(directory, topology='radial', n_stops=1000, n_routes=60, headway_range=(6, 20),
+                  service_hours=(5.5, 23.0), stop_spacing_m=400.0, target_stop_times=None, seed=42):
+    """
+    Пишет GTFS (agency, stops, routes, trips, stop_times, calendar) в directory.
+    headway_range — интервал движения маршрута в минутах (равномерно из диапазона);
+    если задан target_stop_times, интервалы масштабируются так, чтобы строк stop_times было примерно столько.
+    Возвращает сводку: число остановок, маршрутов, рейсов и строк stop_times.
+    """
+    if topology not in LAYOUTS:
+        raise ValueError(f"Неизвестная топология {topology!r}: ожидается одна из {sorted(LAYOUTS)}")
+    rng = np.random.default_rng(seed)
+    xy, edges = LAYOUTS[topology](n_stops, stop_spacing_m, rng)
+    routes = build_routes(xy, edges, n_routes, rng)
+
+    span_s = int((service_hours[1] - service_hours[0]) * 3600)
+    first_s = int(service_hours[0] * 3600)
+    headways = rng.uniform(headway_range[0], headway_range[1], size=len(routes)) * 60.0
+    if target_stop_times:
+        expected = sum(2 * len(path) * span_s / h for path, h in zip(routes, headways))
+        headways = np.maximum(headways * expected / target_stop_times, 60.0)
+
+    speed_mps = BUS_SPEED_KMH / 3.6
+    m_per_deg_lat = math.pi * 6371000.0 / 180.0
+    lats = CENTER_LAT + xy[:, 1] / m_per_deg_lat
+    lons = CENTER_LON + xy[:, 0] / (m_per_deg_lat * math.cos(math.radians(CENTER_LAT)))
+    stop_ids = [f"s{k}" for k in range(len(xy))]
+
+    os.makedirs(directory, exist_ok=True)
+
+    def writer_for(name, header):
+        f = open(os.path.join(directory, name), 'w', newline='', encoding='utf-8')
+        w = csv.writer(f)
+        w.writerow(header)
+        return f, w
+
+    f, w = writer_for('agency.txt', ['agency_id', 'agency_name', 'agency_url', 'agency_timezone'])
+    with f:
+        w.writerow(['synthetic', 'Synthetic Transit', 'http://example.com', 'Europe/Moscow'])
+
+    f, w = writer_for('stops.txt', ['stop_id', 'stop_name', 'stop_lat', 'stop_lon'])
+    with f:
+        w.writerows([stop_ids[k], f"Остановка {k}", f"{lats[k]:.6f}", f"{lons[k]:.6f}"] for k in range(len(xy)))
+
+    f, w = writer_for('calendar.txt', ['service_id', 'monday', 'tuesday', 'wednesday', 'thursday', 'friday',
+                                       'saturday', 'sunday', 'start_date', 'end_date'])
+    with f:
+        w.writerow([SERVICE_ID, 1, 1, 1, 1, 1, 0, 0, START_DATE, END_DATE])
+
+    f, w = writer_for('routes.txt', ['route_id', 'agency_id', 'route_short_name', 'route_long_name', 'route_type'])
+    with f:
+        for r, path in enumerate(routes):
+            w.writerow([f"r{r}", 'synthetic', str(r + 1), f"Остановка {path[0]} - Остановка {path[-1]}", 3])
+
+    n_trips = 0
+    n_stop_times = 0
+    # рейсы заканчиваются до полуночи: calculate_links сворачивает часы GTFS по модулю 24
+    max_time = 24 * 3600 - 1
+    times = _time_strings(max_time)
+    ft, trips_writer = writer_for('trips.txt', ['route_id', 'service_id', 'trip_id', 'direction_id'])
+    fs, st_writer = writer_for('stop_times.txt', ['trip_id', 'arrival_time', 'departure_time', 'stop_id', 'stop_sequence'])
+    with ft, fs:
+        for r, path in enumerate(routes):
+            for direction, seq in enumerate((path, path[::-1])):
+                hop = np.linalg.norm(np.diff(xy[seq], axis=0), axis=1) / speed_mps + DWELL_S
+                offsets = np.concatenate(([0], np.cumsum(np.round(hop)))).astype(np.int64)
+                seq_ids = [stop_ids[k] for k in seq]
+                start = first_s + int(rng.uniform(0, headways[r]))
+                t = 0
+                while start < first_s + span_s and start + offsets[-1] <= max_time:
+                    trip_id = f"r{r}_{direction}_{t}"
+                    trips_writer.writerow([f"r{r}", SERVICE_ID, trip_id, direction])
+                    st_writer.writerows((trip_id, times[s], times[s], stop_id, k + 1)
+                                        for k, (s, stop_id) in enumerate(zip((start + offsets).tolist(), seq_ids)))
+                    n_trips += 1
+                    n_stop_times += len(seq)
+                    start += int(headways[r])
+                    t += 1
+
+    return {'n_stops': len(xy), 'n_routes': len(routes), 'n_trips': n_trips, 'n_stop_times': n_stop_times}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Генератор синтетической GTFS-ленты')
+    parser.add_argument('directory', help='Куда записать ленту')
+    parser.add_argument('--topology', choices=sorted(LAYOUTS), default='radial')
+    parser.add_argument('--preset', choices=sorted(PRESETS), default=None)
+    parser.add_argument('--stops', type=int, default=None)
+    parser.add_argument('--routes', type=int, default=None)
+    parser.add_argument('--headway', type=float, nargs=2, default=None, metavar=('MIN', 'MAX'))
+    parser.add_argument('--stop-times', type=int, default=None, help='Целевое число строк stop_times')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(argv)
+
+    params = dict(PRESETS.get(args.preset, {}))
+    if args.stops is not None:
+        params['n_stops'] = args.stops
+    if args.routes is not None:
+        params['n_routes'] = args.routes
+    if args.headway is not None:
+        params['headway_range'] = tuple(args.headway)
+    if args.stop_times is not None:
+        params['target_stop_times'] = args.stop_times
+    summary = generate_gtfs(args.directory, topology=args.topology, seed=args.seed, **params)
+    print(f"Остановок: {summary['n_stops']}, маршрутов: {summary['n_routes']}, "
+          f"рейсов: {summary['n_trips']}, строк stop_times: {summary['n_stop_times']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+import unittest
+
+from algos import florian, time_arrived_florian
+from utils import INFINITE_FREQUENCY, Link, Strategy
+
+
+class TestAssignOrderTieBreak(unittest.TestCase):
+    """
+    Порядок загрузки a_set при равных ключах labels[to] + travel_cost: раньше идут рёбра, попавшие
+    в стратегию позже (ближе к origin). Равные ключи дают коннекторы зон с нулевыми затратами и ожиданием:
+    у O -> X и X -> D ключ одинаковый, и X -> D нельзя загружать, пока в X не пришёл объём.
+    """
+    def setUp(self):
+        self.connector = Link("O", "X", "connector", travel_cost=0, headway=0)
+        self.line = Link("X", "D", "1", travel_cost=10, headway=0)
+        self.links = [self.connector, self.line]
+        self.stops = {"O", "X", "D"}
+        self.od_matrix = {"O": {"D": 100.0}}
+
+    def check(self, engine, labels):
+        # a_set в порядке добавления в стратегию: сначала ребро у destination
+        strategy = Strategy(labels, {"X": INFINITE_FREQUENCY, "O": INFINITE_FREQUENCY}, [self.line, self.connector])
+        volumes = engine.assign_demand(self.links, self.stops, strategy, self.od_matrix, "D")
+        self.assertEqual(strategy.a_set, [self.connector, self.line])
+        self.assertAlmostEqual(volumes.links["O"]["X"], 100.0)
+        self.assertAlmostEqual(volumes.links["X"]["D"], 100.0)
+        self.assertAlmostEqual(volumes.nodes["D"], 100.0)
+
+    def test_florian(self):
+        self.check(florian, {"D": 0.0, "X": 10.0, "O": 10.0})
+
+    def test_time_arrived(self):
+        self.check(time_arrived_florian, {"D": (0.0, 0.0), "X": (10.0, 0.0), "O": (10.0, 0.0)})
+
+    def test_time_arrived_found_strategy(self):
+        strategy = time_arrived_florian.find_optimal_strategy(self.links, self.stops, "D", T=60)
+        volumes = time_arrived_florian.assign_demand(self.links, self.stops, strategy, self.od_matrix, "D")
+        self.assertAlmostEqual(volumes.links["X"]["D"], 100.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
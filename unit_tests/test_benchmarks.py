@@ -0,0 +1,43 @@
+import tempfile
+import unittest
+
+from benchmarks.run import measure, measure_import, run_size, compare_results
+
+
+class TestBenchmarks(unittest.TestCase):
+    def test_measure(self):
+        result, record = measure('stage', lambda: [0] * 100000, repeat=2)
+        self.assertEqual(len(result), 100000)
+        self.assertEqual(len(record['wall_all_s']), 2)
+        self.assertEqual(record['wall_s'], min(record['wall_all_s']))
+        self.assertGreater(record['peak_rss_mb'], 0)
+        self.assertGreater(record['alloc_peak_mb'], 0.5)  # список из 100000 указателей
+
+    def test_run_size_all_stages(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            records = run_size(500, tmp, allocations=False)
+        stages = [r['stage'] for r in records]
+        self.assertEqual(stages, ['parse_gtfs_limited', 'calculate_links', 'calculate_headways',
+                                  'florian.find_optimal_strategy', 'florian.assign_demand',
+                                  'time_arrived.find_optimal_strategy', 'time_arrived.assign_demand'])
+        self.assertTrue(all(r['n_links'] > 300 and r['n_origins'] > 0 for r in records))
+
+    def test_compare_results(self):
+        baseline = {'results': [{'size': 1000, 'stage': 'a', 'wall_s': 1.0, 'peak_rss_mb': 100.0},
+                                {'size': 1000, 'stage': 'b', 'wall_s': 0.01, 'peak_rss_mb': 100.0}]}
+        current = {'results': [{'size': 1000, 'stage': 'a', 'wall_s': 1.5, 'peak_rss_mb': 101.0},
+                               {'size': 1000, 'stage': 'b', 'wall_s': 0.03, 'peak_rss_mb': 100.0},
+                               {'size': 2000, 'stage': 'a', 'wall_s': 9.0, 'peak_rss_mb': 100.0}]}
+        regressions = compare_results(current, baseline)
+        # этап b короче MIN_SECONDS, размера 2000 нет в базе
+        self.assertEqual([(r['stage'], r['metric']) for r in regressions], [('a', 'wall_s')])
+        self.assertEqual(compare_results(current, baseline, time_threshold=1.0), [])
+
+    def test_measure_import_without_importtime_line(self):
+        # sys уже загружен при старте интерпретатора, -X importtime его не показывает
+        with self.assertRaises(RuntimeError):
+            measure_import('sys', repeat=1)
+
+
+if __name__ == '__main__':
+    unittest.main()
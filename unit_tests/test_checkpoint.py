@@ -0,0 +1,112 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from algos import pipeline
+from algos.checkpoint import read_checkpoint, read_progress
+from algos.network import Network
+from algos.pipeline import assign_all
+from utils import Link
+
+
+class Crash(Exception):
+    pass
+
+
+class TestCheckpointResume(unittest.TestCase):
+    def setUp(self):
+        # две линии, сходящиеся в C, и ветка C -> E
+        self.network = Network([
+            Link("A", "B", "1", travel_cost=5, headway=10),
+            Link("B", "C", "1", travel_cost=5, headway=10),
+            Link("D", "C", "2", travel_cost=7, headway=6),
+            Link("C", "E", "3", travel_cost=4, headway=8),
+            Link("A", "D", "4", travel_cost=3, headway=12),
+        ], {"A", "B", "C", "D", "E"})
+        self.od_matrix = {"A": {"C": 10.0, "E": 5.0, "B": 2.0}, "D": {"C": 3.0, "E": 1.0}, "B": {"E": 4.0}}
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.checkpoint_dir = os.path.join(self.tmp.name, 'partial')
+
+    def test_resume_after_crash_matches_full_run(self):
+        expected, n = assign_all(self.network, self.od_matrix)
+        self.assertEqual(n, 3)
+
+        original = pipeline._assign_destination
+        calls = []
+
+        def crash_on_third(destination, *args, **kwargs):
+            calls.append(destination)
+            if len(calls) == 3:
+                raise Crash()
+            return original(destination, *args, **kwargs)
+
+        with mock.patch.object(pipeline, '_assign_destination', crash_on_third):
+            with self.assertRaises(Crash):
+                assign_all(self.network, self.od_matrix, checkpoint_dir=self.checkpoint_dir, checkpoint_interval=0)
+
+        # частичный результат читается независимо от расчёта
+        partial, completed, progress = read_checkpoint(self.checkpoint_dir)
+        self.assertEqual(completed, calls[:2])
+        self.assertEqual((progress['completed'], progress['total']), (2, 3))
+        self.assertEqual(read_progress(self.checkpoint_dir)['completed'], 2)
+
+        calls.clear()
+
+        def record(destination, *args, **kwargs):
+            calls.append(destination)
+            return original(destination, *args, **kwargs)
+
+        with mock.patch.object(pipeline, '_assign_destination', record):
+            resumed, n = assign_all(self.network, self.od_matrix, checkpoint_dir=self.checkpoint_dir, resume=True)
+        self.assertEqual(n, 3)
+        self.assertEqual(len(calls), 1)
+        for i, targets in expected.links.items():
+            for j, v in targets.items():
+                self.assertAlmostEqual(resumed.links[i][j], v, places=9)
+        for s, v in expected.nodes.items():
+            self.assertAlmostEqual(resumed.nodes[s], v, places=9)
+
+    def test_without_resume_starts_over(self):
+        assign_all(self.network, self.od_matrix, checkpoint_dir=self.checkpoint_dir)
+        volumes, n = assign_all(self.network, self.od_matrix, checkpoint_dir=self.checkpoint_dir)
+        expected, _ = assign_all(self.network, self.od_matrix)
+        self.assertEqual(read_checkpoint(self.checkpoint_dir)[1], ['B', 'C', 'E'])
+        self.assertAlmostEqual(volumes.nodes['C'], expected.nodes['C'], places=9)
+
+    def test_checkpoint_of_other_network_is_replaced(self):
+        other = Network(self.network.all_links + [Link("E", "F", "5", travel_cost=2, headway=5)],
+                        {"A", "B", "C", "D", "E", "F"})
+        assign_all(other, self.od_matrix, checkpoint_dir=self.checkpoint_dir)
+        os.remove(os.path.join(self.checkpoint_dir, 'index.npz'))
+        # нет index.npz — контрольной точки нет
+        with mock.patch.object(pipeline, '_assign_destination', side_effect=Crash()):
+            with self.assertRaises(Crash):
+                assign_all(self.network, self.od_matrix, checkpoint_dir=self.checkpoint_dir, resume=True)
+
+        assign_all(other, self.od_matrix, checkpoint_dir=self.checkpoint_dir)
+        original = pipeline._assign_destination
+        calls = []
+
+        def crash_on_second(destination, *args, **kwargs):
+            calls.append(destination)
+            if len(calls) == 2:
+                raise Crash()
+            return original(destination, *args, **kwargs)
+
+        with mock.patch.object(pipeline, '_assign_destination', crash_on_second):
+            with self.assertRaises(Crash):
+                assign_all(self.network, self.od_matrix, checkpoint_dir=self.checkpoint_dir, resume=True,
+                           checkpoint_interval=0)
+        partial, completed, _ = read_checkpoint(self.checkpoint_dir)
+        self.assertEqual(completed, calls[:1])
+        self.assertNotIn('F', partial.nodes)
+        resumed, n = assign_all(self.network, self.od_matrix, checkpoint_dir=self.checkpoint_dir, resume=True)
+        expected, _ = assign_all(self.network, self.od_matrix)
+        self.assertEqual(n, 3)
+        self.assertAlmostEqual(resumed.nodes['C'], expected.nodes['C'], places=9)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import os
+import pickle
+import tempfile
+import unittest
+
+import numpy as np
+
+from algos import florian, time_arrived_florian
+from algos.compact import LinkTable, CompactStrategy, CompactVolumes, save_results, load_results
+from algos.network import load_network
+from synthetic_gtfs import generate_gtfs
+from utils import SFResult
+
+
+def link_key(link):
+    return (link.from_node, link.to_node, link.route_id, link.travel_cost, link.headway)
+
+
+class TestCompactResults(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        gtfs_dir = os.path.join(cls.tmp.name, 'gtfs')
+        generate_gtfs(gtfs_dir, n_stops=60, n_routes=5, service_hours=(7, 8), seed=2)
+        cls.network = load_network(gtfs_dir, 10 ** 6)
+        cls.table = LinkTable(cls.network.all_links, cls.network.all_stops)
+        stops = sorted(cls.network.all_stops)
+        cls.destinations = stops[:3]
+        cls.results = {}
+        for destination in cls.destinations:
+            od = {o: {destination: 10.0} for o in stops if o != destination}
+            cls.results[destination] = florian.compute_sf(cls.network.all_links, cls.network.all_stops, destination, od)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def test_dict_compatible_accessors(self):
+        result = self.results[self.destinations[0]]
+        strategy = CompactStrategy.from_strategy(result.strategy, self.table)
+        volumes = CompactVolumes.from_volumes(result.volumes, self.table)
+        self.assertEqual(strategy.label_array.dtype, np.float32)
+        self.assertEqual(strategy.a_set_index.dtype, np.int32)
+
+        for s, label in result.strategy.labels.items():
+            self.assertAlmostEqual(strategy.labels[s], label, delta=1e-4 * max(1.0, abs(label)) if np.isfinite(label) else 0)
+        self.assertEqual([id(a) for a in strategy.a_set], [id(a) for a in result.strategy.a_set])
+        self.assertEqual(np.unpackbits(strategy.a_set_bitset())[:len(self.table.links)].sum(), len(result.strategy.a_set))
+
+        # только ненулевые рёбра, обращение как к словарям Volumes
+        nonzero = sum(1 for t in result.volumes.links.values() for v in t.values() if v != 0)
+        self.assertEqual(len(volumes.link_index), nonzero)
+        self.assertLess(nonzero, len(self.table.pairs))
+        for i, targets in result.volumes.links.items():
+            for j, v in targets.items():
+                self.assertAlmostEqual(volumes.links.get(i, {}).get(j, 0.0), v, places=3)
+        for s, v in result.volumes.nodes.items():
+            self.assertAlmostEqual(volumes.nodes.get(s, 0.0), v, places=3)
+
+    def test_compact_strategy_feeds_assign_demand(self):
+        destination = self.destinations[1]
+        stops = sorted(self.network.all_stops)
+        od = {o: {destination: 5.0} for o in stops[3:20]}
+        strategy = time_arrived_florian.find_optimal_strategy(self.network.all_links, self.network.all_stops, destination, 40)
+        expected = time_arrived_florian.assign_demand(self.network.all_links, self.network.all_stops, strategy, od, destination)
+        compact = CompactStrategy.from_strategy(strategy, self.table)
+        self.assertEqual(compact.label_array.shape, (len(self.table.node_ids), 2))
+        self.assertIsInstance(compact.labels[destination], tuple)
+        volumes = time_arrived_florian.assign_demand(self.network.all_links, self.network.all_stops, compact, od, destination)
+        for s, v in expected.nodes.items():
+            self.assertAlmostEqual(volumes.nodes[s], v, places=3)
+
+    def test_save_and_load(self):
+        path = os.path.join(self.tmp.name, 'results.npz')
+        save_results(path, self.table, self.results)
+        table, loaded = load_results(path)
+        self.assertEqual(list(loaded), self.destinations)
+        self.assertEqual([link_key(a) for a in table.links], [link_key(a) for a in self.table.links])
+        # таблица сети пишется один раз, на каждое назначение — малая доля pickle Strategy/Volumes
+        empty = os.path.join(self.tmp.name, 'empty.npz')
+        save_results(empty, self.table, {})
+        per_result = (os.path.getsize(path) - os.path.getsize(empty)) / len(self.results)
+        self.assertLess(per_result, len(pickle.dumps(self.results)) / len(self.results) / 5)
+
+        for destination, result in self.results.items():
+            restored = loaded[destination]
+            self.assertIsInstance(restored, SFResult)
+            self.assertEqual([link_key(a) for a in restored.strategy.a_set], [link_key(a) for a in result.strategy.a_set])
+            for i, targets in result.volumes.links.items():
+                for j, v in targets.items():
+                    self.assertAlmostEqual(restored.volumes.links.get(i, {}).get(j, 0.0), v, places=3)
+            plain = restored.strategy.to_strategy()
+            self.assertEqual(set(plain.labels), set(table.node_ids))
+
+
+if __name__ == '__main__':
+    unittest.main()
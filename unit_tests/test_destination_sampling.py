@@ -0,0 +1,80 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from algos.destination_sampling import SampledAssignment, _inclusion_rate
+from algos.network import load_network
+from algos.pipeline import assign_all
+from synthetic_gtfs import generate_gtfs
+
+
+class TestSampledAssignment(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        gtfs_dir = os.path.join(cls.tmp.name, 'gtfs')
+        generate_gtfs(gtfs_dir, n_stops=40, n_routes=5, service_hours=(7, 8), seed=4)
+        cls.network = load_network(gtfs_dir, 10 ** 6)
+        stops = sorted(cls.network.all_stops)
+        rng = np.random.default_rng(1)
+        # спрос сильно различается по назначениям: крупные должны попадать в выборку первыми
+        weights = {d: float(w) for d, w in zip(stops[:12], rng.lognormal(0, 1.5, 12))}
+        cls.od_matrix = {o: {d: w * (1 + k % 3) for d, w in weights.items() if d != o} for k, o in enumerate(stops)}
+        cls.zones = {s: k % 3 for k, s in enumerate(stops)}
+        cls.full, _ = assign_all(cls.network, cls.od_matrix)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def test_inclusion_rate(self):
+        demand = np.array([10.0, 1.0, 1.0, 2.0])
+        for n in (0.5, 1, 2, 3.5):
+            rate = _inclusion_rate(demand, n)
+            self.assertAlmostEqual(np.minimum(1, rate * demand).sum(), n)
+        self.assertEqual(_inclusion_rate(demand, 4), float('inf'))
+
+    def test_exhausted_sample_matches_full_run(self):
+        sampler = SampledAssignment(self.network, self.od_matrix, stop_to_zone=self.zones, seed=0)
+        history = sampler.run(target_error=0.0)
+        self.assertEqual(history[-1]['destinations'], 12)
+        self.assertEqual(history[-1]['relative_error'], 0.0)
+        # выборки вложены: назначения считаются один раз
+        self.assertEqual(history[-1]['computed'], 12)
+        self.assertEqual([row['computed'] for row in history], sorted(row['computed'] for row in history))
+        volumes = sampler.volumes()
+        for i, targets in self.full.links.items():
+            for j, v in targets.items():
+                self.assertAlmostEqual(volumes.links[i][j], v, places=6)
+        for s, v in self.full.nodes.items():
+            self.assertAlmostEqual(volumes.nodes[s], v, places=6)
+        for (i, j), (v, low, high) in sampler.link_intervals().items():
+            self.assertEqual((low, high), (v, v))
+
+    def test_partial_sample_is_unbiased(self):
+        truth = np.array([self.full.links[i][j] for i, j in SampledAssignment(self.network, {}).layout.link_pairs])
+        estimates, covered = [], []
+        for seed in range(150):
+            sampler = SampledAssignment(self.network, self.od_matrix, stop_to_zone=self.zones, seed=seed)
+            history = sampler.run(target_error=0.0, max_destinations=6)
+            self.assertLess(history[-1]['destinations'], 12)
+            total, variance = sampler.estimate()
+            estimates.append(total[:sampler.n_links])
+            covered.append(history[-1]['demand_share'])
+        mean = np.mean(estimates, axis=0)
+        self.assertLess(np.abs(mean - truth).sum() / truth.sum(), 0.05)
+        # выборка пропорциональна спросу: доля спроса больше доли назначений
+        self.assertGreater(np.mean(covered), 0.6)
+
+    def test_time_budget_keeps_completed_round(self):
+        sampler = SampledAssignment(self.network, self.od_matrix, seed=3)
+        history = sampler.run(target_error=0.0, time_budget=0.0)
+        self.assertEqual(len(history), 1)
+        self.assertEqual(history[0]['destinations'], sampler.n_selected)
+        self.assertGreater(history[0]['relative_error'], 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
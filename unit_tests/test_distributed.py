@@ -0,0 +1,149 @@
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import unittest
+
+from algos.checkpoint import VolumeAccumulator
+from algos.distributed import Coordinator, run_worker, _Connection
+from algos.network import Network, load_network, save_network
+from algos.pipeline import assign_all, _assign_destination
+from synthetic_gtfs import generate_gtfs
+from utils import Link
+
+
+class TestDistributedAssignment(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        gtfs_dir = os.path.join(cls.tmp.name, 'gtfs')
+        generate_gtfs(gtfs_dir, n_stops=80, n_routes=6, service_hours=(7, 9), seed=11)
+        cls.network = load_network(gtfs_dir, 10 ** 6)
+        cls.snapshot = os.path.join(cls.tmp.name, 'network.pkl')
+        save_network(cls.network, cls.snapshot)
+        stops = sorted(cls.network.all_stops)
+        cls.od_matrix = {o: {d: 1.0 + (k % 5) for d in stops[:12]} for k, o in enumerate(stops[12:60])}
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def start_coordinator(self, coordinator):
+        ready = threading.Event()
+        address = {}
+        result = {}
+
+        def on_ready(addr):
+            address['port'] = addr[1]
+            ready.set()
+
+        def serve():
+            try:
+                result['value'] = asyncio.run(coordinator.run('127.0.0.1', 0, on_ready))
+            except RuntimeError as error:
+                result['error'] = error
+
+        thread = threading.Thread(target=serve)
+        thread.start()
+        self.assertTrue(ready.wait(10))
+        return thread, address['port'], result
+
+    def test_workers_on_localhost_with_worker_loss(self):
+        coordinator = Coordinator(self.network, self.od_matrix, batch_size=2, lease_timeout=0.5)
+        thread, port, result = self.start_coordinator(coordinator)
+
+        # рабочий, потерявший соединение с пачкой на руках
+        lost = _Connection('127.0.0.1', port)
+        lost.send({'type': 'hello', 'worker': 'lost'})
+        lost.receive()
+        lost.send({'type': 'request'})
+        self.assertEqual(lost.receive()['type'], 'batch')
+        lost.close()
+        # зависший рабочий: соединение открыто, результата нет — пачка вернётся по истечении аренды
+        hung = _Connection('127.0.0.1', port)
+        hung.send({'type': 'hello', 'worker': 'hung'})
+        hung.receive()
+        hung.send({'type': 'request'})
+        self.assertEqual(hung.receive()['type'], 'batch')
+
+        counts = []
+        workers = [threading.Thread(target=lambda: counts.append(run_worker('127.0.0.1', port, self.snapshot)))
+                   for _ in range(3)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(60)
+        thread.join(60)
+        hung.close()
+
+        volumes, n_destinations = result['value']
+        self.assertEqual(n_destinations, 12)
+        self.assertEqual(sum(counts), len(coordinator.batches))
+        self.assertGreaterEqual(coordinator.counters['requeued'], 2)
+
+        expected, _ = assign_all(self.network, self.od_matrix)
+        self.assertGreater(sum(sum(t.values()) for t in expected.links.values()), 0)
+        for i, targets in expected.links.items():
+            for j, v in targets.items():
+                self.assertAlmostEqual(volumes.links[i][j], v, places=6)
+        for s, v in expected.nodes.items():
+            self.assertAlmostEqual(volumes.nodes[s], v, places=6)
+
+    def test_snapshot_mismatch_is_rejected(self):
+        coordinator = Coordinator(self.network, self.od_matrix, batch_size=4, snapshot_sha256='0' * 64)
+        thread, port, result = self.start_coordinator(coordinator)
+        with self.assertRaises(ValueError):
+            run_worker('127.0.0.1', port, self.snapshot)
+        coordinator.config['sha256'] = None
+        self.assertEqual(run_worker('127.0.0.1', port, self.snapshot), len(coordinator.batches))
+        thread.join(60)
+
+    def test_result_longer_than_default_line_limit(self):
+        # цепочка из 3000 остановок: результат одного назначения — около 6000 ненулевых позиций
+        stops = [f"s{k}" for k in range(3000)]
+        links = [Link(a, b, "1", travel_cost=1.5, headway=10) for a, b in zip(stops, stops[1:])]
+        network = Network(links, set(stops))
+        od_matrix = {o: {stops[-1]: 1 / 3} for o in stops[:-1]}
+        coordinator = Coordinator(network, od_matrix)
+        thread, port, result = self.start_coordinator(coordinator)
+        connection = _Connection('127.0.0.1', port)
+        connection.send({'type': 'hello', 'worker': 'big'})
+        connection.receive()
+        connection.send({'type': 'request'})
+        message = connection.receive()
+        sparse = VolumeAccumulator(network).sparse(
+            [_assign_destination(d, od, 'florian', 60.0, network) for d, od in message['od'].items()])
+        self.assertGreater(len(json.dumps(sparse)), 2 ** 16)
+        connection.send({'type': 'result', 'batch': message['batch'], **sparse})
+        connection.send({'type': 'request'})
+        self.assertEqual(connection.receive()['type'], 'done')
+        connection.close()
+        thread.join(60)
+
+        volumes, n_destinations = result['value']
+        self.assertEqual(n_destinations, 1)
+        self.assertEqual(coordinator.counters['requeued'], 0)
+        self.assertAlmostEqual(volumes.links[stops[-2]][stops[-1]], 2999 / 3)
+
+    def test_protocol_error_fails_run(self):
+        coordinator = Coordinator(self.network, self.od_matrix, batch_size=4)
+        thread, port, result = self.start_coordinator(coordinator)
+        waiting = _Connection('127.0.0.1', port)
+        waiting.send({'type': 'hello', 'worker': 'waiting'})
+        waiting.receive()
+        broken = _Connection('127.0.0.1', port)
+        broken.file.write(b'{"type": "result", "batch"\n')
+        broken.file.flush()
+        thread.join(60)
+        self.assertFalse(thread.is_alive())
+        self.assertIsInstance(result['error'], RuntimeError)
+        self.assertEqual(coordinator.counters['requeued'], 0)
+        with self.assertRaises(RuntimeError):
+            waiting.receive()
+        waiting.close()
+        broken.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+
+from algos import florian, time_arrived_florian
+from utils import Link, EngineStats
+
+
+class TestEngineStats(unittest.TestCase):
+    def setUp(self):
+        # A -> B -> D и A -> C -> D, плюс параллельный быстрый A -> D
+        self.links = [
+            Link("A", "B", "1", travel_cost=10, headway=10),
+            Link("B", "D", "1", travel_cost=10, headway=10),
+            Link("A", "C", "2", travel_cost=8, headway=20),
+            Link("C", "D", "2", travel_cost=14, headway=20),
+            Link("A", "D", "3", travel_cost=25, headway=30),
+        ]
+        self.stops = {"A", "B", "C", "D"}
+        self.od_matrix = {"A": {"D": 100.0}}
+
+    def check_common(self, stats, result):
+        self.assertEqual(stats.runs, 1)
+        self.assertGreaterEqual(stats.queue_pushes, len(self.links))
+        self.assertEqual(stats.queue_pops, stats.relaxations_accepted + stats.relaxations_rejected + stats.stale_pops)
+        self.assertEqual(stats.relaxations_accepted, len(result.strategy.a_set))
+        self.assertEqual(stats.nodes_settled, 4)
+        self.assertEqual(stats.links_loaded, len(result.strategy.a_set))
+        for phase in ('strategy.init', 'strategy.search', 'assign.sort', 'assign.load'):
+            self.assertGreaterEqual(stats.phase_times[phase], 0.0)
+
+    def test_florian(self):
+        result = florian.compute_sf(self.links, self.stops, "D", self.od_matrix, collect_stats=True)
+        self.check_common(result.stats, result)
+        self.assertEqual(result.stats.cdf_evaluations, 0)
+
+    def test_time_arrived(self):
+        result = time_arrived_florian.compute_sf(self.links, self.stops, "D", self.od_matrix, T=60, collect_stats=True)
+        self.check_common(result.stats, result)
+        self.assertGreater(result.stats.cdf_evaluations, result.stats.queue_pushes)
+
+    def test_disabled_and_results_unchanged(self):
+        plain = florian.compute_sf(self.links, self.stops, "D", self.od_matrix)
+        with_stats = florian.compute_sf(self.links, self.stops, "D", self.od_matrix, collect_stats=True)
+        self.assertIsNone(plain.stats)
+        self.assertEqual(plain.volumes.links, with_stats.volumes.links)
+        self.assertEqual(plain.strategy.labels, with_stats.strategy.labels)
+
+    def test_accumulate_and_merge(self):
+        shared = EngineStats()
+        for destination in ("D", "B"):
+            strategy = florian.find_optimal_strategy(self.links, self.stops, destination, shared)
+            florian.assign_demand(self.links, self.stops, strategy, {"A": {destination: 1.0}}, destination, shared)
+        self.assertEqual(shared.runs, 2)
+
+        merged = EngineStats().merge(shared).merge(shared)
+        self.assertEqual(merged.runs, 4)
+        self.assertEqual(merged.queue_pushes, 2 * shared.queue_pushes)
+        self.assertAlmostEqual(merged.phase_times['strategy.search'], 2 * shared.phase_times['strategy.search'])
+        self.assertEqual(merged.as_dict()['runs'], 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+
+from algos.equilibrium import CongestedAssignment, CrowdingCost
+from algos.network import Network
+from algos.pipeline import assign_all
+from utils import Link
+
+
+class FullRecompute(CongestedAssignment):
+    def _reuse(self, destination):
+        return False
+
+
+class TestCongestedAssignment(unittest.TestCase):
+    def setUp(self):
+        # A -> C напрямую или с пересадкой в B; линия 3 (B -> C) перегружается спросом из A, B и E
+        self.network = Network([
+            Link("A", "C", "1", travel_cost=10, headway=5),
+            Link("A", "B", "2", travel_cost=3, headway=5),
+            Link("B", "C", "3", travel_cost=3, headway=5),
+            Link("E", "B", "4", travel_cost=2, headway=10),
+            Link("E", "C", "5", travel_cost=12, headway=20),
+            Link("B", "F", "6", travel_cost=4, headway=10),
+            Link("C", "F", "7", travel_cost=4, headway=10),
+        ], {"A", "B", "C", "E", "F"})
+        self.od_matrix = {"A": {"C": 1500.0, "F": 300.0}, "B": {"C": 800.0}, "E": {"C": 400.0, "F": 200.0}}
+        self.cost = CrowdingCost(alpha=1.0, beta=4)
+
+    def test_uncongested_is_one_assignment(self):
+        solver = CongestedAssignment(self.network, self.od_matrix, CrowdingCost(alpha=0.0))
+        history = solver.run(max_iterations=5)
+        self.assertEqual(len(history), 2)
+        self.assertEqual(history[1]['recomputed'], 0)
+        self.assertAlmostEqual(history[1]['gap'], 0.0, places=9)
+        expected, _ = assign_all(self.network, self.od_matrix)
+        volumes = solver.volumes()
+        for i, targets in expected.links.items():
+            for j, v in targets.items():
+                self.assertAlmostEqual(volumes.links[i][j], v, places=6)
+        for s, v in expected.nodes.items():
+            self.assertAlmostEqual(volumes.nodes[s], v, places=6)
+        self.assertEqual([a.travel_cost for a in solver.links], [a.travel_cost for a in self.network.all_links])
+
+    def test_warm_start_matches_full_recompute(self):
+        for method in ('msa', 'fw'):
+            solver = CongestedAssignment(self.network, self.od_matrix, self.cost)
+            full = FullRecompute(self.network, self.od_matrix, self.cost)
+            history = solver.run(20, 0.0, method)
+            full_history = full.run(20, 0.0, method)
+            for row, full_row in zip(history[1:], full_history[1:]):
+                self.assertAlmostEqual(row['gap'], full_row['gap'], places=12)
+            self.assertLess(sum(row['recomputed'] for row in history), sum(row['recomputed'] for row in full_history))
+            volumes, full_volumes = solver.volumes(), full.volumes()
+            for i, targets in full_volumes.links.items():
+                for j, v in targets.items():
+                    self.assertAlmostEqual(volumes.links[i][j], v, places=9)
+
+    def test_gap_decreases_and_crowding_shifts_flow(self):
+        uncongested, _ = assign_all(self.network, self.od_matrix)
+        for method in ('msa', 'fw'):
+            solver = CongestedAssignment(self.network, self.od_matrix, self.cost)
+            history = solver.run(40, 1e-4, method)
+            self.assertLess(history[-1]['gap'], history[1]['gap'] / 10)
+            self.assertGreaterEqual(min(row['gap'] for row in history[1:]), -1e-9)
+            # перегруженную пересадку в B частично заменяет прямая линия 1
+            self.assertGreater(solver.volumes().links["A"]["C"], uncongested.links["A"]["C"])
+            self.assertGreater(solver.links[2].travel_cost, self.network.all_links[2].travel_cost)
+
+        # повторный run продолжает с достигнутых потоков
+        more = solver.run(5, 0.0)
+        self.assertEqual(more[-1]['iteration'], 44)
+
+    def test_time_arrived_variance_grows_with_load(self):
+        cost = CrowdingCost(alpha=1.0, beta=4, std_factor=0.3)
+        solver = CongestedAssignment(self.network, self.od_matrix, cost, engine='time_arrived', T=30)
+        history = solver.run(30, 1e-3)
+        self.assertIsNone(history[-1]['gap'])
+        self.assertLess(history[-1]['flow_change'], history[1]['flow_change'])
+        loaded = solver.link_volumes > 0
+        self.assertTrue(all(a.std_travel_time > 0 for a, is_loaded in zip(solver.links, loaded) if is_loaded))
+        with self.assertRaises(ValueError):
+            solver.run(method='fw')
+
+
+if __name__ == '__main__':
+    unittest.main()
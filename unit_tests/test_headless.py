@@ -0,0 +1,44 @@
+import os
+import subprocess
+import sys
+import unittest
+
+from scipy.stats import norm
+
+import utils
+from utils import normal_cdf
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class TestHeadlessCore(unittest.TestCase):
+    def test_core_import_skips_plotting(self):
+        code = ("import sys, utils, algos.florian, algos.time_arrived_florian, algos.network; "
+                "print(','.join(m for m in ('matplotlib', 'networkx', 'tqdm', 'scipy.stats') if m in sys.modules))")
+        proc = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                              cwd=ROOT, env=dict(os.environ, PYTHONPATH=ROOT))
+        self.assertEqual(proc.stdout.strip(), '')
+
+    def test_cli_help_skips_subsystems(self):
+        code = ("import sys, contextlib, io, algos.cli\n"
+                "with contextlib.redirect_stdout(io.StringIO()), contextlib.suppress(SystemExit):\n"
+                "    algos.cli.main(['--help'])\n"
+                "print(','.join(m for m in ('numpy', 'scipy', 'asyncio', 'algos.pipeline') if m in sys.modules))")
+        proc = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                              cwd=ROOT, env=dict(os.environ, PYTHONPATH=ROOT))
+        self.assertEqual(proc.stdout.strip(), '')
+
+    def test_normal_cdf_matches_scipy(self):
+        for x in (-40.0, -7.5, -1.0, 0.0, 0.3, 2.0, 9.0):
+            for scale in (1e-4, 0.5, 1.0, 12.0):
+                self.assertAlmostEqual(normal_cdf(x, scale=scale), norm.cdf(x, scale=scale), places=14)
+
+    def test_visualize_volumes_lazy(self):
+        from visualization import visualize_volumes
+        self.assertIs(utils.visualize_volumes, visualize_volumes)
+        with self.assertRaises(AttributeError):
+            utils.no_such_name
+
+
+if __name__ == '__main__':
+    unittest.main()
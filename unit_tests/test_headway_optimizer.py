@@ -0,0 +1,88 @@
+import os
+import tempfile
+import unittest
+
+from algos.headway_optimizer import HeadwayEvaluator, HeadwayOptimizer, read_fleet
+from algos.network import Network, load_network
+from algos.sensitivity import by_route, total_time_gradient
+from synthetic_gtfs import generate_gtfs
+from utils import Link
+
+
+class TestHeadwayOptimizer(unittest.TestCase):
+    def setUp(self):
+        # две независимые линии: J = 400 * (60 / n1 + 10) + 100 * (60 / n2 + 10), минимум при n ~ sqrt(спроса)
+        self.network = Network([
+            Link("A", "B", "1", travel_cost=10, headway=10),
+            Link("C", "D", "2", travel_cost=10, headway=10),
+        ], {"A", "B", "C", "D"})
+        self.od_matrix = {"A": {"B": 400.0}, "C": {"D": 100.0}}
+        self.fleet = {"1": 6.0, "2": 6.0, "unknown": 3.0}
+        self.cycle_time = {"1": 60.0, "2": 60.0}
+
+    def test_square_root_rule(self):
+        optimizer = HeadwayOptimizer(self.network, self.od_matrix, self.fleet, self.cycle_time)
+        history = optimizer.run(max_iterations=60)
+        self.assertEqual(optimizer.routes, ["1", "2"])
+        objectives = [row['objective'] for row in history]
+        self.assertAlmostEqual(objectives[0], 400 * 20 + 100 * 20)
+        self.assertTrue(all(b <= a for a, b in zip(objectives, objectives[1:])))
+        self.assertAlmostEqual(optimizer.fleet.sum(), 12.0)
+        self.assertAlmostEqual(optimizer.fleet[0], 8.0, delta=0.01)
+        self.assertAlmostEqual(optimizer.headways()["2"], 15.0, delta=0.05)
+        self.assertAlmostEqual(objectives[-1], 400 * (7.5 + 10) + 100 * (15 + 10), delta=0.1)
+        # сеть не меняется, стратегии не пересчитываются после первой оценки
+        self.assertEqual([a.headway for a in self.network.all_links], [10, 10])
+        self.assertEqual(sum(row['recomputed'] for row in history), 2)
+
+    def test_bounds_and_parallel_candidates(self):
+        bounded = HeadwayOptimizer(self.network, self.od_matrix, self.fleet, self.cycle_time, budget=10, min_fleet=4)
+        bounded.run(max_iterations=40)
+        self.assertEqual(bounded.fleet.tolist(), [6.0, 4.0])
+        # парка ровно на минимум: перераспределять нечего
+        tight = HeadwayOptimizer(self.network, self.od_matrix, self.fleet, self.cycle_time, budget=8, min_fleet=4)
+        tight.run(max_iterations=5)
+        self.assertEqual(tight.fleet.tolist(), [4.0, 4.0])
+
+        serial = HeadwayOptimizer(self.network, self.od_matrix, self.fleet, self.cycle_time, step=2.0)
+        parallel = HeadwayOptimizer(self.network, self.od_matrix, self.fleet, self.cycle_time, step=2.0, workers=2)
+        self.assertEqual([row['objective'] for row in serial.run(10)], [row['objective'] for row in parallel.run(10)])
+        with self.assertRaises(ValueError):
+            HeadwayOptimizer(self.network, self.od_matrix, self.fleet, {"1": 60.0})
+        with self.assertRaises(ValueError):
+            HeadwayOptimizer(self.network, self.od_matrix, self.fleet, self.cycle_time, budget=1)
+
+    def test_read_fleet(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'fleet.csv')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write("route_id,fleet,cycle_time\n1,6,60\n2,4,45.5\n")
+            self.assertEqual(read_fleet(path), ({"1": 6.0, "2": 4.0}, {"1": 60.0, "2": 45.5}))
+
+
+class TestHeadwayEvaluatorSyntheticGTFS(unittest.TestCase):
+    def test_reused_strategies_match_full_computation(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            gtfs_dir = os.path.join(tmp, 'gtfs')
+            generate_gtfs(gtfs_dir, n_stops=40, n_routes=5, service_hours=(7, 8), seed=4)
+            network = load_network(gtfs_dir, 10 ** 6)
+        stops = sorted(network.all_stops)
+        od_matrix = {o: {d: 1.0 + k % 3 for d in stops[:4] if d != o} for k, o in enumerate(stops)}
+        routes = sorted({a.route_id for a in network.all_links})
+        evaluator = HeadwayEvaluator(network, od_matrix, routes)
+        recomputed = []
+        for scale in (1.0, 1.01, 0.98, 1.5):
+            headways = {r: (8.0 + k) * scale for k, r in enumerate(routes)}
+            total, gradient, n = evaluator.evaluate(headways)
+            recomputed.append(n)
+            links = [Link(a.from_node, a.to_node, a.route_id, a.travel_cost, headways.get(a.route_id, a.headway))
+                     for a in network.all_links]
+            expected, _, d_headway = total_time_gradient(Network(links, network.all_stops), od_matrix)
+            self.assertAlmostEqual(total, expected, places=6)
+            for route, value in by_route(d_headway).items():
+                self.assertAlmostEqual(gradient[route], value, places=6)
+        self.assertEqual(recomputed[:2], [len(evaluator.parts), 0])
+
+
+if __name__ == '__main__':
+    unittest.main()
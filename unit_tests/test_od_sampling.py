@@ -0,0 +1,67 @@
+import unittest
+from collections import deque
+
+from algos.network import Network
+from algos.od_sampling import HopDistanceSampler, sample_od_pairs
+from utils import Link, find_connected_od_pair_with_min_hops, find_shortest_route_pair
+
+
+def bfs_hops(links, origin):
+    graph = {}
+    for link in links:
+        graph.setdefault(link.from_node, []).append(link.to_node)
+    dist = {origin: 0}
+    queue = deque([origin])
+    while queue:
+        current = queue.popleft()
+        for neighbor in graph.get(current, ()):
+            if neighbor not in dist:
+                dist[neighbor] = dist[current] + 1
+                queue.append(neighbor)
+    return dist
+
+
+class TestHopDistanceSampler(unittest.TestCase):
+    def setUp(self):
+        # Кольцо из 30 остановок и две хорды
+        self.nodes = [f"s{k}" for k in range(30)]
+        self.links = [Link(self.nodes[k], self.nodes[(k + 1) % 30], "ring", 1, 5) for k in range(30)]
+        self.links += [Link("s0", "s15", "x", 1, 5), Link("s20", "s5", "y", 1, 5)]
+        self.sampler = HopDistanceSampler(self.links)
+
+    def test_hop_distances_match_bfs(self):
+        origins = ["s0", "s7", "s20"]
+        dist = self.sampler.hop_distances([self.sampler.node_index[o] for o in origins], max_hops=40)
+        for row, origin in enumerate(origins):
+            expected = bfs_hops(self.links, origin)
+            for node, hops in expected.items():
+                self.assertEqual(dist[row, self.sampler.node_index[node]], hops)
+
+    def test_sample_pairs_stratified_and_reproducible(self):
+        bands = ((1, 3), (3, 6), (6, 12))
+        pairs = self.sampler.sample_pairs(5, bands=bands, seed=1, batch_size=4)
+        again = self.sampler.sample_pairs(5, bands=bands, seed=1, batch_size=4)
+        self.assertEqual(pairs, again)
+
+        for (lo, hi), found in pairs.items():
+            self.assertEqual(len(found), 5)
+            self.assertEqual(len({o for o, _, _ in found}), 5)  # не больше одной пары на origin
+            for origin, destination, hops in found:
+                self.assertTrue(lo <= hops < hi)
+                self.assertEqual(bfs_hops(self.links, origin)[destination], hops)
+
+    def test_legacy_helpers(self):
+        origin, destination = find_connected_od_pair_with_min_hops(self.links, min_hops=10)
+        self.assertEqual(bfs_hops(self.links, origin)[destination], 10)
+        origin, destination = find_shortest_route_pair(self.links, max_stops=3)
+        self.assertLessEqual(bfs_hops(self.links, origin)[destination], 3)
+        self.assertEqual(find_connected_od_pair_with_min_hops(self.links, min_hops=50), (None, None))
+
+    def test_cached_with_network(self):
+        network = Network(self.links, set(self.nodes))
+        pairs = sample_od_pairs(network, 3, bands=((1, 4),))
+        self.assertIs(sample_od_pairs(network, 3, bands=((1, 4),)), pairs)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import contextlib
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from algos import florian
+from algos.cli import main
+from algos.network import load_network
+from algos.pipeline import ArtifactStore, run_build_network, run_assign, assign_all, plan_workers, read_od_matrix
+from synthetic_gtfs import generate_gtfs
+
+
+class TestPipeline(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.gtfs_dir = os.path.join(cls.tmp.name, 'gtfs')
+        generate_gtfs(cls.gtfs_dir, n_stops=80, n_routes=6, service_hours=(7, 9), seed=5)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def setUp(self):
+        self.store = ArtifactStore(tempfile.mkdtemp(dir=self.tmp.name))
+
+    def write_od(self, name, od_matrix):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(od_matrix, f)
+        return path
+
+    def test_stages_are_skipped_when_inputs_unchanged(self):
+        first = run_build_network(self.store, self.gtfs_dir, 10 ** 6)
+        second = run_build_network(self.store, self.gtfs_dir, 10 ** 6)
+        self.assertFalse(first.cached)
+        self.assertTrue(second.cached)
+        self.assertEqual(first.key, second.key)
+        self.assertNotEqual(run_build_network(self.store, self.gtfs_dir, 500).key, first.key)
+
+        od_a = self.write_od('a.json', {'s1': {'s10': 5.0}, 's2': {'s10': 3.0}})
+        od_b = self.write_od('b.json', {'s1': {'s10': 7.0}})
+        a = run_assign(self.store, first.key, od_a)
+        self.assertTrue(run_assign(self.store, first.key, od_a).cached)
+        b = run_assign(self.store, first.key, od_b)
+        self.assertFalse(b.cached)
+        self.assertNotEqual(a.key, b.key)
+        # для florian T не влияет на результат и не меняет ключ
+        self.assertEqual(run_assign(self.store, first.key, od_a, T=30.0).key, a.key)
+        self.assertEqual(len(self.store.keys('ingest')), 2)
+
+    def test_assignment_matches_engine_and_parallel(self):
+        network = load_network(self.gtfs_dir, 10 ** 6)
+        stops = sorted(network.all_stops)
+        od_matrix = {o: {stops[0]: 10.0, stops[1]: 4.0} for o in stops[2:40]}
+        serial, n_destinations = assign_all(network, od_matrix, 'florian')
+        parallel, _ = assign_all(network, od_matrix, 'florian', workers=2)
+        self.assertEqual(n_destinations, 2)
+
+        expected = {}
+        for destination in stops[:2]:
+            od = {o: {destination: t[destination]} for o, t in od_matrix.items()}
+            strategy = florian.find_optimal_strategy(network.all_links, network.all_stops, destination)
+            volumes = florian.assign_demand(network.all_links, network.all_stops, strategy, od, destination)
+            for i, targets in volumes.links.items():
+                for j, v in targets.items():
+                    expected[i, j] = expected.get((i, j), 0.0) + v
+        self.assertGreater(sum(expected.values()), 0)
+        for (i, j), v in expected.items():
+            self.assertAlmostEqual(serial.links[i][j], v, places=9)
+        for i, targets in serial.links.items():
+            for j, v in targets.items():
+                self.assertAlmostEqual(parallel.links[i][j], v, places=9)
+
+    def test_cli_and_od_formats(self):
+        csv_path = os.path.join(self.tmp.name, 'od.csv')
+        with open(csv_path, 'w', encoding='utf-8') as f:
+            f.write("origin,destination,demand\ns1,s10,2\ns1,s10,3\ns2,s10,1\n")
+        self.assertEqual(read_od_matrix(csv_path), {'s1': {'s10': 5.0}, 's2': {'s10': 1.0}})
+
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out), contextlib.redirect_stderr(io.StringIO()):
+            main(['--store', self.store.root, 'sweep', '--gtfs-dir', self.gtfs_dir, '--od', csv_path,
+                  '--T', '30', '60'])
+            main(['--store', self.store.root, 'report', '--csv', os.path.join(self.tmp.name, 'v.csv')])
+        self.assertEqual(len(self.store.keys('assign')), 3)
+        self.assertIn('time_arrived', out.getvalue())
+        self.assertTrue(os.path.exists(os.path.join(self.tmp.name, 'v.csv')))
+
+    def test_memory_budget_limits_workers(self):
+        self.assertEqual(plan_workers(8, None, 10 * 2 ** 20), 8)
+        self.assertEqual(plan_workers(8, 1000, 100 * 2 ** 20), 2)
+        self.assertEqual(plan_workers(8, 10, 100 * 2 ** 20), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
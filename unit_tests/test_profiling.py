@@ -0,0 +1,90 @@
+import json
+import os
+import pstats
+import tempfile
+import time
+import tracemalloc
+import types
+import unittest
+from unittest import mock
+
+from profiling import StageProfiler
+
+
+def busy_loop(seconds):
+    end = time.perf_counter() + seconds
+    total = 0
+    while time.perf_counter() < end:
+        total += 1
+    return total
+
+
+class TestStageProfiler(unittest.TestCase):
+    def test_disabled(self):
+        profiler = StageProfiler(None)
+        with profiler.stage('noop'):
+            busy_loop(0.01)
+        self.assertEqual(profiler.stages, [])
+        self.assertEqual(profiler.write_summary(), [])
+
+    def test_stage_outputs(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            profiler = StageProfiler(tmp, sample_interval=0.002)
+            with profiler.stage('compute'):
+                busy_loop(0.2)
+            with profiler.stage('allocate'):
+                data = [bytes(1000) for _ in range(5000)]
+            profiler.write_summary()
+
+            self.assertEqual([r['stage'] for r in profiler.stages], ['compute', 'allocate'])
+            stats = pstats.Stats(os.path.join(tmp, '00_compute.prof'))
+            self.assertTrue(any(func[2] == 'busy_loop' for func in stats.stats))
+
+            with open(os.path.join(tmp, '00_compute.collapsed')) as f:
+                lines = f.read().splitlines()
+            self.assertTrue(any('test_profiling.py:busy_loop' in line for line in lines))
+            self.assertTrue(all(line.rsplit(' ', 1)[1].isdigit() for line in lines))
+
+            self.assertGreater(profiler.stages[1]['alloc_peak_mb'], 4.5)
+            with open(os.path.join(tmp, '01_allocate.alloc.txt')) as f:
+                self.assertIn('test_profiling.py', f.read())
+            with open(os.path.join(tmp, 'summary.json')) as f:
+                self.assertEqual(len(json.load(f)), 2)
+            self.assertEqual(len(data), 5000)
+
+    def test_memory_without_reset_peak(self):
+        # Python 3.8: в tracemalloc нет reset_peak
+        legacy = types.SimpleNamespace(**{k: v for k, v in vars(tracemalloc).items() if k != 'reset_peak'})
+        with tempfile.TemporaryDirectory() as tmp, mock.patch('profiling.tracemalloc', legacy):
+            profiler = StageProfiler(tmp)
+            with profiler.stage('allocate'):
+                data = [bytes(1000) for _ in range(5000)]
+            with profiler.stage('small'):
+                busy_loop(0.01)
+        self.assertGreater(profiler.stages[0]['alloc_peak_mb'], 4.5)
+        self.assertLess(profiler.stages[1]['alloc_peak_mb'], 1.0)
+        self.assertFalse(tracemalloc.is_tracing())
+        self.assertEqual(len(data), 5000)
+
+    def test_external_tracing_without_reset_peak(self):
+        # трассировку запустил вызывающий код: этап не должен её останавливать
+        legacy = types.SimpleNamespace(**{k: v for k, v in vars(tracemalloc).items() if k != 'reset_peak'})
+        tracemalloc.start()
+        self.addCleanup(tracemalloc.stop)
+        data = [bytes(1000) for _ in range(2000)]
+        with tempfile.TemporaryDirectory() as tmp, mock.patch('profiling.tracemalloc', legacy):
+            profiler = StageProfiler(tmp)
+            with profiler.stage('small'):
+                busy_loop(0.01)
+            self.assertTrue(tracemalloc.is_tracing())
+            # данные, выделенные до этапа, по-прежнему учитываются
+            self.assertGreater(tracemalloc.get_traced_memory()[0], 1.5 * 2 ** 20)
+            with open(os.path.join(tmp, '00_small.alloc.txt')) as f:
+                self.assertIn('peak: n/a', f.read())
+        self.assertNotIn('alloc_peak_mb', profiler.stages[0])
+        self.assertIn('alloc_current_mb', profiler.stages[0])
+        self.assertEqual(len(data), 2000)
+
+
+if __name__ == '__main__':
+    unittest.main()
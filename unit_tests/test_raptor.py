@@ -0,0 +1,85 @@
+import math
+import tempfile
+import unittest
+
+import numpy as np
+
+from algos.raptor import build_route_patterns, raptor_batch, compute_skims
+
+
+def make_stop_times(rows):
+    stop_times = {}
+    for trip_id, stop_id, seq, arr, dep in rows:
+        stop_times.setdefault(trip_id, []).append({
+            'trip_id': trip_id, 'stop_id': stop_id, 'stop_sequence': str(seq),
+            'arrival_time': arr, 'departure_time': dep,
+        })
+    return stop_times
+
+
+class TestRaptor_TwoRoutesOneTransfer(unittest.TestCase):
+    def setUp(self):
+        # Маршрут 1: A -> B -> C, маршрут 2: C -> D, маршрут 3 (медленный прямой): A -> D
+        self.stop_times = make_stop_times([
+            ('1_1', 'A', 0, '08:00:00', '08:00:00'),
+            ('1_1', 'B', 1, '08:10:00', '08:10:00'),
+            ('1_1', 'C', 2, '08:20:00', '08:20:00'),
+            ('1_2', 'A', 0, '08:30:00', '08:30:00'),
+            ('1_2', 'B', 1, '08:40:00', '08:40:00'),
+            ('1_2', 'C', 2, '08:50:00', '08:50:00'),
+            ('2_1', 'C', 0, '08:25:00', '08:25:00'),
+            ('2_1', 'D', 1, '08:35:00', '08:35:00'),
+            ('3_1', 'A', 0, '08:05:00', '08:05:00'),
+            ('3_1', 'D', 1, '09:00:00', '09:00:00'),
+        ])
+        self.active_trips = {'1_1': '1', '1_2': '1', '2_1': '2', '3_1': '3'}
+        self.patterns = build_route_patterns(self.stop_times, self.active_trips)
+
+    def test_patterns(self):
+        self.assertEqual(self.patterns.n_patterns, 3)
+        self.assertEqual(self.patterns.stop_ids, ['A', 'B', 'C', 'D'])
+        a = self.patterns.stop_index['A']
+        self.assertEqual(len(self.patterns.patterns_at_stops(np.array([a]))), 2)
+
+    def test_earliest_arrival_with_transfer(self):
+        idx = self.patterns.stop_index
+        arrival, waiting, rounds = raptor_batch(self.patterns, [idx['A']], 8 * 3600 - 120)
+
+        self.assertEqual(arrival[0, idx['D']], 8 * 3600 + 35 * 60)
+        self.assertEqual(rounds[0, idx['D']], 2)
+        # 2 минуты на остановке A и 5 минут пересадки в C
+        self.assertEqual(waiting[0, idx['D']], 7 * 60)
+        self.assertEqual(rounds[0, idx['A']], 0)
+
+    def test_round_limit(self):
+        idx = self.patterns.stop_index
+        arrival, _, rounds = raptor_batch(self.patterns, [idx['A']], 8 * 3600, max_rounds=1)
+        # без пересадок остаётся только прямой медленный рейс
+        self.assertEqual(arrival[0, idx['D']], 9 * 3600)
+        self.assertEqual(rounds[0, idx['D']], 1)
+
+    def test_unreachable(self):
+        idx = self.patterns.stop_index
+        arrival, _, rounds = raptor_batch(self.patterns, [idx['D']], 8 * 3600)
+        self.assertTrue(math.isinf(arrival[0, idx['A']]))
+        self.assertEqual(rounds[0, idx['A']], -1)
+
+    def test_skims_batches_and_workers_agree(self):
+        origins = ['A', 'B', 'C', 'D']
+        with tempfile.TemporaryDirectory() as d1, tempfile.TemporaryDirectory() as d2:
+            serial = compute_skims(self.patterns, origins, '07:58:00', d1, batch_size=4)
+            parallel = compute_skims(self.patterns, origins, '07:58:00', d2, batch_size=1, workers=2)
+
+            for name in serial:
+                self.assertEqual(serial[name].dtype, np.float32)
+                np.testing.assert_array_equal(serial[name], parallel[name])
+
+            idx = self.patterns.stop_index
+            self.assertAlmostEqual(serial['travel_time'][0, idx['D']], 37.0)
+            self.assertAlmostEqual(serial['waiting_time'][0, idx['D']], 7.0)
+            self.assertEqual(serial['transfers'][0, idx['D']], 1.0)
+            self.assertTrue(np.isinf(serial['travel_time'][3, idx['A']]))
+
+
+if __name__ == '__main__':
+    unittest.main()
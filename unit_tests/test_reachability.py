@@ -0,0 +1,58 @@
+import random
+import unittest
+
+from algos.network import Network
+from algos.reachability import ReachabilityIndex, get_reachability_index
+from utils import Link, get_all_origins_reaching_destination
+
+
+class TestReachabilityIndex(unittest.TestCase):
+    def setUp(self):
+        # Цикл A <-> B <-> C, хвост D -> A, C -> E -> F, изолированная G
+        self.links = [
+            Link("A", "B", "1", 1, 1),
+            Link("B", "C", "1", 1, 1),
+            Link("C", "A", "1", 1, 1),
+            Link("D", "A", "2", 1, 1),
+            Link("C", "E", "3", 1, 1),
+            Link("E", "F", "3", 1, 1),
+        ]
+        self.stops = {"A", "B", "C", "D", "E", "F", "G"}
+        self.index = ReachabilityIndex(self.links, self.stops)
+
+    def ids(self, idx):
+        return {self.index.node_ids[k] for k in idx}
+
+    def test_components(self):
+        # {A, B, C} сжимаются в одну компоненту
+        self.assertEqual(self.index.n_components, 5)
+
+    def test_queries(self):
+        self.assertEqual(self.ids(self.index.origins_reaching("A")), {"A", "B", "C", "D"})
+        self.assertEqual(self.ids(self.index.origins_reaching("F")), {"A", "B", "C", "D", "E", "F"})
+        self.assertEqual(self.ids(self.index.origins_reaching("G")), {"G"})
+        self.assertEqual(len(self.index.origins_reaching("unknown")), 0)
+
+    def test_batch_and_counts(self):
+        destinations = ["B", "F", "D", "C"]
+        batch = self.index.origins_reaching_many(destinations)
+        for destination, idx in zip(destinations, batch):
+            self.assertEqual(self.ids(idx), self.index.stops_reaching(destination))
+        self.assertEqual(list(self.index.count_reaching(destinations)), [len(idx) for idx in batch])
+
+    def test_matches_bfs_on_random_graph(self):
+        rng = random.Random(7)
+        nodes = [f"s{k}" for k in range(60)]
+        links = [Link(rng.choice(nodes), rng.choice(nodes), "r", 1, 1) for _ in range(90)]
+        index = ReachabilityIndex(links, set(nodes))
+        for destination in nodes:
+            self.assertEqual(index.stops_reaching(destination) - {destination},
+                             get_all_origins_reaching_destination(links, destination) - {destination})
+
+    def test_cached_on_network(self):
+        network = Network(self.links, self.stops)
+        self.assertIs(get_reachability_index(network), get_reachability_index(network))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import pickle
+import unittest
+
+from algos.network import Network
+from algos.route_index import RouteIndex, get_route_index
+from comparisons.bus_route_visualization import find_bus_route
+
+
+def make_stop_times(rows):
+    stop_times = {}
+    for trip_id, stop_id, seq, t in rows:
+        stop_times.setdefault(trip_id, []).append({
+            'trip_id': trip_id, 'stop_id': stop_id, 'stop_sequence': str(seq),
+            'arrival_time': t, 'departure_time': t,
+        })
+    return stop_times
+
+
+class TestRouteIndex(unittest.TestCase):
+    def setUp(self):
+        # Маршрут r1 (с962): два рейса A-B-C-D и укороченный рейс B-C-D; маршрут r2 (962): C-E
+        self.stop_times = make_stop_times([
+            ('t1', 'A', 1, '08:00:00'), ('t1', 'B', 2, '08:05:00'), ('t1', 'C', 3, '08:10:00'), ('t1', 'D', 4, '08:15:00'),
+            ('t2', 'B', 1, '08:20:00'), ('t2', 'C', 2, '08:25:00'), ('t2', 'D', 3, '08:30:00'),
+            ('t3', 'A', 1, '08:30:00'), ('t3', 'B', 2, '08:35:00'), ('t3', 'C', 3, '08:40:00'), ('t3', 'D', 4, '08:45:00'),
+            ('t4', 'C', 1, '08:00:00'), ('t4', 'E', 2, '08:07:00'),
+        ])
+        self.active_trips = {'t1': 'r1', 't2': 'r1', 't3': 'r1', 't4': 'r2'}
+        self.route_names = {'r1': 'с962 - Центр - Окраина', 'r2': '962 - Вокзал'}
+        self.index = RouteIndex(self.stop_times, self.active_trips, self.route_names)
+
+    def test_lookup_by_name(self):
+        self.assertEqual(self.index.find_routes('с962'), ['r1'])
+        self.assertEqual(self.index.find_routes('962'), ['r2'])  # точное совпадение номера важнее подстроки
+        self.assertEqual(self.index.find_routes('вокзал'), ['r2'])
+        self.assertEqual(self.index.find_routes('нет такого'), [])
+
+    def test_canonical_pattern_and_trips(self):
+        self.assertEqual(self.index.stops_of_route('r1'), ['A', 'B', 'C', 'D'])
+        self.assertEqual(self.index.stops_of_route('с962', pattern=1), ['B', 'C', 'D'])
+        self.assertEqual(self.index.trips_of_route('с962'), ['t1', 't2', 't3'])
+        self.assertEqual(self.index.terminals('962'), ('C', 'E'))
+
+    def test_routes_serving(self):
+        self.assertEqual(self.index.routes_serving('C'), ['r1', 'r2'])
+        self.assertEqual(self.index.routes_serving('A'), ['r1'])
+        self.assertEqual(self.index.routes_serving('Z'), [])
+
+    def test_stored_in_network_snapshot(self):
+        network = Network([], {'A', 'B', 'C', 'D', 'E'}, route_names=self.route_names)
+        with self.assertRaises(ValueError):
+            get_route_index(network)
+        network.indexes['route_index'] = self.index
+        restored = pickle.loads(pickle.dumps(network))
+        self.assertEqual(get_route_index(restored).stops_of_route('с962'), ['A', 'B', 'C', 'D'])
+
+    def test_find_bus_route(self):
+        origin, destination = find_bus_route('с962', self.active_trips, None, None, self.route_names, [],
+                                             route_index=self.index)
+        self.assertEqual((origin, destination), ('A', 'D'))
+        # без готового индекса он строится по stop_times
+        self.assertEqual(find_bus_route('с962', self.active_trips, self.stop_times, None, self.route_names, []),
+                         ('A', 'D'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from algos import florian, pipeline
+from algos.network import Network, save_network
+from algos.pipeline import ArtifactStore, assign_all, run_assign
+from algos.selected_link import SELECTED_LINK_FILE, SelectedLinkIndex, SelectedLinkIndexBuilder, get_link_table
+from utils import Link
+
+
+class Crash(Exception):
+    pass
+
+
+class TestSelectedLinkIndex(unittest.TestCase):
+    def setUp(self):
+        # из A в C две стратегии: через B (линия 1) и через D (линии 4 и 2); ветка C -> E
+        self.network = Network([
+            Link("A", "B", "1", travel_cost=5, headway=10),
+            Link("B", "C", "1", travel_cost=5, headway=10),
+            Link("D", "C", "2", travel_cost=7, headway=6),
+            Link("C", "E", "3", travel_cost=4, headway=8),
+            Link("A", "D", "4", travel_cost=3, headway=12),
+        ], {"A", "B", "C", "D", "E"})
+        self.od_matrix = {"A": {"C": 10.0, "E": 5.0, "B": 2.0}, "D": {"C": 3.0, "E": 1.0}, "B": {"E": 4.0}}
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def build_index(self, **kwargs):
+        builder = SelectedLinkIndexBuilder(get_link_table(self.network))
+        volumes, _ = assign_all(self.network, self.od_matrix, index=builder, **kwargs)
+        return builder.build(), volumes
+
+    def single_od_volumes(self, origin, destination):
+        od = {origin: {destination: self.od_matrix[origin][destination]}}
+        return florian.compute_sf(self.network.all_links, self.network.all_stops, destination, od).volumes
+
+    def test_queries_match_single_pair_assignments(self):
+        index, volumes = self.build_index()
+        path = os.path.join(self.tmp.name, SELECTED_LINK_FILE)
+        index.save(path)
+        index = SelectedLinkIndex.load(path)
+        self.assertEqual(index.destinations, ['B', 'C', 'E'])
+
+        for i, j in [("A", "B"), ("B", "C"), ("D", "C"), ("C", "E"), ("A", "D")]:
+            through = index.destinations_through(i, j)
+            self.assertAlmostEqual(sum(through.values()), volumes.links[i][j], places=4)
+            flows = index.od_through(i, j)
+            for destination, v in through.items():
+                self.assertAlmostEqual(sum(f for (_, d), f in flows.items() if d == destination), v, places=4)
+            for (origin, destination), flow in flows.items():
+                self.assertAlmostEqual(flow, self.single_od_volumes(origin, destination).links[i][j], places=4)
+
+        for origin, targets in self.od_matrix.items():
+            for destination in targets:
+                expected = self.single_od_volumes(origin, destination)
+                links = index.od_links(origin, destination)
+                for i, row in expected.links.items():
+                    for j, v in row.items():
+                        self.assertAlmostEqual(links.get((i, j), 0.0), v, places=4)
+
+        zone = index.zone_links(["C", "E", "unknown"])
+        for (i, j), v in zone.items():
+            self.assertAlmostEqual(v, sum(index.destinations_through(i, j).get(d, 0.0) for d in ("C", "E")), places=4)
+        self.assertEqual(index.od_links("E", "C"), {})
+        with self.assertRaises(ValueError):
+            index.od_through("B", "A")
+
+    def test_resume_restores_index_records(self):
+        expected, _ = self.build_index()
+        checkpoint_dir = os.path.join(self.tmp.name, 'partial')
+        original = pipeline._assign_destination
+        calls = []
+
+        def crash_on_third(destination, *args, **kwargs):
+            calls.append(destination)
+            if len(calls) == 3:
+                raise Crash()
+            return original(destination, *args, **kwargs)
+
+        with mock.patch.object(pipeline, '_assign_destination', crash_on_third):
+            with self.assertRaises(Crash):
+                self.build_index(checkpoint_dir=checkpoint_dir, checkpoint_interval=0)
+        with mock.patch.object(pipeline, '_assign_destination', original):
+            resumed, _ = self.build_index(checkpoint_dir=checkpoint_dir, resume=True)
+        self.assertEqual(resumed.destinations, expected.destinations)
+        self.assertEqual(sorted(resumed.od_through("A", "D").items()), sorted(expected.od_through("A", "D").items()))
+
+    def test_fresh_run_discards_old_chunks(self):
+        expected, _ = self.build_index()
+        checkpoint_dir = os.path.join(self.tmp.name, 'partial')
+        old_od = {o: {d: 2 * v for d, v in targets.items()} for o, targets in self.od_matrix.items()}
+        builder = SelectedLinkIndexBuilder(get_link_table(self.network))
+        assign_all(self.network, old_od, index=builder, checkpoint_dir=checkpoint_dir, checkpoint_interval=0)
+        # записи прошлого расчёта с большим номером не должны перекрыть новые
+        os.replace(os.path.join(checkpoint_dir, 'selected_link_00000000.npz'),
+                   os.path.join(checkpoint_dir, 'selected_link_00000099.npz'))
+
+        self.build_index(checkpoint_dir=checkpoint_dir, checkpoint_interval=0)
+        self.assertNotIn('selected_link_00000099.npz', os.listdir(checkpoint_dir))
+        restored = SelectedLinkIndexBuilder(get_link_table(self.network))
+        restored.restore(checkpoint_dir, ['B', 'C', 'E'])
+        self.assertEqual(sorted(restored.build().od_through("A", "D").items()),
+                         sorted(expected.od_through("A", "D").items()))
+
+    def test_run_assign_writes_index(self):
+        store = ArtifactStore(os.path.join(self.tmp.name, 'store'))
+        network_key = 'net'
+        os.makedirs(os.path.dirname(store.path('network', network_key)))
+        save_network(self.network, store.path('network', network_key))
+        od_path = os.path.join(self.tmp.name, 'od.csv')
+        with open(od_path, 'w', encoding='utf-8') as f:
+            f.write("origin,destination,demand\n")
+            for origin, targets in self.od_matrix.items():
+                for destination, demand in targets.items():
+                    f.write(f"{origin},{destination},{demand}\n")
+
+        plain = run_assign(store, network_key, od_path)
+        self.assertFalse(os.path.exists(store.path('assign', plain.key, SELECTED_LINK_FILE)))
+        # без индекса артефакт не подходит, с индексом — берётся из кэша
+        indexed = run_assign(store, network_key, od_path, selected_link=True)
+        self.assertFalse(indexed.cached)
+        self.assertEqual(indexed.key, plain.key)
+        self.assertTrue(run_assign(store, network_key, od_path, selected_link=True).cached)
+        index = SelectedLinkIndex.load(store.path('assign', plain.key, SELECTED_LINK_FILE))
+        self.assertAlmostEqual(sum(index.od_through("C", "E").values()), indexed.value.links["C"]["E"], places=4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+import os
+import tempfile
+import unittest
+
+from algos import florian
+from algos.network import Network, load_network
+from algos.sensitivity import StrategySensitivity, by_route, total_time_gradient
+from synthetic_gtfs import generate_gtfs
+from utils import Link
+
+
+def perturbed(links, target, field, delta):
+    """Копия списка рёбер, где у ребра target поле field изменено на delta."""
+    result = []
+    for a in links:
+        if a is target:
+            a = Link(a.from_node, a.to_node, a.route_id, a.travel_cost, a.headway)
+            setattr(a, field, getattr(a, field) + delta)
+        result.append(a)
+    return result
+
+
+class SensitivityCase:
+    """Сверка аналитических производных с центральными разностями на сети self.network."""
+    eps = 1e-5
+
+    def assign(self, links, destination):
+        strategy = florian.find_optimal_strategy(links, self.network.all_stops, destination)
+        volumes = florian.assign_demand(links, self.network.all_stops, strategy, self.od_matrix, destination)
+        return strategy, volumes
+
+    def finite_difference(self, link, field, destination, measure):
+        h = self.eps * max(1.0, abs(getattr(link, field)))
+        plus = measure(*self.assign(perturbed(self.network.all_links, link, field, h), destination))
+        minus = measure(*self.assign(perturbed(self.network.all_links, link, field, -h), destination))
+        return (plus - minus) / (2 * h)
+
+    def assert_close(self, analytic, numeric):
+        self.assertAlmostEqual(analytic, numeric, delta=1e-4 * max(1.0, abs(numeric)))
+
+    def check_destination(self, destination, origin, node):
+        strategy, _ = self.assign(self.network.all_links, destination)
+        sensitivity = StrategySensitivity(strategy, self.od_matrix, destination)
+        demand = sensitivity.demand
+
+        def total_time(s, v):
+            return sum(g * s.labels[o] for o, g in demand.items() if s.labels[o] < float('inf'))
+
+        label_cost, label_headway = sensitivity.label_gradient(origin)
+        total_cost, total_headway = sensitivity.total_time_gradient()
+        into_node = {(a.from_node, a.to_node): 1.0 for a in self.network.all_links if a.to_node == node}
+        node_headway = sensitivity.volume_gradient(into_node)
+        links = [a for a in strategy.a_set if a.headway > 0][:self.max_links]
+        self.assertTrue(links)
+        for link in links:
+            self.assert_close(label_cost.get(link, 0.0),
+                              self.finite_difference(link, 'travel_cost', destination, lambda s, v: s.labels[origin]))
+            self.assert_close(label_headway.get(link, 0.0),
+                              self.finite_difference(link, 'headway', destination, lambda s, v: s.labels[origin]))
+            self.assert_close(total_cost[link], self.finite_difference(link, 'travel_cost', destination, total_time))
+            self.assert_close(total_headway[link], self.finite_difference(link, 'headway', destination, total_time))
+            self.assert_close(node_headway[link],
+                              self.finite_difference(link, 'headway', destination, lambda s, v: v.nodes[node]))
+            # прямой проход даёт ту же производную, что и обратный
+            forward = sensitivity.volume_derivatives(link)
+            self.assert_close(sum(d for a, d in forward.items() if a.to_node == node), node_headway[link])
+
+
+class TestSensitivitySmallNetwork(SensitivityCase, unittest.TestCase):
+    max_links = 10
+
+    def setUp(self):
+        self.network = Network([
+            Link("A", "B", "1", travel_cost=5, headway=10),
+            Link("B", "C", "1", travel_cost=5, headway=10),
+            Link("A", "C", "2", travel_cost=12, headway=15),
+            Link("D", "C", "3", travel_cost=7, headway=6),
+            Link("A", "D", "4", travel_cost=3, headway=12),
+            Link("B", "D", "5", travel_cost=1, headway=20),
+        ], {"A", "B", "C", "D"})
+        self.od_matrix = {"A": {"C": 10.0}, "B": {"C": 4.0}, "D": {"C": 2.0}}
+
+    def test_against_finite_differences(self):
+        self.check_destination("C", "A", "D")
+
+    def test_route_totals(self):
+        _, d_cost, d_headway = total_time_gradient(self.network, self.od_matrix)
+        routes = by_route(d_headway)
+        self.assertAlmostEqual(routes["1"], sum(v for a, v in d_headway.items() if a.route_id == "1"))
+        # dJ/dc — объём ребра; увеличение интервала не уменьшает суммарное время
+        sensitivity = StrategySensitivity(florian.find_optimal_strategy(self.network.all_links, self.network.all_stops, "C"),
+                                          self.od_matrix, "C")
+        for a, v in sensitivity.volumes().items():
+            self.assertAlmostEqual(d_cost[a], v)
+        self.assertTrue(all(v >= 0 for v in d_headway.values()))
+
+
+class TestSensitivitySyntheticGTFS(SensitivityCase, unittest.TestCase):
+    max_links = 6
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        gtfs_dir = os.path.join(cls.tmp.name, 'gtfs')
+        generate_gtfs(gtfs_dir, n_stops=40, n_routes=5, service_hours=(7, 8), seed=4)
+        cls.network = load_network(gtfs_dir, 10 ** 6)
+        stops = sorted(cls.network.all_stops)
+        cls.destination = stops[0]
+        cls.od_matrix = {o: {cls.destination: 1.0 + k % 3} for k, o in enumerate(stops[1:])}
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def test_against_finite_differences(self):
+        strategy, volumes = self.assign(self.network.all_links, self.destination)
+        # самый дальний достижимый источник и самый загруженный промежуточный узел
+        origin = max((o for o in self.od_matrix if strategy.labels[o] < float('inf')), key=strategy.labels.get)
+        node = max((s for s in volumes.nodes if s != self.destination), key=volumes.nodes.get)
+        self.check_destination(self.destination, origin, node)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import asyncio
+import json
+import math
+import unittest
+
+from algos.network import Network
+from algos.server import QueryServer
+from algos.time_arrived_florian import find_optimal_strategy
+from utils import Link, normal_cdf
+
+
+async def http_get(port, target):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(f"GET {target} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n".encode())
+    await writer.drain()
+    raw = await reader.read()
+    writer.close()
+    head, _, body = raw.partition(b'\r\n\r\n')
+    return int(head.split()[1]), json.loads(body)
+
+
+class TestQueryServer(unittest.TestCase):
+    def setUp(self):
+        # A -> B -> D и A -> C -> D, плюс пересадка B -> C
+        self.links = [
+            Link("A", "B", "1", travel_cost=10, headway=10),
+            Link("B", "D", "1", travel_cost=10, headway=10),
+            Link("A", "C", "2", travel_cost=5, headway=20),
+            Link("C", "D", "2", travel_cost=20, headway=20),
+            Link("B", "C", "3", travel_cost=3, headway=6),
+        ]
+        self.network = Network(self.links, {"A", "B", "C", "D"})
+
+    def run_server(self, scenario):
+        async def main():
+            server = QueryServer(self.network, workers=1)
+            _, port = await server.start(port=0)
+            try:
+                return await scenario(server, port)
+            finally:
+                await server.close()
+        return asyncio.run(main())
+
+    def test_coalescing_and_cache(self):
+        async def scenario(server, port):
+            first = await asyncio.gather(*(http_get(port, '/volumes?destination=D') for _ in range(5)))
+            second = await http_get(port, '/volumes?destination=D')
+            return first, second, server.metrics()
+
+        first, second, metrics = self.run_server(scenario)
+        self.assertEqual(metrics['computed'], 1)
+        self.assertEqual(metrics['coalesced'] + metrics['cache_hits'], 5)
+        self.assertGreaterEqual(metrics['cache_hits'], 1)
+        self.assertTrue(all(status == 200 and body == second[1] for status, body in first))
+        # спрос 1 из каждой остановки, откуда достижима D
+        self.assertEqual(second[1]['n_origins'], 3)
+        self.assertAlmostEqual(second[1]['nodes']['D'], 3.0, places=6)
+        self.assertEqual(metrics['latency']['/volumes']['count'], 6)
+
+    def test_strategy_shared_between_kinds(self):
+        async def scenario(server, port):
+            results = await asyncio.gather(
+                server.query('strategy', {'destination': 'D'}),
+                server.query('volumes', {'destination': 'D'}),
+                server.query('strategy', {'destination': 'D', 'engine': 'time_arrived', 'T': '45'}),
+                server.query('reliability', {'destination': 'D', 'T': '45'}))
+            return results, server.metrics()
+
+        (strategy, volumes, _, reliability), metrics = self.run_server(scenario)
+        self.assertEqual((metrics['strategies_computed'], metrics['strategies_shared']), (2, 2))
+        self.assertEqual(metrics['computed'], 4)
+        self.assertEqual(strategy['engine'], 'florian')
+        self.assertAlmostEqual(volumes['nodes']['D'], 3.0, places=6)
+        self.assertIn('A', reliability['reliability'])
+
+    def test_reliability_matches_engine(self):
+        async def scenario(server, port):
+            return await http_get(port, '/reliability?destination=D&T=40&origin=A')
+
+        status, body = self.run_server(scenario)
+        self.assertEqual(status, 200)
+        mean, var = find_optimal_strategy(self.links, self.network.all_stops, "D", T=40).labels["A"]
+        self.assertAlmostEqual(body['mean'], mean, places=9)
+        self.assertAlmostEqual(body['R'], normal_cdf(40 - mean, scale=math.sqrt(var)), places=9)
+
+    def test_errors(self):
+        async def scenario(server, port):
+            return [await http_get(port, target) for target in (
+                '/strategy?destination=Z', '/strategy?destination=D&engine=raptor',
+                '/volumes?destination=D&demand=x', '/nope', '/health')]
+
+        (s1, _), (s2, _), (s3, _), (s4, _), (s5, health) = self.run_server(scenario)
+        self.assertEqual((s1, s2, s3, s4, s5), (404, 400, 400, 404, 200))
+        self.assertEqual(health['stops'], 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+
+from algos import florian, time_arrived_florian
+from algos.simplify import simplify_network, od_destinations
+from utils import Link
+
+
+class TestSimplify_LongRouteWithDeadEnds(unittest.TestCase):
+    def setUp(self):
+        # Маршрут 1 идёт O -> P1 -> P2 -> Q -> D, маршрут 2 — прямой O -> D,
+        # маршрут 5 подвозит в Q из W, X -> Y — тупик, из которого нельзя доехать до D
+        self.links = [
+            Link("O", "P1", "1", 4, 10, std_travel_time=1.0),
+            Link("P1", "P2", "1", 5, 10, std_travel_time=2.0),
+            Link("P2", "Q", "1", 3, 10),
+            Link("Q", "D", "1", 6, 10),
+            Link("O", "D", "2", 40, 15),
+            Link("W", "Q", "5", 3, 10),
+            Link("O", "X", "4", 2, 5),
+            Link("X", "Y", "4", 2, 5),
+        ]
+        self.stops = {"O", "P1", "P2", "Q", "D", "W", "X", "Y"}
+        self.od_matrix = {"O": {"D": 100}}
+        self.destination = "D"
+        self.simplified = simplify_network(self.links, self.stops, od_destinations(self.od_matrix),
+                                           keep_nodes=self.od_matrix.keys())
+
+    def test_structure(self):
+        self.assertEqual(self.simplified.contracted_nodes, {"P1", "P2"})
+        self.assertEqual(self.simplified.pruned_nodes, {"X", "Y"})
+        self.assertEqual(self.simplified.all_stops, {"O", "Q", "D", "W"})
+        self.assertEqual(len(self.simplified.all_links), 4)
+
+        composite = [l for l in self.simplified.all_links if (l.from_node, l.to_node) == ("O", "Q") and l.route_id == "1"][0]
+        # 4 + 5 + 3 в пути и два ожидания по 10 в транзитных остановках
+        self.assertAlmostEqual(composite.travel_cost, 32)
+        self.assertAlmostEqual(composite.travel_variance, 1 + 4 + 20)
+        self.assertEqual(composite.headway, 10)
+
+    def test_same_labels_florian(self):
+        full = florian.find_optimal_strategy(self.links, self.stops, self.destination)
+        small = florian.find_optimal_strategy(self.simplified.all_links, self.simplified.all_stops, self.destination)
+        for node in self.simplified.all_stops:
+            self.assertAlmostEqual(full.labels[node], small.labels[node], places=6)
+
+    def test_same_labels_time_arrived(self):
+        for T in (30, 45, 60):
+            full = time_arrived_florian.find_optimal_strategy(self.links, self.stops, self.destination, T)
+            small = time_arrived_florian.find_optimal_strategy(self.simplified.all_links, self.simplified.all_stops,
+                                                               self.destination, T)
+            for node in self.simplified.all_stops:
+                self.assertAlmostEqual(full.labels[node][0], small.labels[node][0], places=6)
+                self.assertAlmostEqual(full.labels[node][1], small.labels[node][1], places=6)
+
+    def test_expanded_volumes_match(self):
+        full = florian.compute_sf(self.links, self.stops, self.destination, self.od_matrix).volumes
+        small = florian.compute_sf(self.simplified.all_links, self.simplified.all_stops,
+                                   self.destination, self.od_matrix).volumes
+        expanded = self.simplified.expand_volumes(small)
+
+        for from_node in full.links:
+            for to_node, v in full.links[from_node].items():
+                self.assertAlmostEqual(expanded.links[from_node][to_node], v, places=5)
+        for node in self.stops:
+            self.assertAlmostEqual(expanded.nodes[node], full.nodes[node], places=5)
+
+    def test_parallel_chain_not_contracted(self):
+        links = self.links + [Link("O", "Q", "6", 40, 30)]
+        simplified = simplify_network(links, self.stops, {"D"}, keep_nodes={"O"})
+        self.assertEqual(simplified.contracted_nodes, set())
+        self.assertIn("P1", simplified.all_stops)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import math
+import unittest
+
+import numpy as np
+
+from algos import time_arrived_florian
+from algos.network import Network
+from algos.simulation import PassengerSimulator, simulate, wilson_interval
+from utils import Link, Strategy
+
+
+class TestSimulation(unittest.TestCase):
+    def setUp(self):
+        # из A в D: общие линии 1 и 2 до B, затем 3 или пересадка через C; E недостижим
+        self.network = Network([
+            Link("A", "B", "1", travel_cost=6, headway=6, std_travel_time=2),
+            Link("A", "B", "2", travel_cost=7, headway=12, std_travel_time=1),
+            Link("B", "D", "3", travel_cost=20, headway=10, std_travel_time=4),
+            Link("B", "C", "4", travel_cost=5, headway=4, std_travel_time=1),
+            Link("C", "D", "5", travel_cost=14, headway=5, std_travel_time=3),
+            Link("D", "E", "6", travel_cost=3, headway=5),
+        ], {"A", "B", "C", "D", "E"})
+        self.od_matrix = {"A": {"D": 300.0}, "B": {"D": 100.0}, "E": {"D": 50.0}}
+
+    def test_wilson_interval(self):
+        low, high = wilson_interval([0, 5, 10, 0], [10, 10, 10, 0])
+        self.assertAlmostEqual(low[0], 0.0)
+        self.assertAlmostEqual(high[0], 0.2775, places=4)
+        self.assertAlmostEqual(low[1], 1 - high[1])
+        self.assertAlmostEqual(high[2], 1.0)
+        self.assertEqual((low[3], high[3]), (0.0, 1.0))
+
+    def test_matches_engine_moments_and_loads(self):
+        T = 40.0
+        result = simulate(self.network, self.od_matrix, 400000, T, seed=3)
+        self.assertEqual(result.n_passengers, 400000)
+        strategy = time_arrived_florian.find_optimal_strategy(self.network.all_links, self.network.all_stops, "D", T)
+        for origin in ("A", "B"):
+            row = result.od[origin, "D"]
+            mean, var = strategy.labels[origin]
+            self.assertEqual(row['analytic_mean'], mean)
+            # среднее и дисперсия времени совпадают с метками движка точно, отличается только форма
+            self.assertAlmostEqual(row['mean_time'], mean, delta=5 * math.sqrt(var / row['passengers']))
+            self.assertLessEqual(row['R_low'], row['R'])
+            self.assertLessEqual(row['R'], row['R_high'])
+            self.assertAlmostEqual(row['R'], row['R_analytic'], delta=0.05)
+        self.assertEqual(result.od["E", "D"]['on_time'], 0)
+        self.assertEqual(result.od["E", "D"]['R_analytic'], 0.0)
+
+        for row in result.links.values():
+            self.assertLessEqual(row['low'], row['analytic'])
+            self.assertLessEqual(row['analytic'], row['high'])
+        self.assertAlmostEqual(sum(row['analytic'] for a, row in result.links.items() if a.to_node == "D"), 400.0)
+
+    def test_frequency_split_and_wait_models(self):
+        # стратегия задана вручную: из A в B общие линии 1 и 2, доли 2:1 по частотам
+        line1, line2, line3 = self.network.all_links[:3]
+        strategy = Strategy({"D": (0.0, 0.0), "B": (30.0, 26.0), "A": (42.0, 30.0)}, {}, [line1, line2, line3])
+        rng = np.random.default_rng(0)
+        means = {}
+        for wait in ('model', 'exponential', 'uniform'):
+            simulator = PassengerSimulator(strategy, "D", wait=wait)
+            elapsed, counts = simulator.run(np.full(300000, simulator.node_pos["A"]), rng)
+            self.assertTrue(np.isfinite(elapsed).all())
+            self.assertEqual(counts[0] + counts[1], 300000)
+            self.assertEqual(counts[2], 300000)
+            self.assertAlmostEqual(counts[0] / 300000, 2 / 3, delta=0.005)
+            means[wait] = elapsed.mean()
+        # у всех моделей ожидания то же среднее: (2 * (6 + 6) + (12 + 7)) / 3 + (10 + 20)
+        for mean in means.values():
+            self.assertAlmostEqual(mean, 43 / 3 + 30, delta=0.1)
+        self.assertEqual(simulator.analytic_loads({"A": 30.0}).tolist(), [20.0, 10.0, 30.0])
+        with self.assertRaises(ValueError):
+            PassengerSimulator(strategy, "D", wait='poisson')
+
+
+if __name__ == '__main__':
+    unittest.main()
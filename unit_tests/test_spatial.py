@@ -0,0 +1,85 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from algos.network import Network, save_network, read_network
+from algos.spatial import StopIndex, get_stop_index, get_walking_links, WALK_ROUTE_ID
+from utils import Link, WALK_SPEED_M_PER_MIN, project_coords
+
+
+class TestStopIndex(unittest.TestCase):
+    def setUp(self):
+        # A и B ~111 м друг от друга, C ~1.1 км от A
+        self.coords = {
+            "A": (55.7500, 37.6000),
+            "B": (55.7510, 37.6000),
+            "C": (55.7600, 37.6000),
+        }
+        self.index = StopIndex(self.coords)
+
+    def brute_force_pairs(self, radius_m):
+        ids = sorted(self.coords)
+        x, y = project_coords([self.coords[s][0] for s in ids], [self.coords[s][1] for s in ids])
+        pairs = set()
+        for i in range(len(ids)):
+            for j in range(i + 1, len(ids)):
+                if np.hypot(x[i] - x[j], y[i] - y[j]) <= radius_m:
+                    pairs.add((ids[i], ids[j]))
+        return pairs
+
+    def test_walking_links_within_radius(self):
+        links = self.index.walking_links(radius_m=300)
+        self.assertEqual({(l.from_node, l.to_node) for l in links}, {("A", "B"), ("B", "A")})
+        for link in links:
+            self.assertEqual(link.route_id, WALK_ROUTE_ID)
+            self.assertEqual(link.headway, 0.0)
+            self.assertGreater(link.travel_cost, 111 / WALK_SPEED_M_PER_MIN)
+            self.assertLess(link.travel_cost, 2 * 111 / WALK_SPEED_M_PER_MIN)
+
+    def test_walking_pairs_match_brute_force(self):
+        for radius in (50, 300, 1200, 5000):
+            pairs, _ = self.index.walking_pairs(radius)
+            found = {tuple(sorted((self.index.stop_ids[i], self.index.stop_ids[j]))) for i, j in pairs.tolist()}
+            self.assertEqual(found, self.brute_force_pairs(radius))
+
+    def test_snap(self):
+        stops, dists = self.index.snap([55.7501, 55.7599], [37.6000, 37.6001])
+        self.assertEqual(stops, ["A", "C"])
+        self.assertTrue(np.all(dists < 20))
+
+        stops, dists = self.index.snap([55.9], [37.6], max_distance_m=500)
+        self.assertEqual(stops, [None])
+        self.assertTrue(np.isinf(dists[0]))
+
+        stops, _ = self.index.snap([55.7500], [37.6000], k=2)
+        self.assertEqual(stops, [["A", "B"]])
+
+    def test_stops_within(self):
+        self.assertEqual(self.index.stops_within(55.7500, 37.6000, 200), ["A", "B"])
+
+
+class TestNetworkCache(unittest.TestCase):
+    def test_index_built_once_and_persisted(self):
+        network = Network([Link("A", "C", "1", 10, 5)], {"A", "B", "C"},
+                          stop_coords={"A": (55.75, 37.6), "B": (55.751, 37.6), "C": (55.76, 37.6)})
+        index = get_stop_index(network)
+        self.assertIs(get_stop_index(network), index)
+        walking = get_walking_links(network, 300)
+        self.assertIs(get_walking_links(network, 300), walking)
+        self.assertEqual(len(walking), 2)
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, 'network.pkl')
+            save_network(network, path)
+            loaded = read_network(path)
+
+        self.assertIn('stop_index', loaded.indexes)
+        stops, _ = get_stop_index(loaded).snap([55.7501], [37.6])
+        self.assertEqual(stops, ["A"])
+        self.assertEqual(len(get_walking_links(loaded, 300)), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import csv
+import filecmp
+import os
+import tempfile
+import unittest
+
+from synthetic_gtfs import generate_gtfs
+from utils import parse_gtfs_limited, calculate_links, calculate_headways, parse_stop_coords
+
+FILES = ('agency.txt', 'stops.txt', 'routes.txt', 'trips.txt', 'stop_times.txt', 'calendar.txt')
+
+
+class TestSyntheticGTFS(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def path(self, name):
+        return os.path.join(self.tmp.name, name)
+
+    def test_deterministic_by_seed(self):
+        generate_gtfs(self.path('a'), n_stops=150, n_routes=8, seed=7)
+        generate_gtfs(self.path('b'), n_stops=150, n_routes=8, seed=7)
+        generate_gtfs(self.path('c'), n_stops=150, n_routes=8, seed=8)
+        for name in FILES:
+            self.assertTrue(filecmp.cmp(self.path(f'a/{name}'), self.path(f'b/{name}'), shallow=False), name)
+        self.assertFalse(filecmp.cmp(self.path('a/stop_times.txt'), self.path('c/stop_times.txt'), shallow=False))
+
+    def test_real_ingest_path(self):
+        for topology in ('grid', 'radial'):
+            directory = self.path(topology)
+            summary = generate_gtfs(directory, topology=topology, n_stops=120, n_routes=6, seed=1)
+            self.assertEqual(summary['n_stops'], 120)
+            self.assertEqual(summary['n_routes'], 6)
+
+            stop_times, active_trips, all_stops, stop_names, route_names = parse_gtfs_limited(directory, limit=10 ** 9)
+            self.assertEqual(len(all_stops), 120)
+            self.assertEqual(len(active_trips), summary['n_trips'])
+            self.assertEqual(sum(len(times) for times in stop_times.values()), summary['n_stop_times'])
+            self.assertEqual(len(parse_stop_coords(directory)), 120)
+
+            all_links = calculate_headways(stop_times, active_trips, calculate_links(stop_times, active_trips, all_stops))
+            self.assertEqual(len(all_links), summary['n_stop_times'] - summary['n_trips'])
+            self.assertTrue(all(link.travel_cost > 0 for link in all_links))
+            # calculate_headways сливает отправления обоих направлений маршрута с остановки
+            self.assertTrue(all(0 < link.headway <= 20.5 for link in all_links))
+
+    def test_target_stop_times(self):
+        summary = generate_gtfs(self.path('t'), n_stops=400, n_routes=20, target_stop_times=50000, seed=3)
+        self.assertAlmostEqual(summary['n_stop_times'] / 50000, 1.0, delta=0.1)
+        with open(self.path('t/trips.txt'), encoding='utf-8') as f:
+            directions = {row['direction_id'] for row in csv.DictReader(f)}
+        self.assertEqual(directions, {'0', '1'})
+
+    def test_unknown_topology(self):
+        with self.assertRaises(ValueError):
+            generate_gtfs(self.path('x'), topology='hexagonal')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,9 +4,14 @@ import networkx as nx
 import tempfile
 import os
 import csv
+from unittest import mock
 from algos.florian import compute_sf as florian_compute_sf, parse_gtfs as florian_parse_gtfs
 from algos.time_arrived_florian import compute_sf as ta_compute_sf, parse_gtfs as ta_parse_gtfs
-from utils import Link
+from algos.network import Network
+from utils import Link, Volumes, parse_stop_coords
+import numpy as np
+from visualization import get_geo_layout, visualize_volumes_geo, rasterize_segments, render_heatmap_tiles, render_heatmap
+from visualization import _heatmap_values
 
 
 class TestVisualization(unittest.TestCase):
@@ -245,6 +250,91 @@ class TestVisualization(unittest.TestCase):
             
             self.assertTrue(os.path.exists(filename))
 
+    def test_geo_layout_and_rendering(self):
+        """Тест карты объёмов в географических координатах"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            self.create_simple_gtfs_data(temp_dir)
+            all_links, all_stops = florian_parse_gtfs(temp_dir, limit=100)
+            network = Network(all_links, all_stops, stop_coords=parse_stop_coords(temp_dir))
+
+            layout = get_geo_layout(network)
+            self.assertIs(get_geo_layout(network), layout)
+            self.assertEqual(layout.segments.shape, (len(all_links), 2, 2))
+
+            od_matrix = {"A": {"D": 100}}
+            original = florian_compute_sf(all_links, all_stops, "D", od_matrix)
+            modified = ta_compute_sf(all_links, all_stops, "D", od_matrix, T=30)
+
+            values = layout.link_values(original.volumes)
+            for k, (f, t) in enumerate(zip(layout.link_from, layout.link_to)):
+                self.assertAlmostEqual(values[k], original.volumes.links[f][t])
+
+            volumes_file = visualize_volumes_geo(layout, original.volumes,
+                                                 os.path.join(temp_dir, "map", "volumes.png"),
+                                                 destination="D", origins=["A"], top_n_labels=2)
+            diff_file = visualize_volumes_geo(layout, original.volumes, os.path.join(temp_dir, "diff.png"),
+                                              volumes_mod=modified.volumes, destination="D")
+            self.assertTrue(os.path.exists(volumes_file))
+            self.assertTrue(os.path.exists(diff_file))
+
+    def test_rasterize_segments(self):
+        """Растеризация: каждый пиксель вдоль отрезка получает значение ровно один раз"""
+        segments = np.array([[[0.5, 5.5], [9.5, 5.5]],     # горизонталь y = 5.5
+                             [[0.5, 0.5], [9.5, 9.5]]])    # диагональ
+        grid = rasterize_segments(segments, np.array([2.0, 3.0]), (0, 10, 0, 10), 10, 10, max_samples=7)
+
+        self.assertEqual(grid.shape, (10, 10))
+        np.testing.assert_allclose(grid[4], [2.0] * 5 + [5.0] + [2.0] * 4)  # строка 4 сверху — y в [5, 6)
+        self.assertAlmostEqual(grid.sum(), 2.0 * 10 + 3.0 * 10)
+        self.assertEqual(rasterize_segments(segments, np.ones(2), (100, 110, 100, 110), 10, 10).sum(), 0)
+
+    def test_heatmap_tiles(self):
+        """Тайлы карты плотности и карты разности"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            self.create_simple_gtfs_data(temp_dir)
+            all_links, all_stops = florian_parse_gtfs(temp_dir, limit=100)
+            layout = get_geo_layout(Network(all_links, all_stops, stop_coords=parse_stop_coords(temp_dir)))
+
+            od_matrix = {"A": {"D": 100}}
+            original = florian_compute_sf(all_links, all_stops, "D", od_matrix)
+            modified = {f: dict(to) for f, to in original.volumes.links.items()}
+            modified["A"]["C"] += 40.0
+            modified["A"]["B"] -= 40.0
+
+            tiles = render_heatmap_tiles(layout, original.volumes, os.path.join(temp_dir, "tiles"),
+                                         zoom_levels=(0, 1, 2), tile_size=64)
+            self.assertIn(os.path.join(temp_dir, "tiles", "0", "0", "0.png"), tiles)
+            self.assertTrue(all(os.path.exists(p) for p in tiles))
+            self.assertEqual(plt.imread(tiles[0]).shape, (64, 64, 4))
+
+            diff_tiles = render_heatmap_tiles(layout, original.volumes, os.path.join(temp_dir, "diff"),
+                                              volumes_mod=Volumes(modified, original.volumes.nodes),
+                                              zoom_levels=(0,), tile_size=64)
+            self.assertEqual(len(diff_tiles), 1)
+            # разность — original - modified
+            diff = _heatmap_values(layout, original.volumes, Volumes(modified, original.volumes.nodes))
+            pairs = list(zip(layout.link_from, layout.link_to))
+            self.assertAlmostEqual(diff[pairs.index(("A", "C"))], -40.0)
+            self.assertAlmostEqual(diff[pairs.index(("A", "B"))], 40.0)
+            self.assertTrue(os.path.exists(render_heatmap(layout, original.volumes,
+                                                          os.path.join(temp_dir, "heatmap.png"), size=128)))
+
+    def test_compare_approaches_diff_title(self):
+        """Заголовок карты разности совпадает с направлением вычитания"""
+        from comparisons import compare_volumes
+        with tempfile.TemporaryDirectory() as temp_dir:
+            self.create_simple_gtfs_data(temp_dir)
+            with mock.patch.object(compare_volumes, 'visualize_volumes_geo') as draw, \
+                    mock.patch.object(compare_volumes, 'find_connected_od_pair_with_min_hops', return_value=('A', 'D')):
+                compare_volumes.compare_approaches(T=30, limit=100, render_map=True, directory=temp_dir)
+        (layout, volumes, _), kwargs = [call for call in draw.call_args_list if 'volumes_mod' in call.kwargs][0]
+        self.assertTrue(kwargs['title'].startswith("Original - Modified"))
+        diff = _heatmap_values(layout, volumes, kwargs['volumes_mod'])
+        np.testing.assert_allclose(diff, layout.link_values(volumes) - layout.link_values(kwargs['volumes_mod']))
+        # volumes — оригинальный алгоритм: он подписан первым на соседней карте
+        original = [call for call in draw.call_args_list if 'volumes_mod' not in call.kwargs][0]
+        self.assertIs(original.args[1], volumes)
+        self.assertTrue(original.kwargs['title'].startswith("Original"))
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,72 @@
+import os
+import tempfile
+import unittest
+
+from algos.florian import compute_sf
+from algos.zones import (ZoneSystem, grid_zone_mapping, load_zone_mapping, suggest_cell_size,
+                         compute_sf_zones, zone_node)
+from utils import Link
+
+
+class TestZones_NetFourStopsFourLinks(unittest.TestCase):
+    def setUp(self):
+        self.links = [
+            Link("A", "B", "1", 10, 10),
+            Link("B", "C", "1", 15, 10),
+            Link("A", "D", "2", 12, 20),
+            Link("D", "C", "2", 13, 20)
+        ]
+        self.stops = {"A", "B", "C", "D"}
+        self.od_matrix = {"A": {"C": 100}}
+        self.coords = {
+            "A": (55.7500, 37.6000),
+            "B": (55.7510, 37.6010),
+            "C": (55.8000, 37.7000),
+            "D": (55.7505, 37.6005),
+        }
+
+    def test_one_stop_per_zone_matches_stop_level(self):
+        zones = ZoneSystem({s: s for s in self.stops})
+        volumes = compute_sf_zones(compute_sf, self.links, self.stops, zones, self.od_matrix)
+        expected = compute_sf(self.links, self.stops, "C", self.od_matrix).volumes
+
+        for from_node in expected.links:
+            for to_node, v in expected.links[from_node].items():
+                self.assertAlmostEqual(volumes.links[from_node][to_node], v, places=5)
+        for stop in self.stops:
+            self.assertAlmostEqual(volumes.nodes[stop], expected.nodes[stop], places=5)
+        self.assertNotIn(zone_node("C"), volumes.nodes)
+
+    def test_aggregate_od_drops_intrazonal(self):
+        zones = ZoneSystem({"A": "west", "B": "west", "C": "east", "D": "west"})
+        zone_od = zones.aggregate_od({"A": {"B": 5, "C": 10}, "D": {"C": 2}})
+        self.assertEqual(zone_od, {zone_node("west"): {zone_node("east"): 12}})
+
+    def test_grid_resolution_controls_zone_count(self):
+        fine = grid_zone_mapping(self.coords, 100)
+        coarse = grid_zone_mapping(self.coords, 20000)
+        self.assertEqual(len(set(fine.values())), 3)
+        self.assertEqual(len(set(coarse.values())), 1)
+        self.assertEqual(suggest_cell_size(self.coords, max_zones=3, cell_sizes=(100, 20000)), 100)
+        self.assertEqual(suggest_cell_size(self.coords, max_zones=1, cell_sizes=(100, 20000)), 20000)
+
+        summary = ZoneSystem(coarse, self.coords).summary()
+        self.assertEqual(summary['n_zones'], 1)
+        self.assertGreater(summary['max_connector_m'], 1000)
+
+    def test_connector_costs_from_coordinates(self):
+        zones = ZoneSystem({"A": "z", "B": "z"}, self.coords)
+        costs = [link.travel_cost for link in zones.access_links]
+        self.assertTrue(all(c > 0 for c in costs))
+        self.assertEqual(len(zones.egress_links["z"]), 2)
+
+    def test_load_zone_mapping(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, 'zones.csv')
+            with open(path, 'w', encoding="utf-8") as f:
+                f.write("stop_id,zone_id\nA,1\nB,1\nC,2\n")
+            self.assertEqual(load_zone_mapping(path), {"A": "1", "B": "1", "C": "2"})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,9 @@
 import csv
 from datetime import datetime
 import heapq
+import math
 import os
-from tqdm import tqdm
+import time
 import random
 random.seed(42)
 
@@ -11,14 +12,38 @@ INFINITE_FREQUENCY = 99999999999.0
 MATH_INF = float('inf')
 VERBOSE = False
 EPSILON = 1e-6
+SQRT2 = math.sqrt(2.0)
+WALK_SPEED_M_PER_MIN = 80.0  # ~4.8 км/ч
+
+def tqdm(iterable=None, **kwargs):
+    """Прогресс-бар tqdm; импортируется при первом вызове, без установленного tqdm — сам iterable."""
+    try:
+        from tqdm import tqdm as progress
+    except ImportError:
+        return iterable
+    return progress(iterable, **kwargs)
+
+def normal_cdf(x, scale=1.0):
+    """Функция распределения N(0, scale^2) в точке x (то же, что scipy.stats.norm.cdf(x, scale=scale))."""
+    return 0.5 * math.erfc(-x / (scale * SQRT2))
 
 class Link:
-    def __init__(self, from_node, to_node, route_id, travel_cost, headway):
+    def __init__(self, from_node, to_node, route_id, travel_cost, headway,
+                 mean_travel_time=None, std_travel_time=0.0, delay_mu=0.0, delay_sigma=0.0):
         self.from_node = from_node
         self.to_node = to_node
         self.route_id = route_id
         self.travel_cost = travel_cost
         self.headway = headway
+        # Необязательные параметры разброса времени в пути (используются моделью времени прибытия)
+        self.mean_travel_time = travel_cost if mean_travel_time is None else mean_travel_time
+        self.std_travel_time = std_travel_time
+        self.delay_mu = delay_mu
+        self.delay_sigma = delay_sigma
+
+    @property
+    def travel_variance(self):
+        return self.std_travel_time ** 2 + self.delay_sigma ** 2
 
 class Strategy:
     def __init__(self, labels, freqs, a_set):
@@ -31,10 +56,53 @@ class Volumes:
         self.links = links
         self.nodes = nodes
 
+class EngineStats:
+    """
+    Счётчики и таймеры этапов поиска стратегии и загрузки.
+    Объект передаётся как stats=... в find_optimal_strategy, assign_demand и calculate_flow_volumes;
+    без него ничего не собирается. Значения накапливаются: один объект можно передать в расчёты
+    нескольких destination или сложить объекты через merge.
+    """
+    COUNTERS = ('runs', 'queue_pushes', 'queue_pops', 'stale_pops', 'relaxations_accepted',
+                'relaxations_rejected', 'nodes_settled', 'cdf_evaluations', 'links_loaded')
+
+    def __init__(self):
+        for name in self.COUNTERS:
+            setattr(self, name, 0)
+        self.phase_times = {}
+
+    def add_time(self, phase, seconds):
+        self.phase_times[phase] = self.phase_times.get(phase, 0.0) + seconds
+
+    def add_queue(self, pq, live_pops):
+        """Счётчики очереди по её состоянию после поиска: живые записи + устаревшие (REMOVED)."""
+        heap_pops = pq.counter - len(pq.heap)
+        self.queue_pushes += pq.counter
+        self.queue_pops += heap_pops
+        self.stale_pops += heap_pops - live_pops
+
+    def merge(self, other):
+        for name in self.COUNTERS:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        for phase, seconds in other.phase_times.items():
+            self.add_time(phase, seconds)
+        return self
+
+    def as_dict(self):
+        result = {name: getattr(self, name) for name in self.COUNTERS}
+        result['phase_times'] = dict(self.phase_times)
+        return result
+
+    def __repr__(self):
+        counters = ", ".join(f"{name}={getattr(self, name)}" for name in self.COUNTERS)
+        phases = ", ".join(f"{phase}={seconds:.3f}s" for phase, seconds in self.phase_times.items())
+        return f"EngineStats({counters}; {phases})"
+
 class SFResult:
-    def __init__(self, strategy, volumes):
+    def __init__(self, strategy, volumes, stats=None):
         self.strategy = strategy
         self.volumes = volumes
+        self.stats = stats
 
 class PriorityQueue:
     def __init__(self):
@@ -104,6 +172,14 @@ def convert_time(time_str):
     hours_converted = int(time_str[:2]) % 24
     return "{:02d}:".format(hours_converted) + time_str[3:]
 
+def gtfs_time_to_seconds(time_str):
+    """
+    Переводит время GTFS (HH:MM:SS, часы могут быть >= 24) в секунды от начала суток
+    без сворачивания по модулю 24, чтобы ночные рейсы сохраняли порядок.
+    """
+    hours, minutes, seconds = time_str.strip().split(':')
+    return int(hours) * 3600 + int(minutes) * 60 + int(seconds)
+
 def parse_gtfs_limited(directory, limit=100):
     stops_path = os.path.join(directory, 'stops.txt')
     stop_times_path = os.path.join(directory, 'stop_times.txt')
@@ -172,6 +248,37 @@ def parse_gtfs_limited(directory, limit=100):
 
     return stop_times, active_trips, all_stops, stop_names, route_names
 
+def parse_stop_coords(directory):
+    """
+    Читает координаты остановок из stops.txt: {stop_id: (lat, lon)}.
+    Понимает стандартные stop_lat/stop_lon и сокращённые lat/lon; остановки без координат пропускаются.
+    """
+    stop_coords = {}
+    with open(os.path.join(directory, 'stops.txt'), 'r', encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            lat = row.get('stop_lat') or row.get('lat')
+            lon = row.get('stop_lon') or row.get('lon')
+            if lat and lon:
+                stop_coords[row['stop_id']] = (float(lat), float(lon))
+    return stop_coords
+
+EARTH_RADIUS_M = 6371000.0
+
+def project_coords(lats, lons, ref_lat=None):
+    """
+    Равнопромежуточная проекция (метры) вокруг широты ref_lat — достаточна для масштабов города.
+    Принимает скаляры или массивы, возвращает (x, y).
+    """
+    import numpy as np
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    if ref_lat is None:
+        ref_lat = float(np.mean(lats)) if lats.size else 0.0
+    x = EARTH_RADIUS_M * np.radians(lons) * math.cos(math.radians(ref_lat))
+    y = EARTH_RADIUS_M * np.radians(lats)
+    return x, y
+
 def calculate_links(stop_times, active_trips, all_stops):
     all_links = []
     for trip_id, times in tqdm(stop_times.items(), desc="Creating links"):
@@ -229,46 +336,9 @@ def find_shortest_route_pair(all_links, max_stops=10):
     """
     Находит пару остановок с маршрутом длиной не более max_stops остановок
     """
-    from collections import defaultdict, deque
-    
-    # Построим граф
-    graph = defaultdict(list)
-    nodes = set()
-    for link in all_links:
-        graph[link.from_node].append(link.to_node)
-        nodes.add(link.from_node)
-        nodes.add(link.to_node)
-    
-    if len(nodes) < 2:
-        return None, None
+    from algos.od_sampling import HopDistanceSampler
 
-    node_list = list(nodes)
-    
-    # Попробуем найти кратчайший маршрут между парами узлов
-    for origin in node_list[:100]:  # Ограничиваем количество проверяемых origin
-        # Используем BFS для поиска ближайших узлов
-        visited = {origin: 0}
-        queue = deque([(origin, 0)])
-        
-        while queue:
-            current, dist = queue.popleft()
-            
-            if dist > 0 and dist <= max_stops and current != origin:
-                # Проверим, что между origin и current есть путь (а не только расстояние по BFS)
-                # Проверим, что у нас есть связный маршрут
-                path_exists = True  # Упрощаем проверку, т.к. BFS уже нашел путь
-                if path_exists:
-                    return origin, current
-            
-            if dist >= max_stops:
-                continue
-                
-            for neighbor in graph[current]:
-                if neighbor not in visited:
-                    visited[neighbor] = dist + 1
-                    queue.append((neighbor, dist + 1))
-    
-    return None, None
+    return HopDistanceSampler(all_links).first_pair(1, max_stops, max_origins=100)
 
 from collections import defaultdict, deque
 
@@ -276,44 +346,11 @@ def find_connected_od_pair_with_min_hops(all_links, min_hops=10, max_total_nodes
     """
     Находит первую пару (origin, destination), для которой кратчайший путь
     содержит хотя бы `min_hops` рёбер.
+    Для выборки многих пар по полосам длины см. algos.od_sampling.HopDistanceSampler.
     """
-    graph = defaultdict(list)
-    nodes = set()
-    for link in all_links:
-        graph[link.from_node].append(link.to_node)
-        nodes.add(link.from_node)
-        nodes.add(link.to_node)
-
-    if len(nodes) < 2:
-        return None, None
-
-    node_list = list(nodes)
-    total_checked = 0
-
-    for origin in node_list:
-        dist = {origin: 0}
-        queue = deque([origin])
-        
-        while queue:
-            current = queue.popleft()
-            current_dist = dist[current]
-            
-            if current_dist >= min_hops and current != origin:
-                return origin, current
-
-            if current_dist >= min_hops + 5:
-                continue
+    from algos.od_sampling import HopDistanceSampler
 
-            for neighbor in graph[current]:
-                if neighbor not in dist:
-                    dist[neighbor] = current_dist + 1
-                    queue.append(neighbor)
-
-        total_checked += 1
-        if total_checked > max_total_nodes:
-            break
-
-    return None, None
+    return HopDistanceSampler(all_links).first_pair(min_hops, max_origins=max_total_nodes)
 
 
 def get_all_origins_reaching_destination(all_links, destination):
@@ -340,7 +377,8 @@ def get_all_origins_reaching_destination(all_links, destination):
 
     return reachable
 
-def calculate_flow_volumes(all_links, all_stops, optimal_strategy, od_matrix, destination):
+def calculate_flow_volumes(all_links, all_stops, optimal_strategy, od_matrix, destination, stats=None):
+    start = time.perf_counter()
     node_volumes = {stop: 0.0 for stop in all_stops}
     for origin in od_matrix:
         if destination in od_matrix[origin]:
@@ -373,6 +411,10 @@ def calculate_flow_volumes(all_links, all_stops, optimal_strategy, od_matrix, de
             if node_volumes[k] != 0.0:
                 print(f"  V_{k} = {node_volumes[k]}")
 
+    if stats is not None:
+        stats.links_loaded += len(optimal_strategy.a_set)
+        stats.add_time('assign.load', time.perf_counter() - start)
+
     return Volumes(volumes_links, node_volumes)
 
 def compute_average_volume(volumes):
@@ -389,136 +431,9 @@ def compute_average_volume(volumes):
     avg_volume = total_volume / count if count > 0 else 0.0
     return avg_volume, total_volume, count
 
-import os
-import matplotlib.pyplot as plt
-import networkx as nx
-from matplotlib.lines import Line2D
-
-def visualize_volumes(all_links, all_stops, volumes_orig, volumes_mod,
-                      od_matrix, destination, T=60, visualization_dir="visual"):
-    os.makedirs(visualization_dir, exist_ok=True)
-
-    G = nx.DiGraph()
-
-    link_attributes = {}
-    for link in all_links:
-        G.add_edge(link.from_node, link.to_node)
-        link_attributes[(link.from_node, link.to_node)] = {
-            'headway': link.headway,
-            'travel_cost': link.travel_cost,
-            'route_id': link.route_id
-        }
-
-    origins = set()
-    for orig, dest_dict in od_matrix.items():
-        if destination in dest_dict and dest_dict[destination] > 0:
-            origins.add(orig)
-
-    plt.figure(figsize=(16, 12))
-    pos = nx.spring_layout(G, seed=42, k=0.9, iterations=60)
-
-    node_colors = []
-    for node in G.nodes():
-        if node == destination:
-            node_colors.append('red')
-        elif node in origins:
-            node_colors.append('limegreen')
-        else:
-            node_colors.append('lightblue')
-
-    nx.draw_networkx_nodes(G, pos,
-                           node_color=node_colors,
-                           node_size=1000,
-                           alpha=0.9,
-                           linewidths=2,
-                           edgecolors='black')
-
-    nx.draw_networkx_edges(G, pos,
-                           edge_color='gray',
-                           arrows=True,
-                           arrowsize=25,
-                           width=2,
-                           alpha=0.7)
-
-    intermediate_nodes = [node for node in G.nodes() if node != destination and node not in origins]
-    if intermediate_nodes:
-        nx.draw_networkx_labels(G, pos,
-                                labels={node: node for node in intermediate_nodes},
-                                font_size=11,
-                                font_weight='bold',
-                                font_color='black')
-
-    if origins:
-        nx.draw_networkx_labels(G, pos,
-                                labels={node: node for node in origins},
-                                font_size=11,
-                                font_weight='bold',
-                                font_color='white')
-
-    nx.draw_networkx_labels(G, pos,
-                            labels={destination: destination},
-                            font_size=11,
-                            font_weight='bold',
-                            font_color='white')
-
-    edge_labels_volumes = {}
-    for from_node in volumes_orig.links:
-        for to_node in volumes_orig.links[from_node]:
-            v_orig = volumes_orig.links[from_node][to_node]
-            v_mod = volumes_mod.links.get(from_node, {}).get(to_node, 0.0)
-            if v_orig > 0.01 or v_mod > 0.01:
-                edge_labels_volumes[(from_node, to_node)] = f"orig: {v_orig:.1f}\nmod: {v_mod:.1f}"
-
-    edge_labels_attributes = {}
-    for (from_node, to_node) in G.edges():
-        if (from_node, to_node) in link_attributes:
-            attrs = link_attributes[(from_node, to_node)]
-            headway = attrs['headway']
-            travel_cost = attrs['travel_cost']
-            
-            if headway < 0:
-                headway_str = "Inf"
-            else:
-                headway_str = f"{headway:.1f}"
-            
-            edge_labels_attributes[(from_node, to_node)] = f"h: {headway_str}\nt: {travel_cost:.1f}m"
-
-    nx.draw_networkx_edge_labels(G, pos,
-                                 edge_labels=edge_labels_volumes,
-                                 font_size=9,
-                                 font_color='darkred',
-                                 bbox=dict(facecolor='white', edgecolor='none', alpha=0.8, pad=3))
-
-    pos_offset = {}
-    for node, (x, y) in pos.items():
-        pos_offset[node] = (x - 0.08, y - 0.08)
-
-    nx.draw_networkx_edge_labels(G, pos_offset,
-                                 edge_labels=edge_labels_attributes,
-                                 font_size=7,
-                                 font_color='darkblue',
-                                 bbox=dict(facecolor='lightyellow', edgecolor='none', alpha=0.7, pad=2))
-
-    legend_elements = [
-        Line2D([0], [0], marker='o', color='w', label='Пункт назначения',
-               markerfacecolor='red', markersize=12, markeredgecolor='black'),
-        Line2D([0], [0], marker='o', color='w', label='Стартовая зона (origin)',
-               markerfacecolor='limegreen', markersize=12, markeredgecolor='black'),
-        Line2D([0], [0], marker='o', color='w', label='Промежуточная остановка',
-               markerfacecolor='lightblue', markersize=12, markeredgecolor='black'),
-    ]
-    plt.legend(handles=legend_elements, loc='upper left', fontsize=12, framealpha=0.9)
-
-    plt.title(f"Сравнение пассажиропотоков: Original vs Modified модель\n"
-              f"Destination = {destination} | Deadline T = {T} мин\n"
-              f"Красные подписи: объёмы потоков | Синие подписи: h=headway, t=travel_time (мин)",
-              fontsize=12, pad=30)
-
-    plt.axis('off')
-    plt.tight_layout()
-
-    filename = os.path.join(visualization_dir, "network_volumes_highlighted.png")
-    plt.savefig(filename, dpi=200, bbox_inches='tight')
-    plt.close()
-
-    print(f"График успешно сохранён: {filename}")
\ No newline at end of file
+def __getattr__(name):
+    # Отрисовка вынесена в visualization: импорт utils не тянет matplotlib/networkx
+    if name == 'visualize_volumes':
+        from visualization import visualize_volumes
+        return visualize_volumes
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
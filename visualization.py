@@ -0,0 +1,394 @@
+import os
+
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
+from matplotlib.lines import Line2D
+
+from utils import project_coords
+
+# Отрисовка объёмов на сети города: остановки в географических координатах (stop_lat/stop_lon),
+# все рёбра — одним LineCollection, подписи только у top-N рёбер по объёму.
+
+
+class GeoLayout:
+    """
+    Географическая раскладка сети: координаты остановок в метрах и отрезки рёбер.
+    link_from/link_to — id концов каждого отрезка в том же порядке, что и segments.
+    Рёбра, у концов которых нет координат, пропускаются.
+    """
+    def __init__(self, all_links, stop_coords):
+        self.stop_ids = sorted(stop_coords)
+        self.stop_index = {stop: k for k, stop in enumerate(self.stop_ids)}
+        lats = np.array([stop_coords[s][0] for s in self.stop_ids], dtype=np.float64)
+        lons = np.array([stop_coords[s][1] for s in self.stop_ids], dtype=np.float64)
+        x, y = project_coords(lats, lons)
+        self.xy = np.column_stack((x, y)) if len(lats) else np.empty((0, 2))
+
+        pairs = []
+        seen = set()
+        for link in all_links:
+            pair = (link.from_node, link.to_node)
+            if pair in seen or link.from_node not in self.stop_index or link.to_node not in self.stop_index:
+                continue
+            seen.add(pair)
+            pairs.append(pair)
+        self.link_from = [p[0] for p in pairs]
+        self.link_to = [p[1] for p in pairs]
+        from_idx = np.array([self.stop_index[s] for s in self.link_from], dtype=np.int64)
+        to_idx = np.array([self.stop_index[s] for s in self.link_to], dtype=np.int64)
+        self.segments = np.stack((self.xy[from_idx], self.xy[to_idx]), axis=1) if pairs else np.empty((0, 2, 2))
+
+    def position(self, stop):
+        return self.xy[self.stop_index[stop]]
+
+    def link_values(self, volumes):
+        """Объёмы Volumes.links в порядке segments (0 для отсутствующих)."""
+        return np.fromiter(
+            (volumes.links.get(f, {}).get(t, 0.0) for f, t in zip(self.link_from, self.link_to)),
+            dtype=np.float64, count=len(self.link_from))
+
+
+def get_geo_layout(network):
+    """Раскладка сети (строится один раз и хранится в network.indexes)."""
+    return network.get_index('geo_layout', lambda n: GeoLayout(n.all_links, n.stop_coords))
+
+
+def visualize_volumes_geo(layout, volumes, filename, volumes_mod=None, destination=None, origins=(),
+                          top_n_labels=20, max_width=6.0, title=None, dpi=150):
+    """
+    Карта объёмов на рёбрах. Если задан volumes_mod, рисуется разность original - modified
+    (расходящаяся палитра), иначе — объёмы volumes. Толщина и цвет линии пропорциональны |объёму|.
+    """
+    values = layout.link_values(volumes)
+    if volumes_mod is not None:
+        values = values - layout.link_values(volumes_mod)
+    magnitude = np.abs(values)
+    scale = magnitude.max() if len(magnitude) and magnitude.max() > 0 else 1.0
+
+    fig, ax = plt.subplots(figsize=(14, 12))
+
+    idle = magnitude <= 1e-9
+    ax.add_collection(LineCollection(layout.segments[idle], colors='lightgray', linewidths=0.3, zorder=1))
+
+    active = np.flatnonzero(~idle)
+    active = active[np.argsort(magnitude[active])]  # крупные потоки рисуются поверх
+    if volumes_mod is not None:
+        cmap, norm = plt.get_cmap('coolwarm'), plt.Normalize(-scale, scale)
+    else:
+        cmap, norm = plt.get_cmap('viridis'), plt.Normalize(0.0, scale)
+    lines = LineCollection(layout.segments[active], cmap=cmap, norm=norm,
+                           linewidths=0.5 + max_width * magnitude[active] / scale, zorder=2)
+    lines.set_array(values[active])
+    ax.add_collection(lines)
+    fig.colorbar(lines, ax=ax, shrink=0.6,
+                 label='Δ объём (original - modified)' if volumes_mod is not None else 'Объём')
+
+    top = active[::-1][:top_n_labels]
+    for k in top:
+        (x0, y0), (x1, y1) = layout.segments[k]
+        ax.text((x0 + x1) / 2, (y0 + y1) / 2, f"{values[k]:.0f}", fontsize=7, color='darkred',
+                ha='center', va='center', zorder=4,
+                bbox=dict(facecolor='white', edgecolor='none', alpha=0.7, pad=1))
+
+    legend = []
+    located_origins = [o for o in origins if o in layout.stop_index]
+    if located_origins:
+        pts = np.array([layout.position(o) for o in located_origins])
+        ax.scatter(pts[:, 0], pts[:, 1], s=6, c='limegreen', zorder=3)
+        legend.append(Line2D([0], [0], marker='o', color='w', label='Origin',
+                             markerfacecolor='limegreen', markersize=8))
+    if destination in layout.stop_index:
+        x, y = layout.position(destination)
+        ax.scatter([x], [y], s=80, c='red', edgecolors='black', zorder=5)
+        legend.append(Line2D([0], [0], marker='o', color='w', label='Пункт назначения',
+                             markerfacecolor='red', markersize=10, markeredgecolor='black'))
+    if legend:
+        ax.legend(handles=legend, loc='upper left')
+
+    if len(layout.xy):
+        ax.set_xlim(layout.xy[:, 0].min(), layout.xy[:, 0].max())
+        ax.set_ylim(layout.xy[:, 1].min(), layout.xy[:, 1].max())
+    ax.set_aspect('equal')
+    ax.axis('off')
+    if title:
+        ax.set_title(title)
+
+    directory = os.path.dirname(filename)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    fig.savefig(filename, dpi=dpi, bbox_inches='tight')
+    plt.close(fig)
+    return filename
+
+
+# Растровая карта плотности потоков: рёбра дискретизируются в пиксели векторно (NumPy),
+# объёмы суммируются через np.bincount. Тайлы рендерятся по одному, поэтому память
+# ограничена размером тайла и чанком отсчётов, а не размером сети.
+
+HEATMAP_TILE_SIZE = 256
+HEATMAP_MAX_SAMPLES = 4_000_000  # отсчётов на одну итерацию растеризации
+
+
+def rasterize_segments(segments, values, extent, width, height, max_samples=HEATMAP_MAX_SAMPLES):
+    """
+    Растеризует отрезки (m x 2 x 2, метры) на сетку height x width пикселей в пределах
+    extent = (xmin, xmax, ymin, ymax). Каждый пиксель, через который проходит отрезок,
+    получает его значение; строка 0 — верх карты. Возвращает float64-матрицу.
+    """
+    grid = np.zeros(height * width, dtype=np.float64)
+    if len(segments) == 0:
+        return grid.reshape(height, width)
+    xmin, xmax, ymin, ymax = extent
+    sx = width / (xmax - xmin)
+    sy = height / (ymax - ymin)
+
+    px = (segments[:, :, 0] - xmin) * sx
+    py = (ymax - segments[:, :, 1]) * sy
+    length = np.maximum(np.abs(px[:, 1] - px[:, 0]), np.abs(py[:, 1] - py[:, 0]))
+    n_samples = np.ceil(length).astype(np.int64) + 1
+
+    start = 0
+    cumulative = np.cumsum(n_samples)
+    while start < len(segments):
+        base = cumulative[start - 1] if start else 0
+        stop = int(np.searchsorted(cumulative, base + max_samples, side='right'))
+        stop = max(stop, start + 1)
+        counts = n_samples[start:stop]
+        seg = np.repeat(np.arange(start, stop), counts)
+        offsets = np.arange(len(seg)) - np.repeat(np.cumsum(counts) - counts, counts)
+        t = offsets / np.maximum(counts - 1, 1).repeat(counts)
+
+        x = px[seg, 0] + t * (px[seg, 1] - px[seg, 0])
+        y = py[seg, 0] + t * (py[seg, 1] - py[seg, 0])
+        ix = np.floor(x).astype(np.int64)
+        iy = np.floor(y).astype(np.int64)
+        inside = (ix >= 0) & (ix < width) & (iy >= 0) & (iy < height)
+        flat = np.where(inside, iy * width + ix, -1)
+        # Отсчёты отрезка идут вдоль него монотонно, поэтому повторы пикселя соседние —
+        # пиксель, в который попало несколько отсчётов одного отрезка, учитывается один раз
+        keep = inside.copy()
+        keep[1:] &= (flat[1:] != flat[:-1]) | (seg[1:] != seg[:-1])
+        grid += np.bincount(flat[keep], weights=values[seg[keep]], minlength=height * width)
+        start = stop
+
+    return grid.reshape(height, width)
+
+
+def _heatmap_values(layout, volumes, volumes_mod):
+    values = layout.link_values(volumes)
+    if volumes_mod is not None:
+        values = values - layout.link_values(volumes_mod)
+    return values
+
+
+def _square_extent(layout, margin=0.02):
+    xmin, ymin = layout.xy.min(axis=0)
+    xmax, ymax = layout.xy.max(axis=0)
+    size = max(xmax - xmin, ymax - ymin, 1.0) * (1 + 2 * margin)
+    cx, cy = (xmin + xmax) / 2, (ymin + ymax) / 2
+    return (cx - size / 2, cx + size / 2, cy - size / 2, cy + size / 2)
+
+
+def _colorize(grid, scale, diverging):
+    """Матрица значений -> RGBA (uint8): log-шкала для объёмов, симметричная — для разности."""
+    if diverging:
+        norm = 0.5 + 0.5 * np.sign(grid) * np.log1p(np.abs(grid)) / np.log1p(scale)
+        rgba = plt.get_cmap('coolwarm')(norm)
+        rgba[..., 3] = np.where(grid == 0, 0.0, 1.0)
+    else:
+        norm = np.log1p(np.maximum(grid, 0.0)) / np.log1p(scale)
+        rgba = plt.get_cmap('inferno')(norm)
+        rgba[..., 3] = np.where(grid <= 0, 0.0, 1.0)
+    return (rgba * 255).astype(np.uint8)
+
+
+def render_heatmap_tiles(layout, volumes, output_dir, volumes_mod=None, zoom_levels=(0, 1, 2, 3),
+                         tile_size=HEATMAP_TILE_SIZE):
+    """
+    Пишет PNG-тайлы output_dir/{z}/{x}/{y}.png карты плотности объёмов (или разности
+    original - modified при заданном volumes_mod). На уровне z сеть покрывается 2^z x 2^z тайлами;
+    пустые тайлы не пишутся. Возвращает список путей.
+    """
+    values = _heatmap_values(layout, volumes, volumes_mod)
+    active = np.abs(values) > 1e-9
+    segments, values = layout.segments[active], values[active]
+    if len(layout.xy) == 0:
+        return []
+
+    xmin, xmax, ymin, ymax = _square_extent(layout)
+    seg_xmin = segments[:, :, 0].min(axis=1)
+    seg_xmax = segments[:, :, 0].max(axis=1)
+    seg_ymin = segments[:, :, 1].min(axis=1)
+    seg_ymax = segments[:, :, 1].max(axis=1)
+
+    # Максимум считается по ребру, а не по пикселю: наложение рёбер не должно "пережигать" шкалу
+    scale = max(float(np.abs(values).max()) if len(values) else 0.0, 1e-9)
+    diverging = volumes_mod is not None
+
+    paths = []
+    for z in zoom_levels:
+        n_tiles = 2 ** z
+        tile_w = (xmax - xmin) / n_tiles
+        for tx in range(n_tiles):
+            for ty in range(n_tiles):
+                t_xmin = xmin + tx * tile_w
+                t_ymax = ymax - ty * tile_w
+                extent = (t_xmin, t_xmin + tile_w, t_ymax - tile_w, t_ymax)
+                hit = ((seg_xmax >= extent[0]) & (seg_xmin <= extent[1])
+                       & (seg_ymax >= extent[2]) & (seg_ymin <= extent[3]))
+                if not hit.any():
+                    continue
+                grid = rasterize_segments(segments[hit], values[hit], extent, tile_size, tile_size)
+                path = os.path.join(output_dir, str(z), str(tx), f"{ty}.png")
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                plt.imsave(path, _colorize(grid, scale, diverging))
+                paths.append(path)
+    return paths
+
+
+def render_heatmap(layout, volumes, filename, volumes_mod=None, size=2048):
+    """Одна растровая карта size x size пикселей на всю сеть."""
+    values = _heatmap_values(layout, volumes, volumes_mod)
+    active = np.abs(values) > 1e-9
+    if len(layout.xy) == 0:
+        return None
+    grid = rasterize_segments(layout.segments[active], values[active], _square_extent(layout), size, size)
+    scale = max(float(np.abs(values).max()) if active.any() else 0.0, 1e-9)
+    directory = os.path.dirname(filename)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    plt.imsave(filename, _colorize(grid, scale, volumes_mod is not None))
+    return filename
+
+
+def visualize_volumes(all_links, all_stops, volumes_orig, volumes_mod,
+                      od_matrix, destination, T=60, visualization_dir="visual"):
+    import networkx as nx
+
+    os.makedirs(visualization_dir, exist_ok=True)
+
+    G = nx.DiGraph()
+
+    link_attributes = {}
+    for link in all_links:
+        G.add_edge(link.from_node, link.to_node)
+        link_attributes[(link.from_node, link.to_node)] = {
+            'headway': link.headway,
+            'travel_cost': link.travel_cost,
+            'route_id': link.route_id
+        }
+
+    origins = set()
+    for orig, dest_dict in od_matrix.items():
+        if destination in dest_dict and dest_dict[destination] > 0:
+            origins.add(orig)
+
+    plt.figure(figsize=(16, 12))
+    pos = nx.spring_layout(G, seed=42, k=0.9, iterations=60)
+
+    node_colors = []
+    for node in G.nodes():
+        if node == destination:
+            node_colors.append('red')
+        elif node in origins:
+            node_colors.append('limegreen')
+        else:
+            node_colors.append('lightblue')
+
+    nx.draw_networkx_nodes(G, pos,
+                           node_color=node_colors,
+                           node_size=1000,
+                           alpha=0.9,
+                           linewidths=2,
+                           edgecolors='black')
+
+    nx.draw_networkx_edges(G, pos,
+                           edge_color='gray',
+                           arrows=True,
+                           arrowsize=25,
+                           width=2,
+                           alpha=0.7)
+
+    intermediate_nodes = [node for node in G.nodes() if node != destination and node not in origins]
+    if intermediate_nodes:
+        nx.draw_networkx_labels(G, pos,
+                                labels={node: node for node in intermediate_nodes},
+                                font_size=11,
+                                font_weight='bold',
+                                font_color='black')
+
+    if origins:
+        nx.draw_networkx_labels(G, pos,
+                                labels={node: node for node in origins},
+                                font_size=11,
+                                font_weight='bold',
+                                font_color='white')
+
+    nx.draw_networkx_labels(G, pos,
+                            labels={destination: destination},
+                            font_size=11,
+                            font_weight='bold',
+                            font_color='white')
+
+    edge_labels_volumes = {}
+    for from_node in volumes_orig.links:
+        for to_node in volumes_orig.links[from_node]:
+            v_orig = volumes_orig.links[from_node][to_node]
+            v_mod = volumes_mod.links.get(from_node, {}).get(to_node, 0.0)
+            if v_orig > 0.01 or v_mod > 0.01:
+                edge_labels_volumes[(from_node, to_node)] = f"orig: {v_orig:.1f}\nmod: {v_mod:.1f}"
+
+    edge_labels_attributes = {}
+    for (from_node, to_node) in G.edges():
+        if (from_node, to_node) in link_attributes:
+            attrs = link_attributes[(from_node, to_node)]
+            headway = attrs['headway']
+            travel_cost = attrs['travel_cost']
+            
+            if headway < 0:
+                headway_str = "Inf"
+            else:
+                headway_str = f"{headway:.1f}"
+            
+            edge_labels_attributes[(from_node, to_node)] = f"h: {headway_str}\nt: {travel_cost:.1f}m"
+
+    nx.draw_networkx_edge_labels(G, pos,
+                                 edge_labels=edge_labels_volumes,
+                                 font_size=9,
+                                 font_color='darkred',
+                                 bbox=dict(facecolor='white', edgecolor='none', alpha=0.8, pad=3))
+
+    pos_offset = {}
+    for node, (x, y) in pos.items():
+        pos_offset[node] = (x - 0.08, y - 0.08)
+
+    nx.draw_networkx_edge_labels(G, pos_offset,
+                                 edge_labels=edge_labels_attributes,
+                                 font_size=7,
+                                 font_color='darkblue',
+                                 bbox=dict(facecolor='lightyellow', edgecolor='none', alpha=0.7, pad=2))
+
+    legend_elements = [
+        Line2D([0], [0], marker='o', color='w', label='Пункт назначения',
+               markerfacecolor='red', markersize=12, markeredgecolor='black'),
+        Line2D([0], [0], marker='o', color='w', label='Стартовая зона (origin)',
+               markerfacecolor='limegreen', markersize=12, markeredgecolor='black'),
+        Line2D([0], [0], marker='o', color='w', label='Промежуточная остановка',
+               markerfacecolor='lightblue', markersize=12, markeredgecolor='black'),
+    ]
+    plt.legend(handles=legend_elements, loc='upper left', fontsize=12, framealpha=0.9)
+
+    plt.title(f"Сравнение пассажиропотоков: Original vs Modified модель\n"
+              f"Destination = {destination} | Deadline T = {T} мин\n"
+              f"Красные подписи: объёмы потоков | Синие подписи: h=headway, t=travel_time (мин)",
+              fontsize=12, pad=30)
+
+    plt.axis('off')
+    plt.tight_layout()
+
+    filename = os.path.join(visualization_dir, "network_volumes_highlighted.png")
+    plt.savefig(filename, dpi=200, bbox_inches='tight')
+    plt.close()
+
+    print(f"График успешно сохранён: {filename}")